@@ -0,0 +1,428 @@
+"""
+Benchmarks for NetMeta MCP
+
+Times every MCP tool end to end (the FastMCP tool functions, as a client
+reaches them minus the transport) and every NetmetaBridge method on its
+own, on the bundled examples and on synthetic networks (see synth.py) of
+10, 50 and 200 treatments with 100, 1,000 and 10,000 contrasts. Each case
+reports p50/p95 latency, the peak RSS of the Python process and of its R
+processes, and the request and response payload sizes. Results are
+written as JSON so runs on different commits can be compared
+(--baseline).
+
+Usage:
+    python benchmarks/run.py [--engine numpy] [--repeat 5] [--quick]
+                             [--output benchmark.json] [--baseline old.json]
+
+The benchmark imports the package from this checkout's src/ directory.
+The result cache is disabled unless --cache is given, so repeated calls
+measure the computation. R cases are skipped when R is not available.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+EXAMPLES = ("Senn2013", "smokingcessation", "Linde2015", "parkinson")
+
+# Synthetic networks as (treatments, contrasts)
+SIZES = tuple((t, c) for t in (10, 50, 200) for c in (100, 1000, 10000))
+QUICK_SIZES = ((10, 100),)
+
+# Items per runnetmeta_batch call
+BATCH_ITEMS = 4
+
+# leave_one_out refits the network once per study; larger networks are
+# skipped unless --max-loo-studies is raised
+DEFAULT_MAX_LOO_STUDIES = 100
+
+
+def load_datasets(sizes, seed: int) -> list[dict[str, Any]]:
+    """Benchmark inputs: pairwise data, plus arm-level data where available."""
+    from netmeta_mcp import synth
+    from netmeta_mcp.contrasts import arms_to_contrasts
+
+    datasets = []
+    for name in EXAMPLES:
+        example = json.loads((ROOT / "examples" / f"{name}.json").read_text())
+        dataset = {"name": name, "sm": example["sm"]}
+        if example.get("format") == "arm-level":
+            outcome_type = "binary" if "events" in example["data"][0] else "continuous"
+            dataset["arms"] = example["data"]
+            dataset["outcome_type"] = outcome_type
+            dataset["data"] = arms_to_contrasts(
+                example["data"], outcome_type=outcome_type, sm=example["sm"]
+            )
+            dataset["arm_format"] = f"arm_{outcome_type}"
+        else:
+            dataset["data"] = example["data"]
+        datasets.append(dataset)
+    for n_treatments, n_contrasts in sizes:
+        if n_contrasts < n_treatments - 1:
+            continue
+        # Two-arm studies over a random network with as many distinct
+        # comparisons as the contrasts allow, up to 30% of all pairs
+        possible = n_treatments * (n_treatments - 1) // 2
+        data = synth.generate(
+            n_treatments=n_treatments,
+            n_studies=n_contrasts,
+            multi_arm=0.0,
+            density=min(synth.DEFAULT_DENSITY, n_contrasts / possible),
+            outcome_type="continuous",
+            seed=seed,
+        )
+        name = f"synthetic-{n_treatments}x{n_contrasts}"
+        datasets.append({"name": name, "sm": "MD", "data": data})
+    for dataset in datasets:
+        data = dataset["data"]
+        dataset["n_treatments"] = len(
+            {row["treat1"] for row in data} | {row["treat2"] for row in data}
+        )
+        dataset["n_contrasts"] = len(data)
+        dataset["n_studies"] = len({row["study"] for row in data})
+    return datasets
+
+
+def _kib_to_mb(kib: float) -> float:
+    return kib / 1024
+
+
+def python_peak_rss_mb() -> float:
+    """Peak RSS of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024**2 if sys.platform == "darwin" else _kib_to_mb(peak)
+
+
+def r_peak_rss_mb() -> float | None:
+    """
+    Peak RSS of the R processes: live children (VmHWM, Linux only) and
+    children that have exited (one-off R processes).
+    """
+    peaks = []
+    finished = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if finished:
+        peaks.append(
+            finished / 1024**2 if sys.platform == "darwin" else _kib_to_mb(finished)
+        )
+    parent = str(os.getpid())
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+            if fields[1] != parent:
+                continue
+            for line in (stat.parent / "status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    peaks.append(_kib_to_mb(float(line.split()[1])))
+        except (OSError, IndexError, ValueError):
+            continue
+    return max(peaks) if peaks else None
+
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+def _payload_bytes(value: Any) -> int:
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+async def measure(
+    call, kwargs: dict[str, Any], repeat: int, check: bool = True
+) -> dict[str, Any]:
+    """
+    Run call(**kwargs) once to warm up, then `repeat` timed times.
+
+    Results with an `error` count as errors, unless check is False.
+    """
+    result = call(**kwargs)
+    if asyncio.iscoroutine(result):
+        result = await result
+    errors = int(check and _is_error(result))
+    first_error = result["error"] if errors else None
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call(**kwargs)
+        if asyncio.iscoroutine(result):
+            result = await result
+        samples.append(time.perf_counter() - start)
+        if check and _is_error(result):
+            errors += 1
+            first_error = first_error or result["error"]
+    return {
+        "samples": repeat,
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "mean": float(np.mean(samples)),
+        "min": float(np.min(samples)),
+        "max": float(np.max(samples)),
+        "request_bytes": _payload_bytes(kwargs),
+        "response_bytes": _payload_bytes(result),
+        "python_peak_rss_mb": python_peak_rss_mb(),
+        "errors": errors,
+        "error": first_error,
+    }
+
+
+def cases(
+    dataset: dict[str, Any], engine: str, args
+) -> list[tuple[str, str, dict[str, Any], str]]:
+    """(tool, bridge method, arguments, input format) of every call."""
+    from netmeta_mcp.synth import to_csv
+
+    data, sm = dataset["data"], dataset["sm"]
+    fit = {"data": data, "sm": sm, "engine": engine}
+    if not args.cache:
+        fit["cache"] = False
+    calls = []
+    if engine == "numpy":
+        # Engine independent, so measured once per dataset
+        calls.append(
+            ("csv_to_json", "load_csv", {"csv_content": to_csv(data)}, "pairwise")
+        )
+        if "arms" in dataset:
+            calls.append(
+                (
+                    "csv_to_json",
+                    "load_csv",
+                    {
+                        "csv_content": to_csv(dataset["arms"]),
+                        "data_format": dataset["arm_format"],
+                    },
+                    dataset["arm_format"],
+                )
+            )
+    if "arms" in dataset:
+        calls.append(
+            (
+                "pairwise_to_netmeta",
+                "pairwise_to_netmeta",
+                {
+                    "data": dataset["arms"],
+                    "outcome_type": dataset["outcome_type"],
+                    "sm": sm,
+                    "engine": engine,
+                },
+                dataset["arm_format"],
+            )
+        )
+    calls.append(("runnetmeta", "run_netmeta", fit, "pairwise"))
+    batch = {
+        "items": [{"data": data} for _ in range(BATCH_ITEMS)],
+        "sm": sm,
+        "engine": engine,
+    }
+    if not args.cache:
+        batch["cache"] = False
+    calls.append(("runnetmeta_batch", "run_netmeta_batch", batch, "pairwise"))
+    # Follow-up tools run on an analysis fitted before the cases
+    for tool in (
+        "get_network_graph",
+        "get_league_table",
+        "get_ranking",
+        "get_forest_data",
+    ):
+        calls.append((tool, tool, {"analysis_id": None}, "analysis"))
+    first_study = data[0]["study"]
+    calls.append(
+        (
+            "update_netmeta",
+            "update_netmeta",
+            {"remove": [{"study": first_study}], "analysis_id": None},
+            "analysis",
+        )
+    )
+    if engine == "r" and dataset["n_studies"] <= args.max_loo_studies:
+        calls.append(
+            ("leave_one_out", "leave_one_out", {"data": data, "sm": sm}, "pairwise")
+        )
+    return calls
+
+
+async def run(args) -> dict[str, Any]:
+    if not args.cache:
+        os.environ["NETMETA_RESULT_CACHE"] = "0"
+
+    from netmeta_mcp import server
+    from netmeta_mcp.cache import netmeta_commit
+
+    bridge = server.r_bridge
+    engines = list(args.engine)
+    if "r" in engines:
+        try:
+            bridge.start()
+        except RuntimeError as e:
+            print(f"Skipping R cases: {e}", file=sys.stderr)
+            engines.remove("r")
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    datasets = load_datasets(sizes, args.seed)
+    results = []
+
+    async def record(target, name, call, kwargs, dataset, engine, fmt):
+        """Measure one case and append it to the results."""
+        outcome = await measure(call, kwargs, args.repeat, check=fmt != "-")
+        entry = {
+            "target": target,
+            "name": name,
+            "dataset": dataset["name"],
+            "input": fmt,
+            "engine": engine,
+            "n_treatments": dataset["n_treatments"],
+            "n_contrasts": dataset["n_contrasts"],
+            **outcome,
+            "r_peak_rss_mb": r_peak_rss_mb() if "r" in engines else None,
+        }
+        results.append(entry)
+        line = (
+            f"{target:6} {name:22} {dataset['name']:24} {fmt:14} "
+            f"{engine or '-':5} p50 {entry['p50'] * 1000:10.2f} ms  "
+            f"p95 {entry['p95'] * 1000:10.2f} ms"
+        )
+        if entry["errors"]:
+            line += f"  ({entry['errors']} errors: {entry['error']})"
+        print(line, file=sys.stderr)
+
+    for dataset in datasets:
+        for engine in engines:
+            base = bridge.run_netmeta(
+                data=dataset["data"], sm=dataset["sm"], engine=engine
+            )
+            if _is_error(base):
+                print(
+                    f"Skipping {dataset['name']} ({engine}): {base['error']}",
+                    file=sys.stderr,
+                )
+                continue
+            for tool, method, kwargs, fmt in cases(dataset, engine, args):
+                if "analysis_id" in kwargs:
+                    kwargs["analysis_id"] = base["analysis_id"]
+                if tool == "leave_one_out":
+                    label = "r"
+                elif "engine" in kwargs or "analysis_id" in kwargs:
+                    label = engine
+                else:
+                    label = None
+                for target, call in (
+                    ("tool", getattr(server, tool)),
+                    ("bridge", getattr(bridge, method)),
+                ):
+                    await record(
+                        target, call.__name__, call, kwargs, dataset, label, fmt
+                    )
+
+    status = {"name": "-", "n_treatments": None, "n_contrasts": None}
+    for target, call in (("tool", server.get_server_status), ("bridge", bridge.status)):
+        await record(target, call.__name__, call, {}, status, None, "-")
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "r_version": bridge.status()["r_version"],
+            "netmeta_commit": netmeta_commit(),
+            "engines": engines,
+            "repeat": args.repeat,
+            "cache": args.cache,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """Print the p50 ratio of every case present in both reports."""
+
+    def key(entry):
+        return (
+            entry["target"],
+            entry["name"],
+            entry["dataset"],
+            entry.get("input"),
+            entry["engine"],
+        )
+
+    before = {key(entry): entry for entry in baseline["results"]}
+    print(
+        f"Compared with {baseline['meta'].get('commit')} "
+        f"({baseline['meta'].get('timestamp')}); p50 new/old:"
+    )
+    for entry in report["results"]:
+        old = before.get(key(entry))
+        if old is None or not old["p50"]:
+            continue
+        print(
+            f"  {entry['target']:6} {entry['name']:22} {entry['dataset']:24} "
+            f"{entry['input']:14} {entry['engine'] or '-':5} "
+            f"{entry['p50'] / old['p50']:6.2f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the NetMeta MCP tools")
+    parser.add_argument(
+        "--engine",
+        action="append",
+        choices=("numpy", "r"),
+        help="Engine to benchmark; repeat for both (default: numpy and r)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per case")
+    parser.add_argument(
+        "--quick", action="store_true", help="Only the smallest synthetic network"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Synthetic data seed")
+    parser.add_argument(
+        "--max-loo-studies",
+        type=int,
+        default=DEFAULT_MAX_LOO_STUDIES,
+        help="Skip leave_one_out on networks with more studies",
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="Keep the result cache enabled"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmark.json"), help="JSON report"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, help="Earlier JSON report to compare against"
+    )
+    args = parser.parse_args()
+    args.engine = args.engine or ["numpy", "r"]
+
+    report = asyncio.run(run(args))
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {len(report['results'])} results to {args.output}", file=sys.stderr)
+    if args.baseline is not None:
+        compare(report, json.loads(args.baseline.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Result cache for NetMeta
+
+Caches network meta-analysis results by content: the key is a hash of the
+canonicalised input rows, the options that change the estimates (summary
+measure, reference, engine) and the pinned netmeta commit, so identical
+re-submissions skip R entirely. Results are held in an in-memory LRU tier
+backed by a size-bounded on-disk tier that survives restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from . import metrics
+from .results import ResultBundle
+
+logger = logging.getLogger(__name__)
+
+# Default number of results kept in memory
+DEFAULT_MEMORY_ENTRIES = 128
+
+# Default disk budget for cached results, in megabytes
+DEFAULT_DISK_MB = 256.0
+
+
+def cache_dir() -> Path:
+    """Return the directory for on-disk caches (NETMETA_CACHE_DIR)."""
+    base = os.environ.get("NETMETA_CACHE_DIR")
+    if base is None:
+        base = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+        base = str(Path(base) / "netmeta-mcp")
+    return Path(base)
+
+
+def netmeta_commit() -> str:
+    """
+    Identify the netmeta build results come from.
+
+    Uses NETMETA_COMMIT if set (the Docker image sets it), otherwise the
+    commit pinned in the repository's NETMETA_VERSION file.
+    """
+    commit = os.environ.get("NETMETA_COMMIT")
+    if commit:
+        return commit
+    version_file = Path(__file__).resolve().parents[2] / "NETMETA_VERSION"
+    try:
+        for line in version_file.read_text().splitlines():
+            if line.startswith("NETMETA_COMMIT="):
+                return line.split("=", 1)[1].strip()
+    except OSError:
+        pass
+    return "unknown"
+
+
+def cache_key(
+    data: Sequence[dict[str, Any]],
+    sm: str,
+    reference: str | None,
+    engine: str,
+) -> str | None:
+    """
+    Hash pairwise input rows and options into a cache key.
+
+    Rows are reduced to their fields with normalised types and sorted, as
+    the estimates do not depend on row order. Returns None if a row cannot
+    be canonicalised, in which case the call is not cached.
+    """
+    try:
+        rows = sorted(
+            json.dumps(
+                [
+                    str(row["study"]),
+                    str(row["treat1"]),
+                    str(row["treat2"]),
+                    float(row["TE"]),
+                    float(row["seTE"]),
+                ]
+            )
+            for row in data
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+    payload = json.dumps(
+        {
+            "rows": rows,
+            "sm": sm,
+            "reference": reference or "",
+            "engine": engine,
+            "netmeta": netmeta_commit(),
+        },
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    """A cached fit: its result bundle and input counts."""
+
+    bundle: ResultBundle
+    n_studies: int
+    n_comparisons: int
+
+
+def _save(path: Path, result: CachedResult) -> None:
+    """Write a cached result as an .npz file, atomically."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            result.bundle.save(
+                f, n_studies=result.n_studies, n_comparisons=result.n_comparisons
+            )
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _load(path: Path) -> CachedResult:
+    bundle, meta = ResultBundle.load(path)
+    return CachedResult(bundle, meta["n_studies"], meta["n_comparisons"])
+
+
+class ResultCache:
+    """Two-tier (memory, disk) cache of network meta-analysis results."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+    ):
+        """
+        Args:
+            directory: Where the disk tier is kept. Defaults to "results"
+                under NETMETA_CACHE_DIR.
+            max_entries: Results kept in memory. Defaults to
+                NETMETA_RESULT_CACHE_SIZE or 128.
+            max_bytes: Disk budget. Defaults to NETMETA_RESULT_CACHE_MB or
+                256 MB; 0 disables the disk tier.
+        """
+        if max_entries is None:
+            max_entries = int(
+                os.environ.get("NETMETA_RESULT_CACHE_SIZE", DEFAULT_MEMORY_ENTRIES)
+            )
+        self._max_entries = max_entries
+        if max_bytes is None:
+            max_mb = float(os.environ.get("NETMETA_RESULT_CACHE_MB", DEFAULT_DISK_MB))
+            max_bytes = int(max_mb * 1024 * 1024)
+        self._max_bytes = max_bytes
+        self.directory = Path(directory) if directory else cache_dir() / "results"
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, CachedResult] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def get(self, key: str) -> CachedResult | None:
+        """Look up a result, promoting disk hits to memory."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                metrics.RESULT_CACHE.labels("hit").inc()
+                return result
+
+        result = None
+        if self._max_bytes > 0:
+            path = self._path(key)
+            try:
+                result = _load(path)
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug("Discarding unreadable cache entry %s: %s", path, e)
+                path.unlink(missing_ok=True)
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                metrics.RESULT_CACHE.labels("miss").inc()
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            metrics.RESULT_CACHE.labels("disk_hit").inc()
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """Store a result in both tiers."""
+        with self._lock:
+            self._remember(key, result)
+        if self._max_bytes <= 0:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _save(self._path(key), result)
+            self._evict_disk()
+        except OSError as e:
+            logger.debug("Could not write result cache entry: %s", e)
+
+    def _remember(self, key: str, result: CachedResult) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used files beyond the disk budget."""
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self._max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self) -> None:
+        """Empty the memory tier (the disk tier is kept)."""
+        with self._lock:
+            self._memory.clear()
@@ -0,0 +1,318 @@
+"""
+Arm-level to pairwise contrast conversion for NetMeta
+
+A NumPy implementation of what meta::pairwise() computes for the
+pairwise_to_netmeta tool, so conversions need no R process. Every pair of
+arms within a study becomes one contrast (treat1 versus treat2), in the
+order the arms appear in the data, so multi-arm studies yield all their
+k(k-1)/2 comparisons.
+
+Binary outcomes follow the continuity correction rules of meta's
+metabin(), which pairwise() uses. 0.5 is added to every cell of a study
+with zero events or only events in one of its arms, and all arms of a
+multi-arm study are corrected together. For the risk difference the
+correction enters the standard error only. For OR and RR, comparisons with
+zero events or only events in both arms are kept as rows with missing TE
+and seTE, as pairwise() returns them. Like netmeta, the NumPy engine leaves
+such rows out of the fit (see engine.Network). Standardised mean
+differences are Hedges' g with the approximate bias correction.
+
+This module is experimental. pairwise_to_netmeta uses meta::pairwise() by
+default, and tests/test_contrasts.py compares both conversions once results
+are recorded with `python -m netmeta_mcp.contrasts --record
+tests/data/pairwise` on a machine with R; until then the correction rules
+are only checked against values worked out by hand.
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+# Summary measures per outcome type; the first is the default
+SUMMARY_MEASURES = {
+    "binary": ("OR", "RR", "RD"),
+    "continuous": ("MD", "SMD"),
+}
+
+# Fields read from arm-level records, per outcome type
+ARM_FIELDS = {
+    "binary": ("study", "treatment", "events", "n"),
+    "continuous": ("study", "treatment", "mean", "sd", "n"),
+}
+
+# Continuity correction for binary outcomes, as meta::pairwise's incr
+_INCREMENT = 0.5
+
+
+class ConversionError(ValueError):
+    """Raised when arm-level data cannot be converted."""
+
+
+def _column(data: Sequence[dict[str, Any]], field: str) -> np.ndarray:
+    try:
+        values = np.array([row[field] for row in data], dtype=float)
+    except KeyError:
+        raise ConversionError(f"Missing field: {field}") from None
+    except (TypeError, ValueError):
+        raise ConversionError(f"Field '{field}' must be numeric") from None
+    if not np.all(np.isfinite(values)):
+        raise ConversionError(f"Field '{field}' must be given for every arm")
+    return values
+
+
+def _pairs(studies: list[Any]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Arm indices of every within-study pair, and the study of each pair."""
+    arms: dict[Any, list[int]] = {}
+    for i, study in enumerate(studies):
+        arms.setdefault(study, []).append(i)
+    first, second, group = [], [], []
+    for s, rows in enumerate(arms.values()):
+        for a in range(len(rows) - 1):
+            for b in range(a + 1, len(rows)):
+                first.append(rows[a])
+                second.append(rows[b])
+                group.append(s)
+    return np.array(first, dtype=int), np.array(second, dtype=int), np.array(group)
+
+
+def _binary(
+    data: Sequence[dict[str, Any]],
+    sm: str,
+    first: np.ndarray,
+    second: np.ndarray,
+    group: np.ndarray,
+    study_of_arm: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    events = _column(data, "events")
+    n = _column(data, "n")
+    if np.any(n <= 0) or np.any(events < 0) or np.any(events > n):
+        raise ConversionError("Need 0 <= events <= n and n > 0 for every arm")
+
+    e1, n1, e2, n2 = events[first], n[first], events[second], n[second]
+
+    # Correct every arm of a study in which some arm has a zero cell
+    zero_cell = (events == 0) | (events == n)
+    corrected = np.zeros(study_of_arm.max() + 1, dtype=bool)
+    np.logical_or.at(corrected, study_of_arm, zero_cell)
+    incr = np.where(corrected[group], _INCREMENT, 0.0)
+
+    if sm == "RD":
+        te = e1 / n1 - e2 / n2
+        se = np.sqrt(
+            (e1 + incr) * (n1 - e1 + incr) / (n1 + 2 * incr) ** 3
+            + (e2 + incr) * (n2 - e2 + incr) / (n2 + 2 * incr) ** 3
+        )
+        return te, se, np.zeros(len(te), dtype=bool)
+
+    missing = ((e1 == 0) & (e2 == 0)) | ((e1 == n1) & (e2 == n2))
+    a, c = e1 + incr, e2 + incr
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if sm == "OR":
+            b, d = n1 - e1 + incr, n2 - e2 + incr
+            te = np.log(a * d / (b * c))
+            se = np.sqrt(1 / a + 1 / b + 1 / c + 1 / d)
+        else:
+            m1, m2 = n1 + 2 * incr, n2 + 2 * incr
+            te = np.log((a / m1) / (c / m2))
+            se = np.sqrt(1 / a - 1 / m1 + 1 / c - 1 / m2)
+    return te, se, missing
+
+
+def _continuous(
+    data: Sequence[dict[str, Any]],
+    sm: str,
+    first: np.ndarray,
+    second: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    mean = _column(data, "mean")
+    sd = _column(data, "sd")
+    n = _column(data, "n")
+    if np.any(n <= 0) or np.any(sd <= 0):
+        raise ConversionError("Need sd > 0 and n > 0 for every arm")
+
+    m1, s1, n1 = mean[first], sd[first], n[first]
+    m2, s2, n2 = mean[second], sd[second], n[second]
+    if sm == "MD":
+        te = m1 - m2
+        se = np.sqrt(s1**2 / n1 + s2**2 / n2)
+    else:
+        total = n1 + n2
+        pooled = np.sqrt(((n1 - 1) * s1**2 + (n2 - 1) * s2**2) / (total - 2))
+        te = (m1 - m2) / pooled * (1 - 3 / (4 * total - 9))
+        se = np.sqrt(total / (n1 * n2) + te**2 / (2 * (total - 3.94)))
+    return te, se, np.zeros(len(te), dtype=bool)
+
+
+def arms_to_contrasts(
+    data: Sequence[dict[str, Any]],
+    outcome_type: str = "binary",
+    sm: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Convert arm-level data to pairwise contrasts.
+
+    Args:
+        data: List of study arms (see ARM_FIELDS)
+        outcome_type: "binary" or "continuous"
+        sm: Summary measure; "OR" (default), "RR" or "RD" for binary and
+            "MD" (default) or "SMD" for continuous outcomes
+
+    Returns:
+        List of contrasts with study, treat1, treat2, TE and seTE, ready
+        for run_netmeta. TE and seTE are None for comparisons without an
+        estimate (zero or only events in both arms, for OR and RR).
+
+    Raises:
+        ConversionError: If the outcome type or summary measure is unknown,
+            or a field is missing or invalid
+    """
+    if outcome_type not in SUMMARY_MEASURES:
+        raise ConversionError(f"Unknown outcome_type: {outcome_type}")
+    measures = SUMMARY_MEASURES[outcome_type]
+    sm = sm or measures[0]
+    if sm not in measures:
+        raise ConversionError(
+            f"Summary measure {sm} is not available for {outcome_type} outcomes; "
+            f"use one of {list(measures)}"
+        )
+    try:
+        studies = [row["study"] for row in data]
+        treatments = [row["treatment"] for row in data]
+    except KeyError as e:
+        raise ConversionError(f"Missing field: {e.args[0]}") from None
+
+    first, second, group = _pairs(studies)
+    if len(first) == 0:
+        return []
+    if outcome_type == "binary":
+        study_index = {s: i for i, s in enumerate(dict.fromkeys(studies))}
+        study_of_arm = np.array([study_index[s] for s in studies])
+        te, se, missing = _binary(data, sm, first, second, group, study_of_arm)
+    else:
+        te, se, missing = _continuous(data, sm, first, second)
+
+    return [
+        {
+            "study": studies[i],
+            "treat1": treatments[i],
+            "treat2": treatments[j],
+            "TE": None if skip else effect,
+            "seTE": None if skip else error,
+        }
+        for i, j, effect, error, skip in zip(
+            first.tolist(),
+            second.tolist(),
+            te.tolist(),
+            se.tolist(),
+            missing.tolist(),
+        )
+    ]
+
+
+def max_difference(
+    contrasts: Sequence[dict[str, Any]], reference: Sequence[dict[str, Any]]
+) -> float:
+    """
+    Largest absolute difference in TE and seTE between two conversions of
+    the same data, matching rows by study and treatments. Infinite if the
+    rows or their missing estimates differ.
+    """
+
+    def by_key(rows: Sequence[dict[str, Any]]) -> dict[tuple[str, ...], Any]:
+        return {
+            (str(row["study"]), str(row["treat1"]), str(row["treat2"])): row
+            for row in rows
+        }
+
+    ours, theirs = by_key(contrasts), by_key(reference)
+    if len(ours) != len(contrasts) or ours.keys() != theirs.keys():
+        return math.inf
+    worst = 0.0
+    for key, row in ours.items():
+        for field in ("TE", "seTE"):
+            a, b = row[field], theirs[key][field]
+            if (a is None) != (b is None):
+                return math.inf
+            if a is not None:
+                worst = max(worst, abs(a - b))
+    return worst
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Compare the NumPy conversion with meta::pairwise() on arm-level CSVs."""
+    parser = argparse.ArgumentParser(
+        prog="python -m netmeta_mcp.contrasts",
+        description="Compare the NumPy conversion with meta::pairwise() on "
+        "arm-level CSV files, for every summary measure.",
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="Arm-level CSV files")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-10,
+        help="Largest accepted absolute difference (default 1e-10)",
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        metavar="DIR",
+        help="Also write meta's contrasts as reference files for the tests",
+    )
+    args = parser.parse_args(argv)
+
+    from .datasets import parse_csv
+    from .r_bridge import NetmetaBridge
+
+    bridge = NetmetaBridge()
+    failed = False
+    try:
+        for path in args.files:
+            content = path.read_text()
+            header = content.splitlines()[0].split(",")
+            outcome = "binary" if "events" in header else "continuous"
+            dataset = parse_csv(content, f"arm_{outcome}")
+            if isinstance(dataset, dict):
+                print(f"{path.name}: {dataset['error']}")
+                failed = True
+                continue
+            data = dataset.records()
+            recorded = {}
+            for sm in SUMMARY_MEASURES[outcome]:
+                reference = bridge.pairwise_to_netmeta(
+                    data, outcome_type=outcome, sm=sm, engine="r"
+                )
+                if isinstance(reference, dict):
+                    print(f"{path.name} {sm}: R failed: {reference['error']}")
+                    failed = True
+                    continue
+                recorded[sm] = reference
+                difference = max_difference(
+                    arms_to_contrasts(data, outcome, sm), reference
+                )
+                ok = difference <= args.tolerance
+                failed |= not ok
+                print(
+                    f"{path.name} {sm}: {'ok' if ok else 'FAILED'} "
+                    f"(max difference {difference:.3g})"
+                )
+            if args.record is not None:
+                args.record.mkdir(parents=True, exist_ok=True)
+                (args.record / f"{path.stem}.json").write_text(
+                    json.dumps(
+                        {"outcome_type": outcome, "contrasts": recorded}, indent=1
+                    )
+                    + "\n"
+                )
+    finally:
+        bridge.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
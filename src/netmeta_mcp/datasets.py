@@ -0,0 +1,373 @@
+"""
+Parsed datasets for NetMeta
+
+CSV uploads are parsed in a single streaming pass straight into typed
+column arrays, collecting validation errors with their line numbers
+instead of stopping at the first bad cell. Parsed datasets are kept in a
+DatasetStore under a `dataset_id`, so the analysis tools can refer to an
+upload instead of having the client send the data back. Server processes
+that share their state (see state.SharedAnalysisStore) use a
+SharedDatasetStore instead.
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .state import connect, transaction
+
+# Columns of each data format, with their types
+DATA_FORMATS: dict[str, tuple[tuple[str, type], ...]] = {
+    "pairwise": (
+        ("study", str),
+        ("treat1", str),
+        ("treat2", str),
+        ("TE", float),
+        ("seTE", float),
+    ),
+    "arm_binary": (
+        ("study", str),
+        ("treatment", str),
+        ("events", int),
+        ("n", int),
+    ),
+    "arm_continuous": (
+        ("study", str),
+        ("treatment", str),
+        ("mean", float),
+        ("sd", float),
+        ("n", int),
+    ),
+}
+
+# Maximum number of validation errors reported in detail
+MAX_REPORTED_ERRORS = 50
+
+# Default memory budget for parsed datasets, in megabytes
+DEFAULT_MAX_MB = 256.0
+
+# Typecodes of the column arrays filled while parsing
+_TYPECODES = {float: "d", int: "q"}
+
+
+@dataclass
+class Dataset:
+    """Typed columns of a parsed upload."""
+
+    data_format: str
+    columns: dict[str, list[str] | np.ndarray]
+    n_rows: int
+    source_columns: list[str]
+    dataset_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    last_access: float = field(default_factory=time.time)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns."""
+        total = 0
+        for values in self.columns.values():
+            if isinstance(values, np.ndarray):
+                total += values.nbytes
+            else:
+                total += sum(len(v) for v in values) + 8 * len(values)
+        return total
+
+    def column_lists(self) -> dict[str, list[Any]]:
+        """Columns as JSON-ready lists."""
+        return {
+            name: values.tolist() if isinstance(values, np.ndarray) else list(values)
+            for name, values in self.columns.items()
+        }
+
+    def records(self) -> list[dict[str, Any]]:
+        """One dict per row."""
+        columns = self.column_lists()
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def parse_csv(csv_content: str, data_format: str) -> Dataset | dict[str, Any]:
+    """
+    Parse CSV content into a Dataset in one pass.
+
+    Rows are converted as they are read; blank lines are skipped and extra
+    columns ignored. Every invalid cell is recorded with its line number in
+    csv_content (blank lines before the header count too), and any error
+    fails the whole parse so that no rows are dropped silently.
+
+    Args:
+        csv_content: CSV text with a header row
+        data_format: One of DATA_FORMATS
+
+    Returns:
+        The Dataset, or an error dict with `errors` (up to
+        MAX_REPORTED_ERRORS of them) and `n_errors`
+    """
+    if data_format not in DATA_FORMATS:
+        return {
+            "error": f"Unknown data_format: {data_format}",
+            "valid_formats": list(DATA_FORMATS),
+        }
+    spec = DATA_FORMATS[data_format]
+
+    reader = csv.reader(io.StringIO(csv_content))
+    # The header is the first line that is not blank
+    header = next((row for row in reader if any(cell.strip() for cell in row)), None)
+    if header is None:
+        return {"error": "No data found in CSV"}
+    header = [name.strip() for name in header]
+    missing = [name for name, _ in spec if name not in header]
+    if missing:
+        return {
+            "error": f"Missing required columns for {data_format} format: {missing}",
+            "found_columns": header,
+            "required_columns": [name for name, _ in spec],
+        }
+
+    positions = [(name, header.index(name), kind) for name, kind in spec]
+    width = max(position for _, position, _ in positions) + 1
+    columns: dict[str, Any] = {
+        name: array(_TYPECODES[kind]) if kind in _TYPECODES else []
+        for name, kind in spec
+    }
+    errors: list[dict[str, Any]] = []
+    n_errors = 0
+    n_rows = 0
+
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        line = reader.line_num
+        if len(row) < width:
+            n_errors += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(
+                    {
+                        "line": line,
+                        "error": f"Expected {len(header)} fields, got {len(row)}",
+                    }
+                )
+            continue
+        for name, position, kind in positions:
+            cell = row[position].strip()
+            try:
+                if kind is str:
+                    if not cell:
+                        raise ValueError("empty value")
+                    value = cell
+                else:
+                    value = kind(cell)
+            except ValueError:
+                n_errors += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(
+                        {
+                            "line": line,
+                            "column": name,
+                            "value": cell,
+                            "error": f"Expected {kind.__name__}",
+                        }
+                    )
+                # Keep the columns aligned; the parse fails anyway
+                value = kind()
+            columns[name].append(value)
+        n_rows += 1
+
+    if n_errors:
+        return {
+            "error": f"{n_errors} invalid values in CSV",
+            "errors": errors,
+            "n_errors": n_errors,
+        }
+    if n_rows == 0:
+        return {"error": "No data found in CSV"}
+
+    return Dataset(
+        data_format=data_format,
+        columns={
+            name: np.frombuffer(values, dtype=values.typecode)
+            if isinstance(values, array)
+            else values
+            for name, values in columns.items()
+        },
+        n_rows=n_rows,
+        source_columns=header,
+    )
+
+
+class DatasetStore:
+    """Thread-safe registry of parsed datasets, with TTL and LRU eviction."""
+
+    def __init__(self, ttl: float | None = None, max_bytes: int | None = None):
+        """
+        Args:
+            ttl: Seconds an unused dataset is kept. Defaults to
+                NETMETA_STATE_TTL or 3600; 0 keeps datasets forever.
+            max_bytes: Memory budget. Defaults to NETMETA_DATASET_MAX_MB
+                or 256 MB.
+        """
+        if ttl is None:
+            ttl = float(os.environ.get("NETMETA_STATE_TTL", 3600))
+        self._ttl = ttl or None
+        if max_bytes is None:
+            max_mb = float(os.environ.get("NETMETA_DATASET_MAX_MB", DEFAULT_MAX_MB))
+            max_bytes = int(max_mb * 1024 * 1024)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._datasets: dict[str, Dataset] = {}
+
+    def add(self, dataset: Dataset) -> None:
+        """Register a dataset."""
+        with self._lock:
+            self._datasets[dataset.dataset_id] = dataset
+            self._evict()
+
+    def get(self, dataset_id: str) -> Dataset | None:
+        """Look up a dataset; None if it does not exist or has expired."""
+        with self._lock:
+            self._evict()
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                dataset.last_access = time.time()
+            return dataset
+
+    def _evict(self) -> None:
+        now = time.time()
+        if self._ttl is not None:
+            for dataset in list(self._datasets.values()):
+                if now - dataset.last_access > self._ttl:
+                    del self._datasets[dataset.dataset_id]
+        by_age = sorted(self._datasets.values(), key=lambda d: d.last_access)
+        total = sum(dataset.nbytes for dataset in by_age)
+        while len(by_age) > 1 and total > self._max_bytes:
+            dataset = by_age.pop(0)
+            total -= dataset.nbytes
+            del self._datasets[dataset.dataset_id]
+
+    def clear(self) -> None:
+        """Forget all datasets."""
+        with self._lock:
+            self._datasets.clear()
+
+
+class SharedDatasetStore(DatasetStore):
+    """
+    Registry of parsed datasets shared by several processes.
+
+    Datasets are rows of the shared state database of a state directory
+    (see state.connect), with their columns in .npz format.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        ttl: float | None = None,
+        max_bytes: int | None = None,
+    ):
+        """
+        Args:
+            directory: Shared state directory
+            ttl, max_bytes: As for DatasetStore
+        """
+        super().__init__(ttl, max_bytes)
+        self._db = connect(Path(directory))
+        with transaction(self._db) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS datasets (
+                    dataset_id TEXT PRIMARY KEY,
+                    data_format TEXT NOT NULL,
+                    n_rows INTEGER NOT NULL,
+                    source_columns TEXT NOT NULL,
+                    columns BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+
+    def add(self, dataset: Dataset) -> None:
+        """Register a dataset."""
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            **{name: np.asarray(values) for name, values in dataset.columns.items()},
+        )
+        with self._lock:
+            with transaction(self._db) as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        dataset.dataset_id,
+                        dataset.data_format,
+                        dataset.n_rows,
+                        json.dumps(dataset.source_columns),
+                        buffer.getvalue(),
+                        dataset.nbytes,
+                        dataset.last_access,
+                    ),
+                )
+                self._evict_rows(db)
+
+    def get(self, dataset_id: str) -> Dataset | None:
+        """Look up a dataset; None if it does not exist or has expired."""
+        now = time.time()
+        with self._lock:
+            with transaction(self._db) as db:
+                self._evict_rows(db)
+                db.execute(
+                    "UPDATE datasets SET last_access = ? WHERE dataset_id = ?",
+                    (now, dataset_id),
+                )
+                row = db.execute(
+                    "SELECT data_format, n_rows, source_columns, columns "
+                    "FROM datasets WHERE dataset_id = ?",
+                    (dataset_id,),
+                ).fetchone()
+        if row is None:
+            return None
+        data_format, n_rows, source_columns, payload = row
+        with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+            columns = {
+                name: arrays[name].tolist() if kind is str else arrays[name]
+                for name, kind in DATA_FORMATS[data_format]
+            }
+        return Dataset(
+            data_format=data_format,
+            columns=columns,
+            n_rows=n_rows,
+            source_columns=json.loads(source_columns),
+            dataset_id=dataset_id,
+            last_access=now,
+        )
+
+    def _evict_rows(self, db) -> None:
+        """Delete expired datasets, then least recently used ones over budget."""
+        if self._ttl is not None:
+            db.execute(
+                "DELETE FROM datasets WHERE last_access < ?",
+                (time.time() - self._ttl,),
+            )
+        rows = db.execute(
+            "SELECT dataset_id, size FROM datasets ORDER BY last_access DESC"
+        ).fetchall()
+        total = 0
+        # The most recent dataset is always kept, as in DatasetStore
+        for count, (dataset_id, size) in enumerate(rows):
+            total += size
+            if count and total > self._max_bytes:
+                db.execute("DELETE FROM datasets WHERE dataset_id = ?", (dataset_id,))
+
+    def clear(self) -> None:
+        """Close the database; the shared datasets are kept for the others."""
+        with self._lock:
+            self._db.close()
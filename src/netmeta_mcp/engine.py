@@ -0,0 +1,453 @@
+"""
+NumPy engine for NetMeta
+
+A native implementation of the frequentist network meta-analysis that
+netmeta fits (Rücker's graph-theoretical approach), used as a fast path
+that needs no R process. It covers the common effect model and the
+DerSimonian-Laird random effects model, with netmeta's adjustment of the
+weights of multi-arm studies, and produces the same ResultBundle as the R
+bundle script so every follow-up tool works on either engine.
+
+The engine is experimental: estimates are meant to agree with netmeta to
+ENGINE_TOLERANCE (absolute difference), which tests/test_engine.py checks
+once netmeta results are recorded for the bundled examples; until then it
+has not been validated against netmeta. On a machine with R and netmeta,
+`python -m netmeta_mcp.engine examples/*.json` compares both engines, and
+`--record tests/data/netmeta` records the reference results the tests use.
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .results import ModelResult, ResultBundle, json_values
+
+# Engines run_netmeta can use
+ENGINES = ("r", "numpy")
+
+# Largest absolute difference from netmeta accepted for effects, standard
+# errors, confidence limits and tau^2
+ENGINE_TOLERANCE = 1e-6
+
+# Quantile of the standard normal distribution for 95% confidence intervals
+_Z_95 = 1.959963984540054
+
+
+class EngineError(ValueError):
+    """Raised when the input cannot be analysed."""
+
+
+def collation_key(label: str) -> tuple[str, str]:
+    """Sort key approximating R's ordering of labels in English locales."""
+    return (label.casefold(), label)
+
+
+def _study_weights(
+    variances: np.ndarray, arms: np.ndarray, local: np.ndarray
+) -> np.ndarray:
+    """
+    Weights of one study's comparisons.
+
+    Two-arm studies use inverse variances. For multi-arm studies the
+    comparison variances are turned into the study's Laplacian pseudoinverse
+    (Rücker 2012), whose inverse gives the reduced weights of the edges.
+
+    Args:
+        variances: Variance of each comparison of the study
+        arms: Treatments of the study
+        local: Row and column of each comparison within `arms`
+    """
+    if len(arms) == 2:
+        return 1.0 / variances
+    k = len(arms)
+    distances = np.zeros((k, k))
+    distances[local[:, 0], local[:, 1]] = variances
+    distances[local[:, 1], local[:, 0]] = variances
+    centre = np.eye(k) - 1.0 / k
+    laplacian = np.linalg.pinv(-0.5 * centre @ distances @ centre)
+    return -laplacian[local[:, 0], local[:, 1]]
+
+
+class Network:
+    """
+    Pairwise comparisons prepared for fitting.
+
+    Treatments are sorted and each comparison is oriented so that treat1
+    sorts before treat2, with the sign of its effect flipped as needed,
+    as netmeta does. Like netmeta, comparisons with a missing TE or seTE,
+    or a seTE that is not positive, are left out.
+    """
+
+    def __init__(self, data: Sequence[dict[str, Any]]):
+        """
+        Args:
+            data: List of pairwise comparisons with study, treat1, treat2,
+                TE and seTE
+
+        Raises:
+            EngineError: If a field is missing or invalid, a multi-arm study
+                lacks some of its comparisons, or the network is disconnected
+        """
+        if not data:
+            raise EngineError("No comparisons given")
+        try:
+            te = np.array([row["TE"] for row in data], dtype=float)
+            se = np.array([row["seTE"] for row in data], dtype=float)
+            used = ~(np.isnan(te) | np.isnan(se) | (se <= 0))
+            data = [row for row, keep in zip(data, used.tolist()) if keep]
+            studies = [str(row["study"]) for row in data]
+            treat1 = [str(row["treat1"]) for row in data]
+            treat2 = [str(row["treat2"]) for row in data]
+        except KeyError as e:
+            raise EngineError(f"Missing field: {e.args[0]}") from None
+        except (TypeError, ValueError) as e:
+            raise EngineError(f"TE and seTE must be numeric: {e}") from None
+        if not data:
+            raise EngineError("No comparison has a TE and a positive seTE")
+        te, se = te[used], se[used]
+        if not np.all(np.isfinite(te) & np.isfinite(se)):
+            raise EngineError("TE and seTE must be finite for every comparison")
+        if any(a == b for a, b in zip(treat1, treat2)):
+            raise EngineError("Treatments must differ within each comparison")
+
+        self.treatments = sorted(set(treat1) | set(treat2), key=collation_key)
+        index = {t: i for i, t in enumerate(self.treatments)}
+        first = np.array([index[t] for t in treat1])
+        second = np.array([index[t] for t in treat2])
+        swap = first > second
+        self.treat1 = np.where(swap, second, first)
+        self.treat2 = np.where(swap, first, second)
+        self.te = np.where(swap, -te, te)
+        self.variance = se**2
+
+        self.studies = list(dict.fromkeys(studies))
+        study_index = {s: i for i, s in enumerate(self.studies)}
+        self.study = np.array([study_index[s] for s in studies])
+
+        # Two-arm studies are handled as vectors; multi-arm studies keep
+        # their comparisons with the arms they connect
+        sizes = np.bincount(self.study)
+        self._two_arm = np.flatnonzero(sizes[self.study] == 1)
+        self._groups = []
+        order = np.argsort(self.study, kind="stable")
+        for rows in np.split(order, np.flatnonzero(np.diff(self.study[order])) + 1):
+            if len(rows) == 1:
+                continue
+            arms = np.unique(np.concatenate([self.treat1[rows], self.treat2[rows]]))
+            k = len(arms)
+            pairs = {(a, b) for a, b in zip(self.treat1[rows], self.treat2[rows])}
+            if len(rows) != k * (k - 1) // 2 or len(pairs) != len(rows):
+                raise EngineError(
+                    f"Study '{self.studies[self.study[rows[0]]]}' has {len(rows)} "
+                    f"comparisons; a study with {k} arms needs each of its "
+                    f"{k * (k - 1) // 2} pairs once"
+                )
+            local = np.searchsorted(
+                arms, np.column_stack([self.treat1[rows], self.treat2[rows]])
+            )
+            self._groups.append((rows, arms, local))
+
+        n = len(self.treatments)
+        self.df = (
+            len(self._two_arm)
+            + sum(len(arms) - 1 for _, arms, _ in self._groups)
+            - (n - 1)
+        )
+        self._check_connected()
+
+    def _check_connected(self) -> None:
+        parent = list(range(len(self.treatments)))
+
+        def root(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in zip(self.treat1, self.treat2):
+            parent[root(a)] = root(b)
+        components = {root(i) for i in range(len(self.treatments))}
+        if len(components) > 1:
+            raise EngineError(
+                f"Network consists of {len(components)} separate sub-networks"
+            )
+
+    def weights(self, tau2: float = 0.0) -> np.ndarray:
+        """Weights of all comparisons, with tau2 added to every variance."""
+        w = np.empty(len(self.te))
+        w[self._two_arm] = 1.0 / (self.variance[self._two_arm] + tau2)
+        for rows, arms, local in self._groups:
+            w[rows] = _study_weights(self.variance[rows] + tau2, arms, local)
+        return w
+
+    def _add_edges(
+        self, matrix: np.ndarray, rows: np.ndarray, values: np.ndarray
+    ) -> None:
+        """Add values times the Laplacian of each comparison's edge to matrix."""
+        a, b = self.treat1[rows], self.treat2[rows]
+        np.add.at(matrix, (a, a), values)
+        np.add.at(matrix, (b, b), values)
+        np.add.at(matrix, (a, b), -values)
+        np.add.at(matrix, (b, a), -values)
+
+    def _fit(self, w: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Treatment effects (sum-to-zero) and the Laplacian pseudoinverse."""
+        n = len(self.treatments)
+        laplacian = np.zeros((n, n))
+        self._add_edges(laplacian, np.arange(len(w)), w)
+        laplacian_pinv = np.linalg.pinv(laplacian)
+        # B'Wy without forming the incidence matrix B
+        flow = np.bincount(self.treat1, w * self.te, n) - np.bincount(
+            self.treat2, w * self.te, n
+        )
+        return laplacian_pinv @ flow, laplacian_pinv
+
+    def model(self, w: np.ndarray) -> tuple[ModelResult, float, np.ndarray]:
+        """Estimates of one model, its Q statistic and Laplacian pseudoinverse."""
+        theta, lp = self._fit(w)
+        te = theta[:, None] - theta[None, :]
+        d = np.diag(lp)
+        se = np.sqrt(np.maximum(d[:, None] + d[None, :] - 2 * lp, 0.0))
+        np.fill_diagonal(se, 0.0)
+        residuals = self.te - (theta[self.treat1] - theta[self.treat2])
+        q = float(np.sum(w * residuals**2))
+        model = ModelResult(
+            te=te,
+            se=se,
+            lower=te - _Z_95 * se,
+            upper=te + _Z_95 * se,
+        )
+        return model, q, lp
+
+    def tau2(self, w: np.ndarray, q: float, lp: np.ndarray) -> float:
+        """DerSimonian-Laird estimate of tau^2 from the common effect fit."""
+        if self.df <= 0:
+            return 0.0
+        # trace((I - H) (BB' * E) W) / 2, with E marking comparisons of the
+        # same study, equals sum(w) - trace(L+ sum_s L_s^2) / 2 where L_s is
+        # the weighted Laplacian of study s
+        squares = np.zeros_like(lp)
+        # For a single edge of weight w, L_s^2 is 2 w^2 times its Laplacian
+        self._add_edges(squares, self._two_arm, 2 * w[self._two_arm] ** 2)
+        for rows, arms, local in self._groups:
+            b = np.zeros((len(rows), len(arms)))
+            b[np.arange(len(rows)), local[:, 0]] = 1.0
+            b[np.arange(len(rows)), local[:, 1]] = -1.0
+            study_laplacian = b.T @ (w[rows, None] * b)
+            squares[np.ix_(arms, arms)] += study_laplacian @ study_laplacian
+        denominator = float(np.sum(w) - np.sum(lp * squares) / 2)
+        return max(0.0, (q - self.df) / denominator)
+
+
+def _edges(network: Network) -> list[dict[str, Any]]:
+    """Number of comparisons per pair of treatments, ordered by `to` then `from`."""
+    counts: dict[tuple[int, int], int] = {}
+    for a, b in zip(network.treat1.tolist(), network.treat2.tolist()):
+        counts[(a, b)] = counts.get((a, b), 0) + 1
+    trts = network.treatments
+    return [
+        {"from": trts[a], "to": trts[b], "n_studies": k}
+        for (a, b), k in sorted(counts.items(), key=lambda item: item[0][::-1])
+    ]
+
+
+def fit(
+    data: Sequence[dict[str, Any]],
+    sm: str = "OR",
+    reference: str | None = None,
+) -> ResultBundle:
+    """
+    Fit the common and random effects network meta-analysis models.
+
+    Args:
+        data: List of pairwise comparisons (study, treat1, treat2, TE, seTE)
+        sm: Summary measure; TE is taken to be on its analysis scale
+        reference: Reference treatment, or None
+
+    Returns:
+        A ResultBundle with both models, heterogeneity and edges
+
+    Raises:
+        EngineError: If the data cannot be analysed
+    """
+    network = Network(data)
+    if reference and reference not in network.treatments:
+        raise EngineError(
+            f"Reference treatment '{reference}' must match one of: "
+            + ", ".join(network.treatments)
+        )
+
+    w_common = network.weights()
+    common, q, lp = network.model(w_common)
+    tau2 = network.tau2(w_common, q, lp)
+    random, _, _ = network.model(network.weights(tau2))
+
+    if network.df > 0 and q > 0:
+        i2 = max(0.0, (q - network.df) / q)
+    else:
+        i2 = None
+    return ResultBundle(
+        treatments=network.treatments,
+        sm=sm,
+        reference=reference or "",
+        common=common,
+        random=random,
+        heterogeneity={"tau2": tau2, "tau": math.sqrt(tau2), "I2": i2},
+        edges=_edges(network),
+    )
+
+
+def _max_difference(a: Any, b: Any) -> float:
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    both = ~(np.isnan(a) | np.isnan(b))
+    if np.any(np.isnan(a) != np.isnan(b)):
+        return math.inf
+    return float(np.max(np.abs(a[both] - b[both]), initial=0.0))
+
+
+def compare(bundle: ResultBundle, reference: ResultBundle) -> dict[str, float]:
+    """Largest absolute differences between two bundles of the same data."""
+    if bundle.treatments != reference.treatments:
+        return {"treatments": math.inf}
+    differences = {}
+    for name in ("common", "random"):
+        ours, theirs = bundle.model(name == "random"), reference.model(name == "random")
+        for field in ("te", "se", "lower", "upper"):
+            differences[f"{name}.{field}"] = _max_difference(
+                getattr(ours, field), getattr(theirs, field)
+            )
+    differences["tau2"] = _max_difference(
+        bundle.heterogeneity["tau2"], reference.heterogeneity["tau2"]
+    )
+    return differences
+
+
+def bundle_payload(bundle: ResultBundle) -> dict[str, Any]:
+    """A bundle in the layout of the R bundle script (see ResultBundle.from_r)."""
+    models = {}
+    for name in ("common", "random"):
+        model = bundle.model(name == "random")
+        models[name] = {
+            # Column-major, as R writes matrices
+            key: json_values(getattr(model, field).T)
+            for key, field in (
+                ("TE", "te"),
+                ("seTE", "se"),
+                ("lower", "lower"),
+                ("upper", "upper"),
+            )
+        }
+    return {
+        "treatments": bundle.treatments,
+        "sm": bundle.sm,
+        "reference": bundle.reference,
+        **models,
+        "heterogeneity": bundle.heterogeneity,
+        "edges": {
+            key: [edge[key] for edge in bundle.edges]
+            for key in ("from", "to", "n_studies")
+        },
+    }
+
+
+def _netrank(bridge, analysis_id: str) -> dict[str, Any]:
+    """netrank() P-scores of a saved analysis, per direction and model."""
+    analysis = bridge._get_analysis(analysis_id, None)
+    script = f'''
+        result <- readRDS("{analysis.path}")
+        pscores <- function(small) {{
+            ranking <- netrank(result, small.values = small)
+            list(
+                common = I(unname(ranking$Pscore.common[result$trts])),
+                random = I(unname(ranking$Pscore.random[result$trts]))
+            )
+        }}
+        output <- list(
+            undesirable = pscores("undesirable"),
+            desirable = pscores("desirable")
+        )
+        cat(toJSON(output, auto_unbox = TRUE, digits = NA, na = "null"))
+        '''
+    return bridge._run_r_script(script)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Compare the NumPy engine with R netmeta on example datasets."""
+    parser = argparse.ArgumentParser(
+        prog="python -m netmeta_mcp.engine",
+        description="Compare the NumPy engine with R netmeta on example datasets.",
+    )
+    parser.add_argument("datasets", nargs="+", type=Path, help="Example JSON files")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=ENGINE_TOLERANCE,
+        help=f"Largest accepted absolute difference (default {ENGINE_TOLERANCE:g})",
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        metavar="DIR",
+        help="Also write netmeta's results as reference files for the tests",
+    )
+    args = parser.parse_args(argv)
+
+    from .r_bridge import NetmetaBridge
+
+    bridge = NetmetaBridge()
+    failed = False
+    try:
+        for path in args.datasets:
+            example = json.loads(path.read_text())
+            data = example["data"]
+            if example.get("format") == "arm-level":
+                outcome = "binary" if "events" in data[0] else "continuous"
+                data = bridge.pairwise_to_netmeta(
+                    data, outcome_type=outcome, sm=example.get("sm"), engine="r"
+                )
+                if isinstance(data, dict):
+                    print(f"{path.name}: conversion failed: {data['error']}")
+                    failed = True
+                    continue
+            sm = example.get("sm", "OR")
+            reference = example.get("reference")
+            output = bridge.run_netmeta(data, sm=sm, reference=reference)
+            if "error" in output:
+                print(f"{path.name}: R failed: {output['error']}")
+                failed = True
+                continue
+            r_bundle = bridge._get_bundle(output["analysis_id"], None)
+            if args.record is not None:
+                args.record.mkdir(parents=True, exist_ok=True)
+                reference_file = {
+                    "sm": sm,
+                    "reference": reference,
+                    "data": data,
+                    "netmeta": bundle_payload(r_bundle),
+                    "netrank": _netrank(bridge, output["analysis_id"]),
+                }
+                (args.record / path.name).write_text(
+                    json.dumps(reference_file, indent=1) + "\n"
+                )
+            differences = compare(fit(data, sm=sm, reference=reference), r_bundle)
+            worst = max(differences, key=differences.get)
+            ok = differences[worst] <= args.tolerance
+            failed |= not ok
+            print(
+                f"{path.name}: {'ok' if ok else 'FAILED'} "
+                f"(max difference {differences[worst]:.3g} in {worst})"
+            )
+    finally:
+        bridge.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
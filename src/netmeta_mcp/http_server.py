@@ -2,28 +2,111 @@
 NetMeta MCP HTTP Server
 
 Run the MCP server with Streamable HTTP transport for web deployment.
+
+With several worker processes (--workers or NETMETA_HTTP_WORKERS), any
+request may reach any worker. The workers then serve MCP statelessly and
+keep analyses and datasets in a shared state directory (see
+state.SharedAnalysisStore), so follow-up calls find results computed by
+another worker.
 """
 
+import argparse
 import contextlib
+import os
+import shutil
+import tempfile
+import uuid
 
 from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
-from starlette.routing import Mount
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from . import metrics
+from .server import add_bridge_arguments, configure_bridge, mcp, r_bridge
+
+# Default number of server processes
+DEFAULT_WORKERS = 1
+
+# Number of server processes; main() passes it on to the workers
+WORKERS = int(os.environ.get("NETMETA_HTTP_WORKERS", DEFAULT_WORKERS))
+
+if WORKERS > 1:
+    # MCP sessions live in the memory of one process, and the next request
+    # of a session may reach another one
+    mcp.settings.stateless_http = True
+    # Each process keeps its own metrics, and a scrape reaches one of them
+    metrics.REGISTRY.constant_labels = {"pid": str(os.getpid())}
 
-from .server import mcp
+metrics.R_WORKERS.set_function(lambda: r_bridge.status()["workers"])
+metrics.R_WORKERS_BUSY.set_function(lambda: r_bridge.status()["workers_busy"])
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: Starlette):
     """Manage server lifecycle."""
+    # Start R in the background so the server accepts connections at once
+    r_bridge.start_background()
     async with mcp.session_manager.run():
         yield
 
 
+async def health(request: Request) -> JSONResponse:
+    """Liveness probe: the HTTP server is up."""
+    return JSONResponse({"status": "ok"})
+
+
+async def ready(request: Request) -> JSONResponse:
+    """Readiness probe: 200 once the R backend is ready, 503 before."""
+    status = r_bridge.status()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus metrics: R, JSON and tool call timings, errors and load."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+class SessionIds:
+    """
+    Issue MCP session ids for stateless workers.
+
+    Stateless MCP does not track sessions, but the tools still use the
+    session id to find a client's latest analysis in the shared state.
+    A request without an id gets a fresh one in its response, which
+    clients send back with every following request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or any(
+            name == b"mcp-session-id" for name, _ in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        session_id = uuid.uuid4().hex.encode()
+
+        async def send_with_session_id(message):
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", []), (b"mcp-session-id", session_id)]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_session_id)
+
+
+mcp_app = mcp.streamable_http_app()
+
 # Create Starlette app with MCP mounted
 app = Starlette(
     routes=[
-        Mount("/mcp", app=mcp.streamable_http_app()),
+        Route("/health", health),
+        Route("/ready", ready),
+        Route("/metrics", metrics_endpoint),
+        Mount("/mcp", app=SessionIds(mcp_app) if WORKERS > 1 else mcp_app),
     ],
     lifespan=lifespan,
 )
@@ -41,12 +124,46 @@ def main():
     """Run the HTTP server."""
     import uvicorn
 
-    uvicorn.run(
-        "netmeta_mcp.http_server:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=False,
+    parser = argparse.ArgumentParser(description="NetMeta MCP server (HTTP)")
+    add_bridge_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Number of server processes (default: NETMETA_HTTP_WORKERS or 1)",
     )
+    args = parser.parse_args()
+    if args.workers <= 1:
+        configure_bridge(args)
+        uvicorn.run(
+            "netmeta_mcp.http_server:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=False,
+        )
+        return
+
+    # The workers import the app afresh, so they are configured through
+    # the environment: each one runs its own R worker pool
+    os.environ["NETMETA_HTTP_WORKERS"] = str(args.workers)
+    os.environ["NETMETA_STATE_SHARED"] = "1"
+    if args.r_workers is not None:
+        os.environ["NETMETA_R_WORKERS"] = str(args.r_workers)
+    state_dir = None
+    if "NETMETA_STATE_DIR" not in os.environ:
+        state_dir = tempfile.mkdtemp(prefix="netmeta_state_")
+        os.environ["NETMETA_STATE_DIR"] = state_dir
+    try:
+        uvicorn.run(
+            "netmeta_mcp.http_server:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=False,
+            workers=args.workers,
+        )
+    finally:
+        if state_dir is not None:
+            shutil.rmtree(state_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,471 @@
+"""
+Background jobs for NetMeta
+
+A tool call holds its request open until R finishes, which can outlast
+client and proxy timeouts on large networks and batch or sensitivity
+runs. submit_job runs a tool in the background instead and returns a job
+id at once; clients poll job_status, fetch job_result and may call
+cancel_job. Jobs wait in a first-in, first-out queue, at most
+NETMETA_JOB_CONCURRENCY of them run at a time, and finished jobs are kept
+for NETMETA_JOB_TTL seconds.
+
+Cancelling a running job kills the R processes it is using. A job's
+Cancellation lives in a context variable, which reaches the bridge's
+worker threads; while R runs a script, the bridge registers a callback
+that kills the process with on_cancel.
+
+When several server processes share their state (NETMETA_STATE_SHARED=1),
+SharedJobQueue records jobs in the shared state database, so any process
+can report on a job, and cancellations requested elsewhere are picked up
+by the process running it.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from . import metrics
+from .state import connect, transaction
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+
+# Default number of jobs running at once
+DEFAULT_CONCURRENCY = 2
+
+# Default seconds a finished job is kept
+DEFAULT_TTL = 3600.0
+
+# Default maximum number of jobs held, queued or finished
+DEFAULT_MAX_JOBS = 1000
+
+# Seconds between checks for cancellations requested by other processes
+CANCEL_POLL = 0.5
+
+_current: contextvars.ContextVar["Cancellation | None"] = contextvars.ContextVar(
+    "netmeta_job", default=None
+)
+
+
+class Cancellation:
+    """Cancellation state of a job, shared with the threads doing its work."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: list[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Mark the job cancelled and run the registered callbacks."""
+        with self._lock:
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            _call(callback)
+
+    def register(self, callback: Callable[[], Any]) -> None:
+        """Run callback on cancellation (at once, if already cancelled)."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        _call(callback)
+
+    def unregister(self, callback: Callable[[], Any]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def _call(callback: Callable[[], Any]) -> None:
+    try:
+        callback()
+    except Exception as e:  # a process may already have exited
+        logger.debug("Cancellation callback failed: %s", e)
+
+
+def cancelled() -> bool:
+    """Whether the job being run in this context has been cancelled."""
+    cancellation = _current.get()
+    return cancellation is not None and cancellation.cancelled
+
+
+@contextlib.contextmanager
+def on_cancel(callback: Callable[[], Any]) -> Iterator[None]:
+    """
+    Run callback (e.g. kill an R process) if the current job is cancelled
+    during the block. Outside of jobs this does nothing.
+    """
+    cancellation = _current.get()
+    if cancellation is None:
+        yield
+        return
+    cancellation.register(callback)
+    try:
+        yield
+    finally:
+        cancellation.unregister(callback)
+
+
+@dataclass
+class Job:
+    """A tool call run in the background."""
+
+    tool: str
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    result: Any = None
+    error: str | None = None
+    cancellation: Cancellation = field(default_factory=Cancellation)
+    # Position in the queue of another process (SharedJobQueue)
+    position: int | None = None
+    cancel_requested: bool = False
+
+
+class JobQueue:
+    """Bounded-concurrency queue of background jobs, on the event loop."""
+
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        ttl: float | None = None,
+        max_jobs: int | None = None,
+    ):
+        """
+        Args:
+            concurrency: Jobs running at once. Defaults to
+                NETMETA_JOB_CONCURRENCY or 2.
+            ttl: Seconds a finished job is kept. Defaults to
+                NETMETA_JOB_TTL or 3600; 0 keeps jobs until evicted by
+                max_jobs.
+            max_jobs: Maximum number of jobs held. Defaults to
+                NETMETA_JOB_MAX or 1000.
+        """
+        if concurrency is None:
+            concurrency = int(
+                os.environ.get("NETMETA_JOB_CONCURRENCY", DEFAULT_CONCURRENCY)
+            )
+        self._concurrency = max(1, concurrency)
+        if ttl is None:
+            ttl = float(os.environ.get("NETMETA_JOB_TTL", DEFAULT_TTL))
+        self._ttl = ttl or None
+        if max_jobs is None:
+            max_jobs = int(os.environ.get("NETMETA_JOB_MAX", DEFAULT_MAX_JOBS))
+        self._max_jobs = max_jobs
+
+        self._jobs: dict[str, Job] = {}
+        self._queue: deque[tuple[Job, Callable[[], Awaitable[Any]]]] = deque()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def submit(self, tool: str, run: Callable[[], Awaitable[Any]]) -> Job | None:
+        """
+        Queue a job; `run` makes the coroutine that does its work.
+
+        Returns None if the queue is full.
+        """
+        self._evict()
+        if len(self._jobs) >= self._max_jobs:
+            return None
+        job = Job(tool)
+        self._jobs[job.job_id] = job
+        self._queue.append((job, run))
+        self._save(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Look up a job; None if it does not exist or has expired."""
+        self._evict()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """
+        Cancel a job: a queued job is dropped, a running one has its R
+        processes killed. Finished jobs are left as they are.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            self._cancel(job)
+        return job
+
+    def _cancel(self, job: Job) -> None:
+        if job.status in FINISHED:
+            return
+        if job.status == "queued":
+            self._queue = deque(item for item in self._queue if item[0] is not job)
+        job.status = "cancelled"
+        job.finished = time.time()
+        job.cancellation.cancel()
+        task = self._tasks.get(job.job_id)
+        if task is not None:
+            task.cancel()
+        self._save(job)
+        self._update_metrics()
+
+    def position(self, job: Job) -> int | None:
+        """1-based position of a queued job in the queue."""
+        for i, (queued, _) in enumerate(self._queue, start=1):
+            if queued is job:
+                return i
+        return job.position if job.status == "queued" else None
+
+    def status(self, job: Job) -> dict[str, Any]:
+        """The job_status report of a job (times in seconds)."""
+        now = time.time()
+        end = job.finished or now
+        report: dict[str, Any] = {
+            "job_id": job.job_id,
+            "tool": job.tool,
+            "status": job.status,
+            "elapsed": end - job.submitted,
+            "queued_time": (job.started or end) - job.submitted,
+        }
+        if job.status == "queued":
+            report["position"] = self.position(job)
+        if job.started is not None:
+            report["run_time"] = end - job.started
+        if job.error is not None:
+            report["error"] = job.error
+        if job.cancel_requested and job.status not in FINISHED:
+            report["cancel_requested"] = True
+        if job.finished is not None and self._ttl is not None:
+            report["expires_in"] = max(0.0, job.finished + self._ttl - now)
+        return report
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while fewer than `concurrency` are running."""
+        while self._queue and len(self._tasks) < self._concurrency:
+            job, run = self._queue.popleft()
+            job.status = "running"
+            job.started = time.time()
+            self._save(job)
+            self._tasks[job.job_id] = asyncio.get_running_loop().create_task(
+                self._run(job, run)
+            )
+        self._update_metrics()
+
+    async def _run(self, job: Job, run: Callable[[], Awaitable[Any]]) -> None:
+        # The task runs in a copy of the context, so this stays with the job
+        _current.set(job.cancellation)
+        try:
+            result = await run()
+        except asyncio.CancelledError:
+            if job.status != "cancelled":
+                raise
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.job_id, job.tool)
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        else:
+            if job.status != "cancelled":
+                job.result = result
+                failed = isinstance(result, dict) and "error" in result
+                job.status = "failed" if failed else "done"
+                if failed:
+                    job.error = str(result["error"])
+        finally:
+            if job.finished is None:
+                job.finished = time.time()
+            del self._tasks[job.job_id]
+            self._save(job)
+            self._dispatch()
+
+    def _evict(self) -> None:
+        """Drop expired finished jobs, then the oldest finished beyond max_jobs."""
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status in FINISHED),
+            key=lambda job: job.finished,
+        )
+        excess = len(self._jobs) - self._max_jobs + 1
+        for job in finished:
+            expired = self._ttl is not None and now - job.finished > self._ttl
+            if not expired and excess <= 0:
+                break
+            del self._jobs[job.job_id]
+            excess -= 1
+            self._forget(job)
+
+    def _update_metrics(self) -> None:
+        metrics.JOBS.labels("queued").set(len(self._queue))
+        metrics.JOBS.labels("running").set(len(self._tasks))
+
+    def _save(self, job: Job) -> None:
+        """Record a change of a job (see SharedJobQueue)."""
+
+    def _forget(self, job: Job) -> None:
+        """Record the eviction of a job (see SharedJobQueue)."""
+
+
+class SharedJobQueue(JobQueue):
+    """
+    Job queue whose jobs are visible to every process sharing the state.
+
+    Each process runs its own jobs, in its own queue, and records them in
+    the shared state database (see state.connect). A process asked about
+    a job of another one answers from the database, and cancels it by
+    flagging it there; the process running the job polls for such flags.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        concurrency: int | None = None,
+        ttl: float | None = None,
+        max_jobs: int | None = None,
+    ):
+        """
+        Args:
+            directory: Shared state directory. Defaults to
+                NETMETA_STATE_DIR or a fresh temporary directory.
+            concurrency, ttl, max_jobs: As for JobQueue, per process
+        """
+        super().__init__(concurrency, ttl, max_jobs)
+        if directory is None:
+            directory = os.environ.get("NETMETA_STATE_DIR") or tempfile.mkdtemp(
+                prefix="netmeta_state_"
+            )
+        self._owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = connect(Path(directory))
+        self._watcher: asyncio.Task | None = None
+        with transaction(self._db) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    tool TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    submitted REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+    def submit(self, tool: str, run: Callable[[], Awaitable[Any]]) -> Job | None:
+        job = super().submit(tool, run)
+        if job is not None and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        job = super().get(job_id)
+        if job is not None:
+            return job
+        with self._lock:
+            if self._ttl is not None:
+                with transaction(self._db) as db:
+                    db.execute(
+                        "DELETE FROM jobs WHERE finished < ?",
+                        (time.time() - self._ttl,),
+                    )
+            row = self._db.execute(
+                "SELECT owner, tool, status, submitted, started, finished, result, "
+                "error, cancel_requested FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            owner, tool, status, submitted, started, finished = row[:6]
+            result, error, cancel_requested = row[6:]
+            position = None
+            if status == "queued":
+                position = 1 + self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE owner = ? AND status = 'queued' "
+                    "AND submitted < ?",
+                    (owner, submitted),
+                ).fetchone()[0]
+        return Job(
+            tool=tool,
+            job_id=job_id,
+            status=status,
+            submitted=submitted,
+            started=started,
+            finished=finished,
+            result=None if result is None else json.loads(result),
+            error=error,
+            position=position,
+            cancel_requested=bool(cancel_requested),
+        )
+
+    def cancel(self, job_id: str) -> Job | None:
+        if job_id in self._jobs:
+            return super().cancel(job_id)
+        with self._lock, transaction(self._db) as db:
+            db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,)
+            )
+        return self.get(job_id)
+
+    async def _watch(self) -> None:
+        """Cancel local jobs flagged by other processes, while any are active."""
+        while any(job.status not in FINISHED for job in self._jobs.values()):
+            await asyncio.sleep(CANCEL_POLL)
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT job_id FROM jobs WHERE owner = ? AND cancel_requested = 1 "
+                    "AND status IN ('queued', 'running')",
+                    (self._owner,),
+                ).fetchall()
+            for (job_id,) in rows:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    self._cancel(job)
+
+    def _save(self, job: Job) -> None:
+        result = None
+        if job.status in FINISHED and job.result is not None:
+            try:
+                result = json.dumps(job.result)
+            except (TypeError, ValueError) as e:
+                job.status = "failed"
+                job.error = f"Result is not JSON-serialisable: {e}"
+        with self._lock, transaction(self._db) as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, owner, tool, status, submitted, started, "
+                "finished, result, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, "
+                "started = excluded.started, finished = excluded.finished, "
+                "result = excluded.result, error = excluded.error",
+                (
+                    job.job_id,
+                    self._owner,
+                    job.tool,
+                    job.status,
+                    job.submitted,
+                    job.started,
+                    job.finished,
+                    result,
+                    job.error,
+                ),
+            )
+
+    def _forget(self, job: Job) -> None:
+        with self._lock, transaction(self._db) as db:
+            db.execute("DELETE FROM jobs WHERE job_id = ?", (job.job_id,))
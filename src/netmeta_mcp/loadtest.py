@@ -0,0 +1,468 @@
+"""
+Load testing for the NetMeta HTTP server
+
+Opens concurrent MCP sessions against the Streamable HTTP endpoint and
+replays a weighted mix of tool-call scenarios, ramping the number of
+sessions in stages. Each stage reports throughput, latency percentiles
+per tool and error rates.
+
+Every session works on its own synthetic network (see synth.py) whose
+treatment labels carry the session's tag, and the follow-up tools are
+called without an analysis_id, so they resolve the session's latest
+analysis on the server. Any label of another session in a response is
+counted as cross-session contamination.
+
+Each session sends the same network every iteration, so runnetmeta is
+called with the result cache off unless --cache is given; otherwise
+every call after the first is a cache hit that never reaches R.
+
+Load is only ever sent to localhost. Without --url a server is started
+on a free local port for the duration of the run.
+
+Usage:
+    python -m netmeta_mcp.loadtest --concurrency 1,4,16 --stage-seconds 20 \\
+        --mix pairwise=3,arm=1,status=1 --engine numpy --output load.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+from urllib.parse import urlsplit
+
+import anyio
+import httpx
+import numpy as np
+from mcp import ClientSession
+
+try:
+    from mcp.client.streamable_http import streamable_http_client
+except ImportError:  # mcp releases before streamable_http_client
+    from mcp.client.streamable_http import (
+        streamablehttp_client as streamable_http_client,
+    )
+
+from . import synth
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# Default weights of the scenarios replayed by each session
+DEFAULT_MIX = "pairwise=3,arm=1,status=1"
+
+# Seconds to wait for a spawned server to become healthy
+SERVER_STARTUP_TIMEOUT = 60.0
+
+# Labels of the synthetic networks: session tag, then treatment
+_LABEL = re.compile(r"^(u\d+)-T\d+$")
+
+
+@dataclass
+class Call:
+    """One tool call made during a stage."""
+
+    stage: int
+    session: int
+    tool: str
+    seconds: float
+    error: str | None = None
+    contaminated: bool = False
+
+
+def _tagged(records: list[dict[str, Any]], tag: str) -> list[dict[str, Any]]:
+    """Prefix treatment labels with a session tag."""
+    fields = ("treat1", "treat2", "treatment")
+    return [
+        {k: f"{tag}-{v}" if k in fields else v for k, v in row.items()}
+        for row in records
+    ]
+
+
+def _payload(result) -> Any:
+    """The value a tool returned (FastMCP wraps non-dict results in `result`)."""
+    if result.structuredContent is not None:
+        content = result.structuredContent
+        if set(content) == {"result"}:
+            return content["result"]
+        return content
+    for block in result.content:
+        text = getattr(block, "text", None)
+        if text is not None:
+            try:
+                return json.loads(text)
+            except ValueError:
+                return {"error": text} if result.isError else text
+    return None
+
+
+def _labels(value: Any) -> set[str]:
+    """Session tags of every treatment label in a tool result."""
+    tags = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, str):
+            match = _LABEL.match(item)
+            if match:
+                tags.add(match.group(1))
+    return tags
+
+
+class _User:
+    """A client session replaying scenarios on its own network."""
+
+    def __init__(self, index: int, session: ClientSession, args, calls: list[Call]):
+        self.index = index
+        self.tag = f"u{index}"
+        self.session = session
+        self.engine = args.engine
+        self.cache = args.cache
+        self.stage = args.stage
+        self.calls = calls
+        network = {
+            "n_treatments": args.treatments,
+            "n_studies": args.studies,
+            "seed": args.seed + index,
+        }
+        self.pairwise_csv = synth.to_csv(_tagged(synth.generate(**network), self.tag))
+        self.arm_csv = synth.to_csv(
+            _tagged(synth.generate(layout="arm", **network), self.tag)
+        )
+
+    async def call(self, tool: str, arguments: dict[str, Any]) -> Any:
+        """Call a tool and record it; returns its result, or None on error."""
+        start = time.perf_counter()
+        error = None
+        payload = None
+        try:
+            result = await self.session.call_tool(tool, arguments)
+        except Exception as e:  # transport failures count as errors
+            error = f"{type(e).__name__}: {e}"
+        else:
+            payload = _payload(result)
+            if result.isError:
+                error = str(payload)
+            elif isinstance(payload, dict) and "error" in payload:
+                error = str(payload["error"])
+        seconds = time.perf_counter() - start
+        contaminated = bool(_labels(payload) - {self.tag})
+        self.calls.append(
+            Call(self.stage, self.index, tool, seconds, error, contaminated)
+        )
+        return None if error else payload
+
+
+async def _pairwise(user: _User) -> None:
+    """csv_to_json, runnetmeta, then the follow-up tools on the session."""
+    dataset = await user.call(
+        "csv_to_json", {"csv_content": user.pairwise_csv, "include_data": False}
+    )
+    if dataset is None:
+        return
+    analysis = await user.call(
+        "runnetmeta",
+        {
+            "dataset_id": dataset["dataset_id"],
+            "engine": user.engine,
+            "cache": user.cache,
+        },
+    )
+    if analysis is None:
+        return
+    for tool in ("get_league_table", "get_ranking", "get_forest_data"):
+        await user.call(tool, {})
+
+
+async def _arm(user: _User) -> None:
+    """Arm-level csv_to_json, pairwise_to_netmeta, runnetmeta, get_ranking."""
+    dataset = await user.call(
+        "csv_to_json",
+        {
+            "csv_content": user.arm_csv,
+            "data_format": "arm_binary",
+            "include_data": False,
+        },
+    )
+    if dataset is None:
+        return
+    contrasts = await user.call(
+        "pairwise_to_netmeta",
+        {"dataset_id": dataset["dataset_id"], "engine": user.engine},
+    )
+    if contrasts is None:
+        return
+    analysis = await user.call(
+        "runnetmeta", {"data": contrasts, "engine": user.engine, "cache": user.cache}
+    )
+    if analysis is not None:
+        await user.call("get_ranking", {})
+
+
+async def _status(user: _User) -> None:
+    await user.call("get_server_status", {})
+
+
+SCENARIOS: dict[str, Callable[[_User], Awaitable[None]]] = {
+    "pairwise": _pairwise,
+    "arm": _arm,
+    "status": _status,
+}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse "name=weight,..." into scenario weights."""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}; use {list(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("The mix needs a scenario with a positive weight")
+    return weights
+
+
+async def _session(url: str, index: int, deadline: float, args, calls) -> None:
+    """One session: connect, then replay scenarios until the deadline."""
+    start = time.perf_counter()
+    try:
+        async with streamable_http_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                calls.append(
+                    Call(args.stage, index, "initialize", time.perf_counter() - start)
+                )
+                user = _User(index, session, args, calls)
+                rng = random.Random(args.seed + index)
+                names, weights = zip(*args.weights.items())
+                while time.monotonic() < deadline:
+                    await SCENARIOS[rng.choices(names, weights)[0]](user)
+    except Exception as e:  # a failed session is an error, not a crash
+        calls.append(
+            Call(
+                args.stage,
+                index,
+                "session",
+                time.perf_counter() - start,
+                f"{type(e).__name__}: {e}",
+            )
+        )
+
+
+def summarize(calls: list[Call], concurrency: int, seconds: float) -> dict[str, Any]:
+    """Throughput, latency percentiles and error counts of one stage."""
+    tools: dict[str, list[Call]] = {}
+    for call in calls:
+        if call.tool not in ("initialize", "session"):
+            tools.setdefault(call.tool, []).append(call)
+
+    def latency(group: list[Call]) -> dict[str, Any]:
+        times = np.array([call.seconds for call in group])
+        errors = sum(call.error is not None for call in group)
+        return {
+            "calls": len(group),
+            "errors": errors,
+            "error_rate": errors / len(group),
+            "p50": float(np.percentile(times, 50)),
+            "p95": float(np.percentile(times, 95)),
+            "p99": float(np.percentile(times, 99)),
+            "mean": float(times.mean()),
+        }
+
+    tool_calls = [call for group in tools.values() for call in group]
+    sessions = [call for call in calls if call.tool == "initialize"]
+    errors: dict[str, int] = {}
+    for call in calls:
+        if call.error is not None:
+            errors[call.error[:200]] = errors.get(call.error[:200], 0) + 1
+    return {
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "sessions_opened": len(sessions),
+        "sessions_failed": sum(call.tool == "session" for call in calls),
+        "session_open_p50": (
+            float(np.percentile([c.seconds for c in sessions], 50)) if sessions else None
+        ),
+        "throughput": len(tool_calls) / seconds,
+        "overall": latency(tool_calls) if tool_calls else None,
+        "tools": {tool: latency(group) for tool, group in sorted(tools.items())},
+        "contaminated": sum(call.contaminated for call in calls),
+        "errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+    }
+
+
+async def run(url: str, args) -> list[dict[str, Any]]:
+    """Run every concurrency stage and return their summaries."""
+    stages = []
+    print(
+        f"engine {args.engine}, result cache {'on' if args.cache else 'off'}",
+        file=sys.stderr,
+    )
+    for stage, concurrency in enumerate(args.concurrency):
+        args.stage = stage
+        calls: list[Call] = []
+        start = time.monotonic()
+        deadline = start + args.stage_seconds
+        async with anyio.create_task_group() as tg:
+            for index in range(concurrency):
+                tg.start_soon(_session, url, index, deadline, args, calls)
+        summary = summarize(calls, concurrency, time.monotonic() - start)
+        summary["cache"] = args.cache
+        stages.append(summary)
+        overall = summary["overall"] or {}
+        print(
+            f"{concurrency:4d} sessions: {summary['throughput']:8.1f} calls/s  "
+            f"p50 {overall.get('p50', 0) * 1000:8.1f} ms  "
+            f"p95 {overall.get('p95', 0) * 1000:8.1f} ms  "
+            f"errors {overall.get('errors', 0) + summary['sessions_failed']}  "
+            f"contaminated {summary['contaminated']}",
+            file=sys.stderr,
+        )
+        if args.calls:
+            summary["calls"] = [asdict(call) for call in calls]
+    return stages
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn_server(port: int) -> subprocess.Popen:
+    """Start the HTTP server on a local port and wait until it is healthy."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "netmeta_mcp.http_server:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"Server exited with code {process.returncode}; "
+                "run python -m netmeta_mcp.http_server to see why"
+            )
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not become healthy in time")
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Load test the HTTP server; exits 1 if sessions saw each other's state."""
+    parser = argparse.ArgumentParser(
+        prog="python -m netmeta_mcp.loadtest",
+        description="Load test the NetMeta MCP HTTP server on localhost.",
+    )
+    parser.add_argument(
+        "--url",
+        help="MCP endpoint of a server on localhost "
+        "(default: start a server on a free port)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8",
+        help="Concurrent sessions of each stage, comma-separated (default: 1,2,4,8)",
+    )
+    parser.add_argument(
+        "--stage-seconds", type=float, default=10.0, help="Duration of each stage"
+    )
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help=f"Scenario weights, e.g. {DEFAULT_MIX} (scenarios: {', '.join(SCENARIOS)})",
+    )
+    parser.add_argument("--engine", choices=("r", "numpy"), default="r")
+    parser.add_argument(
+        "--treatments", type=int, default=8, help="Treatments per session network"
+    )
+    parser.add_argument(
+        "--studies", type=int, default=20, help="Studies per session network"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the result cache enabled for runnetmeta",
+    )
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument(
+        "--calls", action="store_true", help="Include every call in the report"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        args.concurrency = [int(n) for n in args.concurrency.split(",")]
+        args.weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    if args.url is None:
+        port = _free_port()
+        # The MCP app is mounted at /mcp and serves its own path below that
+        from .server import mcp
+
+        # Importing the server configures logging for it; keep the report readable
+        logging.disable(logging.INFO)
+        url = f"http://127.0.0.1:{port}/mcp{mcp.settings.streamable_http_path}"
+        server = _spawn_server(port)
+    else:
+        url = args.url
+        if urlsplit(url).hostname not in LOCAL_HOSTS:
+            parser.error("Load tests only run against localhost")
+
+    try:
+        stages = anyio.run(run, url, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = {
+        "url": url,
+        "engine": args.engine,
+        "cache": args.cache,
+        "mix": args.weights,
+        "network": {"treatments": args.treatments, "studies": args.studies},
+        "stages": stages,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(stage["contaminated"] for stage in stages) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
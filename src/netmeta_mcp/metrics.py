@@ -0,0 +1,392 @@
+"""
+Metrics for NetMeta
+
+A small, dependency-free implementation of Prometheus counters, gauges and
+histograms, rendered in the Prometheus text exposition format by the HTTP
+server's /metrics endpoint. Observations are attributed to the MCP tool
+being served through a context variable that record_tool sets for every
+call, so R and JSON timings can be broken down per tool without threading
+the name through the bridge.
+
+Metrics live in the memory of one process. With several server processes
+each one reports its own, and the HTTP server labels every sample with the
+pid of the process that rendered it (see Registry.constant_labels).
+"""
+
+import contextlib
+import contextvars
+import functools
+import math
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Executor
+from typing import Any
+
+# Buckets for durations, in seconds
+TIME_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)  # fmt: skip
+
+# Buckets for payload sizes, in bytes (256 B to 64 MB)
+BYTE_BUCKETS = tuple(256.0 * 4**i for i in range(10))
+
+# Tool label of observations made outside a tool call
+NO_TOOL = "none"
+
+_tool: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "netmeta_tool", default=NO_TOOL
+)
+
+
+def current_tool() -> str:
+    """Name of the tool being served in this context."""
+    return _tool.get()
+
+
+def map_in_context(
+    executor: Executor, fn: Callable[[Any], Any], items: Iterable[Any]
+) -> Iterator[Any]:
+    """
+    As executor.map(fn, items), running every call in a copy of the
+    caller's context taken when the call is submitted.
+
+    Thread pool executors do not carry context variables over, so work
+    they run for a tool call would otherwise be attributed to no tool, and
+    would not see the cancellation of the job it belongs to (see jobs.py).
+    """
+    futures = [
+        executor.submit(contextvars.copy_context().run, fn, item) for item in items
+    ]
+
+    def results() -> Iterator[Any]:
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    return results()
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """A metric family: one child per combination of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str, **named: str):
+        """The child for the given label values."""
+        if named:
+            values = tuple(named[name] for name in self.label_names)
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, constant: dict[str, str]) -> Iterator[tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) of every sample."""
+        with self._lock:
+            children = list(self._children.items())
+        if not self.label_names and not children:
+            children = [((), self.labels())]
+        names = (*constant, *self.label_names)
+        for values, child in children:
+            yield from child.samples(names, (*constant.values(), *values))
+
+    def render(self, constant: dict[str, str] | None = None) -> str:
+        """The metric's samples, with `constant` labels added to each one."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self._samples(constant or {}):
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._function: Callable[[], float] | None = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function whenever metrics are rendered."""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        with self._lock:
+            return self._value
+
+    def samples(self, names, values):
+        yield "", _format_labels(names, values), self.get()
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self, constant):
+        for suffix, labels, value in super()._samples(constant):
+            yield "_total" + suffix, labels, value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+
+class _Buckets:
+    def __init__(self, bounds: tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = len(self._bounds)
+        for i, bound in enumerate(self._bounds):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, names, values):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        for bound, count in zip((*self._bounds, math.inf), counts):
+            cumulative += count
+            labels = _format_labels((*names, "le"), (*values, _format_value(bound)))
+            yield "_bucket", labels, cumulative
+        labels = _format_labels(names, values)
+        yield "_sum", labels, total
+        yield "_count", labels, cumulative
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = TIME_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self._bounds = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self) -> _Buckets:
+        return _Buckets(self._bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        # Labels added to every sample, e.g. the pid of the server process
+        self.constant_labels: dict[str, str] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return (
+            "\n".join(metric.render(self.constant_labels) for metric in self._metrics)
+            + "\n"
+        )
+
+
+REGISTRY = Registry()
+
+# Content type of REGISTRY.render()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+TOOL_CALLS = REGISTRY.register(
+    Histogram("netmeta_tool_seconds", "Duration of tool calls.", ["tool"])
+)
+TOOL_ERRORS = REGISTRY.register(
+    Counter("netmeta_tool_errors", "Tool calls that returned an error.", ["tool"])
+)
+IN_FLIGHT = REGISTRY.register(
+    Gauge("netmeta_tool_calls_in_flight", "Tool calls being served.", ["tool"])
+)
+R_SPAWN = REGISTRY.register(
+    Histogram(
+        "netmeta_r_spawn_seconds",
+        "Time to start an R worker process and load netmeta.",
+    )
+)
+R_POOL_WAIT = REGISTRY.register(
+    Histogram(
+        "netmeta_r_pool_wait_seconds", "Time spent waiting for a free R worker."
+    )
+)
+R_EXEC = REGISTRY.register(
+    Histogram(
+        "netmeta_r_exec_seconds",
+        "R script execution time; mode=process includes starting R.",
+        ["tool", "mode"],
+    )
+)
+R_ERRORS = REGISTRY.register(
+    Counter("netmeta_r_errors", "R scripts that failed or reported an error.", ["tool"])
+)
+JSON_SECONDS = REGISTRY.register(
+    Histogram(
+        "netmeta_json_seconds",
+        "Time to encode input for R and decode R output.",
+        ["tool", "direction"],
+    )
+)
+JSON_BYTES = REGISTRY.register(
+    Histogram(
+        "netmeta_json_bytes",
+        "Size of JSON sent to (encode) and received from (decode) R.",
+        ["tool", "direction"],
+        buckets=BYTE_BUCKETS,
+    )
+)
+JSON_FAILURES = REGISTRY.register(
+    Counter("netmeta_json_parse_failures", "R output that was not valid JSON.", ["tool"])
+)
+RESULT_CACHE = REGISTRY.register(
+    Counter(
+        "netmeta_result_cache_lookups",
+        "Result cache lookups by outcome (hit, disk_hit, miss).",
+        ["result"],
+    )
+)
+R_WORKERS = REGISTRY.register(Gauge("netmeta_r_workers", "R worker processes."))
+R_WORKERS_BUSY = REGISTRY.register(
+    Gauge("netmeta_r_workers_busy", "R workers checked out or restarting.")
+)
+JOBS = REGISTRY.register(
+    Gauge("netmeta_jobs", "Background jobs by status (queued, running).", ["status"])
+)
+
+
+def record_tool(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Record the calls of an async MCP tool under its name (see tool_call).
+    Results with an "error" key count as tool errors.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def call(*args, **kwargs):
+        with tool_call(name):
+            result = await fn(*args, **kwargs)
+        if isinstance(result, dict) and "error" in result:
+            TOOL_ERRORS.labels(name).inc()
+        return result
+
+    return call
+
+
+@contextlib.contextmanager
+def tool_call(tool: str) -> Iterator[None]:
+    """
+    Attribute observations in this context to tool, and time the call.
+    """
+    token = _tool.set(tool)
+    in_flight = IN_FLIGHT.labels(tool)
+    in_flight.inc()
+    try:
+        with TOOL_CALLS.labels(tool).time():
+            yield
+    finally:
+        in_flight.dec()
+        _tool.reset(token)
@@ -0,0 +1,244 @@
+"""
+Per-call profiling for NetMeta
+
+Tools called with `profile=True` (or every tool, with NETMETA_PROFILE=1)
+return a `_timings` block that breaks the call down into phases measured
+on both sides of the bridge: JSON encoding, waiting for an R worker, R
+execution as seen from Python, and inside R the script's evaluation time
+(plus R start-up and package loading when R runs as a one-off process).
+NETMETA_PROFILE_R=1 adds an Rprof summary of the R side and
+NETMETA_PROFILE_PYTHON=1 a cProfile summary of the Python side.
+
+The active profile lives in a context variable, so calls that are not
+profiled pay one lookup per phase and nothing else.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+# Line that separates an R script's output from its timings
+R_MARKER = "__NETMETA_PROFILE__"
+
+# Number of functions listed in Rprof and cProfile summaries
+TOP_FUNCTIONS = 20
+
+# Rprof sampling interval, in seconds
+RPROF_INTERVAL = 0.005
+
+_current: contextvars.ContextVar["Profile | None"] = contextvars.ContextVar(
+    "netmeta_profile", default=None
+)
+
+# Only one cProfile profiler can be active per interpreter (Python 3.12+)
+_cprofile_lock = threading.Lock()
+
+
+class Profile:
+    """Phase durations and profiler summaries collected for one call."""
+
+    def __init__(self, rprof: bool = False, cprofile: bool = False):
+        self.rprof = rprof
+        self.cprofile = cprofile
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._phases: dict[str, float] = {}
+        self._r_phases: dict[str, float] = {}
+        self._r_scripts = 0
+        self._rprof: dict[str, list[float]] = {}
+        self._cprofile: list[dict[str, Any]] | str | None = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        """Add seconds to a Python-side phase."""
+        with self._lock:
+            self._phases[phase] = self._phases.get(phase, 0.0) + seconds
+
+    def record_r(self, timings: dict[str, Any]) -> None:
+        """Add the timings reported by one R script."""
+        with self._lock:
+            self._r_scripts += 1
+            for phase in ("startup", "package_load", "eval"):
+                if timings.get(phase) is not None:
+                    self._r_phases[phase] = self._r_phases.get(phase, 0.0) + float(
+                        timings[phase]
+                    )
+            rprof = timings.get("rprof") or {}
+            for function, total, own in zip(
+                rprof.get("function", []), rprof.get("total", []), rprof.get("self", [])
+            ):
+                seconds = self._rprof.setdefault(function, [0.0, 0.0])
+                seconds[0] += total
+                seconds[1] += own
+
+    def run_cprofile(self, fn: Callable[[], Any]) -> Any:
+        """Call fn under cProfile and keep a summary of the top functions."""
+        if not _cprofile_lock.acquire(blocking=False):
+            self._cprofile = "unavailable: another call is being profiled"
+            return fn()
+        try:
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(fn)
+            finally:
+                self._cprofile = _cprofile_summary(profiler)
+        finally:
+            _cprofile_lock.release()
+
+    def report(self) -> dict[str, Any]:
+        """The `_timings` block (seconds)."""
+        with self._lock:
+            report: dict[str, Any] = {
+                "total": time.perf_counter() - self._start,
+                "phases": dict(self._phases),
+            }
+            if self._r_scripts:
+                report["r_scripts"] = self._r_scripts
+                report["r_phases"] = dict(self._r_phases)
+            if self.rprof and self._rprof:
+                top = sorted(self._rprof.items(), key=lambda item: -item[1][0])
+                report["rprof"] = [
+                    {"function": function, "total": total, "self": own}
+                    for function, (total, own) in top[:TOP_FUNCTIONS]
+                ]
+            if self._cprofile is not None:
+                report["cprofile"] = self._cprofile
+        return report
+
+    def attach(self, result: Any) -> Any:
+        """Add the report to a tool result (wrapping results that are lists)."""
+        if isinstance(result, dict):
+            result["_timings"] = self.report()
+            return result
+        return {"data": result, "_timings": self.report()}
+
+
+def _cprofile_summary(profiler: cProfile.Profile) -> list[dict[str, Any]]:
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "total": cumulative,
+            "self": own,
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in top
+    ]
+
+
+def current() -> Profile | None:
+    """The profile of the call being served, if it is profiled."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def profiled(requested: bool = False) -> Iterator[Profile | None]:
+    """
+    Profile the calls made in this context, if requested or NETMETA_PROFILE=1.
+
+    Yields the Profile, or None when profiling is off.
+    """
+    if not requested and os.environ.get("NETMETA_PROFILE", "0") != "1":
+        yield None
+        return
+    profile = Profile(
+        rprof=os.environ.get("NETMETA_PROFILE_R", "0") == "1",
+        cprofile=os.environ.get("NETMETA_PROFILE_PYTHON", "0") == "1",
+    )
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def phase(name: str, histogram=None) -> Iterator[None]:
+    """
+    Time a block as a phase of the current profile.
+
+    Args:
+        name: Phase name in the `_timings` block
+        histogram: Metrics histogram (see metrics.py) that also observes
+            the duration, whether or not the call is profiled
+    """
+    profile = _current.get()
+    if profile is None and histogram is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(seconds)
+        if profile is not None:
+            profile.record(name, seconds)
+
+
+def wrap_r_script(script: str, profile: Profile) -> str:
+    """
+    Wrap an R script so it reports its timings after its output.
+
+    The timings follow R_MARKER on a line of their own. A script that
+    fails reports no timings. If `.netmeta_boot` is defined (R's elapsed
+    time when the prelude started, set for one-off R processes), R
+    start-up and package loading are reported too.
+    """
+    if profile.rprof:
+        start_rprof = (
+            ".netmeta_rprof_file <- tempfile()\n"
+            f"Rprof(.netmeta_rprof_file, interval = {RPROF_INTERVAL})"
+        )
+        stop_rprof = "Rprof(NULL)"
+        summarise_rprof = """
+.netmeta_timing$rprof <- tryCatch({
+    .netmeta_by_total <- summaryRprof(.netmeta_rprof_file)$by.total
+    list(
+        "function" = I(gsub('"', "", rownames(.netmeta_by_total))),
+        total = I(.netmeta_by_total$total.time),
+        self = I(.netmeta_by_total$self.time)
+    )
+}, error = function(e) NULL)
+unlink(.netmeta_rprof_file)
+"""
+    else:
+        start_rprof = stop_rprof = summarise_rprof = ""
+    return f"""
+.netmeta_profile_start <- proc.time()[["elapsed"]]
+{start_rprof}
+tryCatch({{
+{script}
+}}, finally = {{ {stop_rprof} }})
+.netmeta_timing <- list(eval = proc.time()[["elapsed"]] - .netmeta_profile_start)
+if (exists(".netmeta_boot")) {{
+    .netmeta_timing$startup <- .netmeta_boot
+    .netmeta_timing$package_load <- .netmeta_profile_start - .netmeta_boot
+}}
+{summarise_rprof}
+cat("\\n{R_MARKER}", toJSON(.netmeta_timing, auto_unbox = TRUE, digits = NA), "\\n", sep = "")
+"""
+
+
+# R code run before the prelude of a one-off R process when profiling
+R_BOOT = '.netmeta_boot <- proc.time()[["elapsed"]]'
+
+
+def split_r_output(stdout: str, profile: Profile) -> str:
+    """Remove the timings from an R script's output and record them."""
+    index = stdout.rfind(R_MARKER)
+    if index < 0:
+        return stdout
+    try:
+        profile.record_r(json.loads(stdout[index + len(R_MARKER) :]))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return stdout[:index]
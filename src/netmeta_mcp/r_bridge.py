@@ -3,17 +3,168 @@ R Bridge for NetMeta
 
 Provides Python interface to the R netmeta package using subprocess.
 This approach is more portable than rpy2 and avoids library linking issues.
+
+By default scripts run in a pool of persistent R worker processes (see
+r_worker.py) with netmeta already loaded; a fresh R process per call is used
+as fallback or when NETMETA_R_WORKER=0.
 """
 
+import atexit
+import functools
 import json
+import logging
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
+import anyio.to_thread
+import numpy as np
+
+from . import engine as numpy_engine
+from . import jobs, metrics, profiling
+from .cache import CachedResult, ResultCache, cache_dir, cache_key
+from .contrasts import (
+    ARM_FIELDS,
+    SUMMARY_MEASURES,
+    ConversionError,
+    arms_to_contrasts,
+)
+from .datasets import DatasetStore, SharedDatasetStore, parse_csv
+from .r_worker import DEFAULT_CACHE_SIZE, RWorkerError, RWorkerPool, r_prelude
+from .results import ResultBundle, json_values
+from .state import Analysis, AnalysisStore, SharedAnalysisStore
+
+logger = logging.getLogger(__name__)
+
+# Default per-call timeout for R scripts, in seconds
+DEFAULT_R_TIMEOUT = 300.0
+
+# Default seconds a call waits for a free R worker
+DEFAULT_POOL_WAIT = 60.0
+
+# Default number of scripts a worker runs before it is restarted
+DEFAULT_MAX_JOBS = 200
+
+# Fields read from input records
+PAIRWISE_FIELDS = ("study", "treat1", "treat2", "TE", "seTE")
+
+# Layouts of the pairwise estimates returned by run_netmeta
+OUTPUT_FORMATS = ("rows", "columns")
+
+# R code refitting netmeta once per omitted study for leave_one_out. Expects
+# `data` (input columns, with character labels), `job` (studies, baseline
+# flag) and the model names. Each fit reports its own treatments with its
+# estimates, which Python aligns by label, so refits that lose a treatment
+# or order treatments differently still line up; failed refits (e.g. a
+# disconnected network) report an error.
+_LEAVE_ONE_OUT_SCRIPT = """
+        refit <- function(keep) {
+            fit <- netmeta(
+                TE = data$TE[keep],
+                seTE = data$seTE[keep],
+                treat1 = data$treat1[keep],
+                treat2 = data$treat2[keep],
+                studlab = data$study[keep],
+                sm = sm,
+                reference.group = ""
+            )
+            ranking <- netrank(fit, small.values = "undesirable")
+            list(trts = I(fit$trts),
+                 TE = I(as.vector(fit[[paste0("TE.", model)]][fit$trts, fit$trts])),
+                 tau2 = fit$tau^2,
+                 p_scores = I(unname(ranking[[paste0("Pscore.", model)]][fit$trts])))
+        }
+        refits <- lapply(job$studies, function(study) {
+            tryCatch(
+                refit(data$study != study),
+                error = function(e) list(error = conditionMessage(e))
+            )
+        })
+        output <- list(refits = refits)
+        if (isTRUE(job$baseline)) {
+            output$baseline <- refit(rep(TRUE, length(data$TE)))
+        }
+"""
+
+# R code that derives everything the follow-up tools need from a netmeta
+# `result` into `bundle` (see results.ResultBundle). Both models are always
+# included because netmeta computes them regardless of common/random.
+# Matrices are flattened column-major; I() keeps short vectors as arrays.
+# P-scores are computed in Python from TE and seTE.
+_BUNDLE_SCRIPT = """
+        model_bundle <- function(type) {
+            list(
+                TE = as.vector(result[[paste0("TE.", type)]]),
+                seTE = as.vector(result[[paste0("seTE.", type)]]),
+                lower = as.vector(result[[paste0("lower.", type)]]),
+                upper = as.vector(result[[paste0("upper.", type)]])
+            )
+        }
+        edges_df <- data.frame(
+            from = result$treat1,
+            to = result$treat2,
+            study = result$studlab,
+            stringsAsFactors = FALSE
+        )
+        edge_summary <- aggregate(study ~ from + to, data = edges_df, FUN = length)
+        bundle <- list(
+            treatments = I(result$trts),
+            sm = result$sm,
+            reference = result$reference.group,
+            common = model_bundle("common"),
+            random = model_bundle("random"),
+            heterogeneity = list(
+                tau2 = result$tau^2,
+                tau = result$tau,
+                I2 = result$I2
+            ),
+            edges = list(
+                from = I(edge_summary$from),
+                to = I(edge_summary$to),
+                n_studies = I(edge_summary$study)
+            )
+        )
+"""
+
+
+def _label(value: Any) -> str:
+    """
+    A study or treatment label as R's as.character() writes it (1.0 gives
+    "1"), so that Python and R agree on labels sent to R as text.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _align_fit(
+    fit: dict[str, Any], trts: list[str], pairs: list[tuple[str, str]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Effects of `pairs` and P-scores of `trts` from one leave_one_out fit,
+    looked up by treatment label; NaN where the fit lacks a treatment.
+    """
+    index = {t: i for i, t in enumerate(fit["trts"])}
+    te = np.array(fit["TE"], dtype=float).reshape((len(index), len(index)), order="F")
+    scores = np.array(fit["p_scores"], dtype=float)
+    effects = np.array(
+        [
+            te[index[a], index[b]] if a in index and b in index else np.nan
+            for a, b in pairs
+        ],
+        dtype=float,
+    )
+    p_scores = np.array(
+        [scores[index[t]] if t in index else np.nan for t in trts], dtype=float
+    )
+    return effects, p_scores
+
 
 def _find_r_executable() -> str:
     """Find R executable, preferring conda environment R if available."""
@@ -31,13 +182,150 @@ def _find_r_executable() -> str:
     raise RuntimeError("R is not installed or not in PATH")
 
 
+def _check_cache_path() -> Path:
+    """Return the file caching successful R environment checks."""
+    return cache_dir() / "r_check.json"
+
+
+def _check_cache_key(r_executable: str) -> str:
+    """Identify an R installation by its resolved path and modification time."""
+    path = Path(r_executable).resolve()
+    return f"{path}:{path.stat().st_mtime_ns}"
+
+
 class NetmetaBridge:
-    """Bridge to R netmeta package for network meta-analysis."""
+    """
+    Bridge to R netmeta package for network meta-analysis.
+
+    Construction does not touch R. The R environment is verified and the
+    worker pool started by `start()`, which runs on the first call that
+    needs R or earlier via `start_background()`; `status()` reports
+    readiness.
+    """
+
+    def __init__(
+        self,
+        use_worker: bool | None = None,
+        timeout: float | None = None,
+        pool_size: int | None = None,
+    ):
+        """
+        Configure the bridge.
+
+        Args:
+            use_worker: Run scripts in persistent R workers. Defaults to the
+                NETMETA_R_WORKER environment variable (enabled unless "0").
+            timeout: Per-call timeout in seconds. Defaults to NETMETA_R_TIMEOUT
+                or 300; 0 disables the timeout.
+            pool_size: Number of R workers. Defaults to NETMETA_R_WORKERS or 1.
+        """
+        # Saved netmeta results, keyed by analysis id and MCP session, and
+        # parsed CSV uploads, keyed by dataset id; in a database shared with
+        # the other server processes if NETMETA_STATE_SHARED=1
+        if os.environ.get("NETMETA_STATE_SHARED", "0") == "1":
+            self._store = SharedAnalysisStore()
+            self._datasets = SharedDatasetStore(self._store.directory)
+        else:
+            self._store = AnalysisStore()
+            self._datasets = DatasetStore()
+        # Fitted results keyed by content, unless NETMETA_RESULT_CACHE=0
+        self._cache = (
+            ResultCache() if os.environ.get("NETMETA_RESULT_CACHE", "1") != "0" else None
+        )
+
+        if timeout is None:
+            timeout = float(os.environ.get("NETMETA_R_TIMEOUT", DEFAULT_R_TIMEOUT))
+        self._timeout = timeout or None
+
+        if use_worker is None:
+            use_worker = os.environ.get("NETMETA_R_WORKER", "1") != "0"
+        self._use_worker = use_worker
+        if pool_size is None:
+            pool_size = int(os.environ.get("NETMETA_R_WORKERS", "1"))
+        self._pool_size = pool_size
+
+        self._r_executable: str | None = None
+        self._r_version: str | None = None
+        self._pool: RWorkerPool | None = None
+        self._start_lock = threading.Lock()
+        self._state = "stopped"
+        self._error: str | None = None
+        atexit.register(self.close)
+
+    def start(self) -> None:
+        """
+        Verify the R environment and start the worker pool.
+
+        Safe to call repeatedly and from several threads; only the first
+        successful call does any work. A failed start is retried on the next
+        call.
+
+        Raises:
+            RuntimeError: If R or netmeta is not available
+        """
+        if self._state == "ready":
+            return
+        with self._start_lock:
+            if self._state == "ready":
+                return
+            self._state = "starting"
+            try:
+                self._r_executable = _find_r_executable()
+                self._r_version = self._check_r()
+                if self._use_worker:
+                    self._start_pool()
+            except RuntimeError as e:
+                self._state = "failed"
+                self._error = str(e)
+                raise
+            self._state = "ready"
+            self._error = None
+
+    def start_background(self) -> threading.Thread:
+        """Run `start()` in a daemon thread so callers are not blocked."""
 
-    def __init__(self):
-        """Initialize and verify R environment."""
-        # Find R executable
-        self._r_executable = _find_r_executable()
+        def run() -> None:
+            try:
+                self.start()
+            except RuntimeError as e:
+                logger.warning("R initialization failed: %s", e)
+
+        thread = threading.Thread(target=run, name="netmeta-r-start", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict[str, Any]:
+        """Report readiness of the R backend."""
+        status: dict[str, Any] = {
+            "status": self._state,
+            "r_executable": self._r_executable,
+            "r_version": self._r_version,
+            "workers": self._pool.size if self._pool is not None else 0,
+            "workers_busy": self._pool.busy if self._pool is not None else 0,
+            "result_cache": self._cache.stats() if self._cache is not None else None,
+        }
+        if self._error is not None:
+            status["error"] = self._error
+        return status
+
+    def _check_r(self) -> str:
+        """
+        Verify that R runs and netmeta is installed; return the R version.
+
+        Successful checks are cached on disk, keyed by the R executable's
+        path and modification time, so restarts skip both R processes.
+        """
+        cache_path = _check_cache_path()
+        try:
+            key = _check_cache_key(self._r_executable)
+        except OSError:
+            key = None
+        try:
+            cached = json.loads(cache_path.read_text())
+        except (OSError, ValueError):
+            cached = {}
+        if key is not None and key in cached:
+            return cached[key]["r_version"]
 
         # Verify R works
         try:
@@ -47,8 +335,9 @@ class NetmetaBridge:
                 text=True,
                 check=True,
             )
-        except FileNotFoundError:
+        except (FileNotFoundError, subprocess.CalledProcessError):
             raise RuntimeError("R is not installed or not in PATH")
+        r_version = result.stdout.splitlines()[0] if result.stdout else ""
 
         # Verify netmeta is installed
         check_code = 'cat(requireNamespace("netmeta", quietly=TRUE))'
@@ -56,8 +345,62 @@ class NetmetaBridge:
         if result.strip() != "TRUE":
             raise RuntimeError("R package 'netmeta' is not installed")
 
-        # Store state file path for persisting netmeta results between calls
-        self._state_file = Path(tempfile.gettempdir()) / "netmeta_state.rds"
+        if key is not None:
+            cached[key] = {"r_version": r_version}
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_text(json.dumps(cached))
+                tmp_path.replace(cache_path)
+            except OSError as e:
+                logger.debug("Could not cache R check: %s", e)
+        return r_version
+
+    def start_pool(self, size: int) -> None:
+        """
+        Set the number of R workers, restarting the pool if it is running.
+
+        Pool behaviour is further controlled by NETMETA_R_POOL_WAIT (seconds
+        to wait for a free worker) and NETMETA_R_MAX_JOBS (scripts per worker
+        before it is restarted, 0 to never restart). Each worker keeps the
+        NETMETA_R_CACHE_SIZE most recently used netmeta results in memory.
+        If the workers cannot be started, calls fall back to one R process
+        each.
+        """
+        with self._start_lock:
+            self._pool_size = size
+            self._use_worker = True
+            if self._state == "ready":
+                self._start_pool()
+
+    def _start_pool(self) -> None:
+        pool = RWorkerPool(
+            self._r_executable,
+            size=self._pool_size,
+            timeout=self._timeout,
+            max_jobs=int(os.environ.get("NETMETA_R_MAX_JOBS", DEFAULT_MAX_JOBS)),
+            checkout_timeout=float(
+                os.environ.get("NETMETA_R_POOL_WAIT", DEFAULT_POOL_WAIT)
+            ),
+            cache_size=int(os.environ.get("NETMETA_R_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        )
+        try:
+            pool.start()
+        except RWorkerError as e:
+            logger.warning("%s; falling back to one R process per call", e)
+            pool = None
+
+        old_pool, self._pool = self._pool, pool
+        if old_pool is not None:
+            old_pool.close()
+
+    def close(self) -> None:
+        """Stop the R worker pool and remove temporary analysis state."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        self._store.clear()
+        self._datasets.clear()
 
     def _run_r_code(self, code: str) -> str:
         """Run R code and return stdout."""
@@ -72,12 +415,36 @@ class NetmetaBridge:
 
     def _run_r_script(self, script: str) -> dict[str, Any]:
         """Run R script that outputs JSON and return parsed result."""
+        output = self._run_r(script)
+        if "error" in output:
+            metrics.R_ERRORS.labels(metrics.current_tool()).inc()
+        return output
+
+    def _run_r(self, script: str) -> dict[str, Any]:
+        if jobs.cancelled():
+            return {"error": "Job cancelled"}
+        try:
+            self.start()
+        except RuntimeError as e:
+            return {"error": str(e)}
+
+        profile = profiling.current()
+        if profile is not None:
+            script = profiling.wrap_r_script(script, profile)
+
+        if self._pool is not None:
+            try:
+                output = self._pool.run(script)
+            except RWorkerError as e:
+                return {"error": str(e)}
+            if profile is not None:
+                output = profiling.split_r_output(output, profile)
+            return self._parse_output(output)
+
         # Wrap script to output JSON
         full_script = f"""
-        suppressPackageStartupMessages({{
-            library(netmeta)
-            library(jsonlite)
-        }})
+        {profiling.R_BOOT if profile is not None else ""}
+        {r_prelude()}
         
         tryCatch({{
             {script}
@@ -86,34 +453,161 @@ class NetmetaBridge:
         }})
         """
 
-        result = subprocess.run(
-            [self._r_executable, "--vanilla", "--slave", "-e", full_script],
-            capture_output=True,
-            text=True,
-        )
+        try:
+            with profiling.phase(
+                "r_exec", metrics.R_EXEC.labels(metrics.current_tool(), "process")
+            ):
+                process = subprocess.Popen(
+                    [self._r_executable, "--vanilla", "--slave", "-e", full_script],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+                with jobs.on_cancel(process.kill):
+                    try:
+                        stdout, stderr = process.communicate(timeout=self._timeout)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                        process.communicate()
+                        raise
+        except subprocess.TimeoutExpired:
+            return {"error": f"R timed out after {self._timeout:g}s"}
 
-        if result.returncode != 0:
-            return {"error": f"R error: {result.stderr}"}
+        if jobs.cancelled():
+            return {"error": "Job cancelled"}
+        if process.returncode != 0:
+            return {"error": f"R error: {stderr}"}
 
+        output = stdout
+        if profile is not None:
+            output = profiling.split_r_output(output, profile)
+        return self._parse_output(output)
+
+    def _write_input(self, data: list[dict[str, Any]], fields: tuple[str, ...]) -> Path:
+        """
+        Write input records to a temporary JSON file for R to read.
+
+        Records are stored column-wise ({"TE": [...], ...}) so fromJSON()
+        yields plain vectors, and the payload never passes through the R
+        command line or parser. The caller deletes the file.
+        """
+        columns = {field: [row.get(field) for row in data] for field in fields}
+        return self._write_json(columns)
+
+    def _write_json(self, payload: Any) -> Path:
+        """Write a JSON payload to a temporary file; the caller deletes it."""
+        fd, name = tempfile.mkstemp(
+            prefix="input_", suffix=".json", dir=self._store.directory
+        )
+        tool = metrics.current_tool()
+        with profiling.phase(
+            "json_encode", metrics.JSON_SECONDS.labels(tool, "encode")
+        ), os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+            size = f.tell()
+        metrics.JSON_BYTES.labels(tool, "encode").observe(size)
+        return Path(name)
+
+    @staticmethod
+    def _parse_output(stdout: str) -> dict[str, Any]:
+        """Parse the JSON printed by an R script."""
+        tool = metrics.current_tool()
         try:
             # Find the JSON output (last complete JSON object)
-            output = result.stdout.strip()
+            output = stdout.strip()
             if not output:
                 return {"error": "No output from R"}
-            return json.loads(output)
+            metrics.JSON_BYTES.labels(tool, "decode").observe(len(output))
+            with profiling.phase(
+                "json_decode", metrics.JSON_SECONDS.labels(tool, "decode")
+            ):
+                return json.loads(output)
         except json.JSONDecodeError as e:
+            metrics.JSON_FAILURES.labels(tool).inc()
             return {
                 "error": f"Failed to parse R output: {e}",
-                "raw_output": result.stdout,
+                "raw_output": stdout,
             }
 
+    def load_csv(
+        self,
+        csv_content: str,
+        data_format: str = "pairwise",
+        output_format: str = "rows",
+        include_data: bool = True,
+    ) -> dict[str, Any]:
+        """
+        Parse CSV content and keep it as a dataset (see datasets.parse_csv).
+
+        Args:
+            csv_content: CSV text with a header row
+            data_format: "pairwise", "arm_binary" or "arm_continuous"
+            output_format: "rows" returns the data as a list of records,
+                "columns" as one array per column
+            include_data: Return the parsed data; without it only the
+                `dataset_id` and a summary are returned
+
+        Returns:
+            The parsed data, `dataset_id`, `n_records`, `columns` and
+            `format`, or an error dict listing every invalid value
+        """
+        if output_format not in OUTPUT_FORMATS:
+            return {
+                "error": f"Unknown output_format: {output_format}",
+                "valid_formats": list(OUTPUT_FORMATS),
+            }
+        with profiling.phase("csv_parse"):
+            dataset = parse_csv(csv_content, data_format)
+        if isinstance(dataset, dict):
+            return dataset
+        self._datasets.add(dataset)
+
+        output: dict[str, Any] = {}
+        if include_data:
+            if output_format == "columns":
+                output["data"] = dataset.column_lists()
+            else:
+                output["data"] = dataset.records()
+        output["dataset_id"] = dataset.dataset_id
+        output["n_records"] = dataset.n_rows
+        output["columns"] = dataset.source_columns
+        output["format"] = data_format
+        return output
+
+    def _resolve_data(
+        self,
+        data: list[dict[str, Any]] | None,
+        dataset_id: str | None,
+        formats: tuple[str, ...],
+    ) -> list[dict[str, Any]] | dict[str, Any]:
+        """Return records given directly or by dataset id, or an error dict."""
+        if dataset_id is None:
+            if data is None:
+                return {"error": "Either data or dataset_id is required"}
+            return data
+        dataset = self._datasets.get(dataset_id)
+        if dataset is None:
+            return {"error": f"Unknown or expired dataset_id: {dataset_id}"}
+        if dataset.data_format not in formats:
+            return {
+                "error": f"Dataset {dataset_id} has format {dataset.data_format}; "
+                f"expected {' or '.join(formats)}"
+            }
+        return dataset.records()
+
     def run_netmeta(
         self,
-        data: list[dict[str, Any]],
+        data: list[dict[str, Any]] | None = None,
         sm: str = "OR",
         reference: str | None = None,
         comb_fixed: bool = True,
         comb_random: bool = True,
+        session_id: str | None = None,
+        bundle: bool = True,
+        output_format: str = "rows",
+        engine: str = "r",
+        dataset_id: str | None = None,
+        cache: bool = True,
     ) -> dict[str, Any]:
         """
         Run network meta-analysis.
@@ -124,16 +618,74 @@ class NetmetaBridge:
             reference: Reference treatment
             comb_fixed: Include fixed effects
             comb_random: Include random effects
+            session_id: MCP session the analysis belongs to
+            bundle: Materialize all derived outputs (league tables, P-scores,
+                edges) in the same R call so follow-up queries need no R
+            output_format: "rows" returns fixed/random effects as a list of
+                comparison objects, "columns" as one array per field
+            engine: "r" fits the model with netmeta; "numpy" uses the native
+                engine (see engine.py), which needs no R process and covers
+                the common effect and DerSimonian-Laird random effects models
+            dataset_id: Pairwise dataset from load_csv, instead of `data`
+            cache: Use the result cache (see cache.py). A result cached for
+                the same rows, summary measure, reference, engine and
+                netmeta commit is returned without fitting, with
+                `cached` set.
 
         Returns:
-            Network meta-analysis results
+            Network meta-analysis results, including the `analysis_id`
+            that follow-up calls can use to refer to this analysis
         """
+        if output_format not in OUTPUT_FORMATS:
+            return {
+                "error": f"Unknown output_format: {output_format}",
+                "valid_formats": list(OUTPUT_FORMATS),
+            }
+        if engine not in numpy_engine.ENGINES:
+            return {
+                "error": f"Unknown engine: {engine}",
+                "valid_engines": list(numpy_engine.ENGINES),
+            }
+        data = self._resolve_data(data, dataset_id, ("pairwise",))
+        if isinstance(data, dict):
+            return data
+
+        options = {
+            "sm": sm,
+            "reference": reference,
+            "comb_fixed": comb_fixed,
+            "comb_random": comb_random,
+            "engine": engine,
+        }
+
+        key = None
+        if cache and self._cache is not None:
+            key = cache_key(data, sm, reference, engine)
+        if key is not None:
+            with profiling.phase("cache_lookup"):
+                cached = self._cache.get(key)
+            if cached is not None:
+                analysis = self._store.create(session_id, data, options)
+                output = self._bundle_analysis(analysis, cached, output_format)
+                output["cached"] = True
+                return output
+
+        if engine == "numpy":
+            result = self._run_netmeta_numpy(data, sm, reference)
+            if isinstance(result, dict):
+                return result
+            if key is not None:
+                self._cache.put(key, result)
+            analysis = self._store.create(session_id, data, options)
+            return self._bundle_analysis(analysis, result, output_format)
+
+        analysis = self._store.create(session_id, data, options)
         # Use empty string "" instead of NULL for no reference (netmeta quirk)
         ref_arg = f'"{reference}"' if reference else '""'
-        data_json = json.dumps(data).replace("'", "\\'")
+        input_path = self._write_input(data, PAIRWISE_FIELDS)
 
         script = f'''
-        data <- fromJSON('{data_json}')
+        data <- fromJSON("{input_path}")
         
         result <- netmeta(
             TE = data$TE,
@@ -148,13 +700,14 @@ class NetmetaBridge:
         )
         
         # Save result for subsequent calls
-        saveRDS(result, "{self._state_file}")
+        saveRDS(result, "{analysis.path}")
+        .netmeta_remember("{analysis.analysis_id}", result)
         
         # Build output
         output <- list(
             treatments = as.list(result$trts),
             n_studies = result$k,
-            n_comparisons = nrow(data),
+            n_comparisons = length(data$TE),
             sm = result$sm,
             reference = result$reference.group
         )
@@ -168,229 +721,555 @@ class NetmetaBridge:
             )
         }}
         
+        # Pairwise estimates for every treatment pair (i < j), in row order
+        pair_idx <- which(upper.tri(result$TE.common), arr.ind = TRUE)
+        pair_idx <- pair_idx[order(pair_idx[, 1], pair_idx[, 2]), , drop = FALSE]
+        pairwise_estimates <- function(type) {{
+            columns <- list(
+                treat1 = result$trts[pair_idx[, 1]],
+                treat2 = result$trts[pair_idx[, 2]],
+                effect = result[[paste0("TE.", type)]][pair_idx],
+                ci_lower = result[[paste0("lower.", type)]][pair_idx],
+                ci_upper = result[[paste0("upper.", type)]][pair_idx]
+            )
+            if ("{output_format}" == "columns") {{
+                lapply(columns, I)
+            }} else {{
+                as.data.frame(columns, stringsAsFactors = FALSE)
+            }}
+        }}
+        
         # Add fixed effects estimates
         if (result$common) {{
-            n <- length(result$trts)
-            comparisons <- list()
-            idx <- 1
-            for (i in 1:(n-1)) {{
-                for (j in (i+1):n) {{
-                    comparisons[[idx]] <- list(
-                        treat1 = result$trts[i],
-                        treat2 = result$trts[j],
-                        effect = result$TE.common[i, j],
-                        ci_lower = result$lower.common[i, j],
-                        ci_upper = result$upper.common[i, j]
-                    )
-                    idx <- idx + 1
-                }}
-            }}
-            output$fixed_effects <- comparisons
+            output$fixed_effects <- pairwise_estimates("common")
         }}
         
         # Add random effects estimates
         if (result$random) {{
-            n <- length(result$trts)
-            comparisons <- list()
-            idx <- 1
-            for (i in 1:(n-1)) {{
-                for (j in (i+1):n) {{
-                    comparisons[[idx]] <- list(
-                        treat1 = result$trts[i],
-                        treat2 = result$trts[j],
-                        effect = result$TE.random[i, j],
-                        ci_lower = result$lower.random[i, j],
-                        ci_upper = result$upper.random[i, j]
-                    )
-                    idx <- idx + 1
-                }}
-            }}
-            output$random_effects <- comparisons
+            output$random_effects <- pairwise_estimates("random")
         }}
         
-        cat(toJSON(output, auto_unbox = TRUE))
+        {_BUNDLE_SCRIPT if bundle else ""}
+        {"output$bundle <- bundle" if bundle else ""}
+        
+        cat(toJSON(output, auto_unbox = TRUE, digits = NA, na = "null"))
         '''
 
-        return self._run_r_script(script)
-
-    def _load_state_script(self) -> str:
-        """Return R code to load saved state."""
-        return f'''
-        if (!file.exists("{self._state_file}")) {{
-            cat(toJSON(list(error = "No netmeta result available. Run runnetmeta first."), auto_unbox = TRUE))
-            quit(save = "no")
-        }}
-        result <- readRDS("{self._state_file}")
-        '''
+        try:
+            output = self._run_r_script(script)
+        finally:
+            input_path.unlink(missing_ok=True)
+        if "error" in output:
+            self._store.discard(analysis)
+            return output
+        bundle_payload = output.pop("bundle", None)
+        output["engine"] = engine
+        self._store.commit(analysis)
+        if bundle_payload is not None:
+            bundle = ResultBundle.from_r(bundle_payload)
+            self._store.attach_bundle(analysis, bundle)
+            if key is not None:
+                self._cache.put(
+                    key,
+                    CachedResult(bundle, output["n_studies"], output["n_comparisons"]),
+                )
+        output["analysis_id"] = analysis.analysis_id
+        return output
 
-    def get_network_graph(self) -> dict[str, Any]:
-        """Get network structure from last netmeta result."""
-        script = f"""
-        {self._load_state_script()}
-        
-        # Get treatments (nodes)
-        nodes <- lapply(seq_along(result$trts), function(i) {{
-            list(id = i, label = result$trts[i])
-        }})
-        
-        # Get edges from the data
-        edges_df <- data.frame(
-            from = result$treat1,
-            to = result$treat2,
-            study = result$studlab,
-            stringsAsFactors = FALSE
+    def _run_netmeta_numpy(
+        self,
+        data: list[dict[str, Any]],
+        sm: str,
+        reference: str | None,
+    ) -> CachedResult | dict[str, Any]:
+        """Fit network meta-analysis with the NumPy engine, or return an error."""
+        try:
+            with profiling.phase("numpy_fit"):
+                bundle = numpy_engine.fit(data, sm=sm, reference=reference)
+        except numpy_engine.EngineError as e:
+            return {"error": str(e)}
+        return CachedResult(
+            bundle=bundle,
+            n_studies=len({str(row["study"]) for row in data}),
+            n_comparisons=len(data),
         )
-        
-        # Count studies per comparison
-        edge_summary <- aggregate(study ~ from + to, data = edges_df, FUN = length)
-        names(edge_summary)[3] <- "n_studies"
-        
-        edges <- lapply(1:nrow(edge_summary), function(i) {{
-            list(
-                from = edge_summary$from[i],
-                to = edge_summary$to[i],
-                n_studies = edge_summary$n_studies[i]
-            )
-        }})
-        
-        cat(toJSON(list(nodes = nodes, edges = edges), auto_unbox = TRUE))
+
+    def _bundle_analysis(
+        self, analysis: Analysis, result: CachedResult, output_format: str
+    ) -> dict[str, Any]:
+        """
+        Register an analysis held only as a result bundle (no RDS file) and
+        return run_netmeta output for it, in the same structure as R's.
         """
+        options = analysis.options
+        comb_fixed, comb_random = options["comb_fixed"], options["comb_random"]
+        bundle = result.bundle
+        output: dict[str, Any] = {
+            "treatments": bundle.treatments,
+            "n_studies": result.n_studies,
+            "n_comparisons": result.n_comparisons,
+            "sm": bundle.sm,
+            "reference": bundle.reference,
+        }
+        if comb_random:
+            output["heterogeneity"] = bundle.heterogeneity
+        if comb_fixed:
+            output["fixed_effects"] = bundle.pairwise_estimates(False, output_format)
+        if comb_random:
+            output["random_effects"] = bundle.pairwise_estimates(True, output_format)
+        output["engine"] = options["engine"]
 
-        return self._run_r_script(script)
+        self._store.commit(analysis)
+        self._store.attach_bundle(analysis, bundle)
+        output["analysis_id"] = analysis.analysis_id
+        return output
 
-    def get_league_table(self, random: bool = True) -> dict[str, Any]:
-        """Get league table of pairwise comparisons."""
-        effect_type = "random" if random else "common"
+    def run_netmeta_batch(
+        self,
+        items: list[dict[str, Any]],
+        sm: str = "OR",
+        reference: str | None = None,
+        comb_fixed: bool = True,
+        comb_random: bool = True,
+        session_id: str | None = None,
+        output_format: str = "rows",
+        engine: str = "r",
+        cache: bool = True,
+    ) -> dict[str, Any]:
+        """
+        Run several network meta-analyses, in parallel over the R workers.
 
-        script = f'''
-        {self._load_state_script()}
-        
-        if ("{effect_type}" == "random") {{
-            te <- result$TE.random
-            lower <- result$lower.random
-            upper <- result$upper.random
-        }} else {{
-            te <- result$TE.common
-            lower <- result$lower.common
-            upper <- result$upper.common
-        }}
-        
-        # Convert matrices to nested lists for JSON
-        n <- length(result$trts)
-        effects_list <- lapply(1:n, function(i) as.list(te[i,]))
-        lower_list <- lapply(1:n, function(i) as.list(lower[i,]))
-        upper_list <- lapply(1:n, function(i) as.list(upper[i,]))
-        
-        cat(toJSON(list(
-            treatments = as.list(result$trts),
-            effects = effects_list,
-            ci_lower = lower_list,
-            ci_upper = upper_list,
-            sm = result$sm
-        ), auto_unbox = TRUE))
-        '''
+        Args:
+            items: Datasets to analyse. Each dict has `data` or `dataset_id`
+                and optionally `name` and per-item `sm`, `reference`, `comb_fixed`,
+                `comb_random` and `engine` overriding the defaults below
+            sm: Default summary measure
+            reference: Default reference treatment
+            comb_fixed: Default for including fixed effects
+            comb_random: Default for including random effects
+            session_id: MCP session the analyses belong to
+            output_format: Layout of the pairwise estimates (see run_netmeta)
+            engine: Default engine, "r" or "numpy" (see run_netmeta)
+            cache: Use the result cache (see run_netmeta)
+
+        Returns:
+            `results` mapping each item name to its run_netmeta output (with
+            its own analysis_id, or an error for that item alone), plus
+            `n_items` and `n_failed`
+        """
+        names = [
+            str(item.get("name") or f"item{i + 1}") for i, item in enumerate(items)
+        ]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            return {"error": f"Duplicate item names: {duplicates}"}
 
-        return self._run_r_script(script)
+        engines = {item.get("engine", engine) for item in items}
+        if engines != {"numpy"}:
+            try:
+                self.start()
+            except RuntimeError as e:
+                return {"error": str(e)}
 
-    def get_ranking(self, random: bool = True) -> dict[str, Any]:
-        """Get treatment rankings using P-scores."""
-        effect_type = "random" if random else "common"
+        def run_item(item: dict[str, Any]) -> dict[str, Any]:
+            if not isinstance(item.get("data"), list) and not item.get("dataset_id"):
+                return {"error": "Item has no 'data' list or 'dataset_id'"}
+            try:
+                return self.run_netmeta(
+                    data=item.get("data"),
+                    dataset_id=item.get("dataset_id"),
+                    sm=item.get("sm", sm),
+                    reference=item.get("reference", reference),
+                    comb_fixed=item.get("comb_fixed", comb_fixed),
+                    comb_random=item.get("comb_random", comb_random),
+                    session_id=session_id,
+                    output_format=output_format,
+                    engine=item.get("engine", engine),
+                    cache=cache,
+                )
+            except Exception as e:  # isolate failures to the item
+                return {"error": f"{type(e).__name__}: {e}"}
 
-        script = f'''
-        {self._load_state_script()}
-        
-        # Calculate P-scores
-        ranking <- netrank(result, small.values = "undesirable")
-        
-        if ("{effect_type}" == "random") {{
-            p_scores <- ranking$Pscore.random
-        }} else {{
-            p_scores <- ranking$Pscore.common
-        }}
-        
-        # Create ranking data
-        treatments <- names(p_scores)
-        scores <- as.numeric(p_scores)
-        ranks <- rank(-scores)
-        
-        # Sort by rank
-        ord <- order(ranks)
-        
-        cat(toJSON(list(
-            treatments = as.list(treatments[ord]),
-            p_scores = as.list(scores[ord]),
-            ranks = as.list(ranks[ord])
-        ), auto_unbox = TRUE))
+        n_threads = self._pool.size if self._pool is not None else 1
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            outputs = list(metrics.map_in_context(executor, run_item, items))
+
+        results = dict(zip(names, outputs))
+        return {
+            "results": results,
+            "n_items": len(results),
+            "n_failed": sum(1 for output in outputs if "error" in output),
+        }
+
+    def update_netmeta(
+        self,
+        add: list[dict[str, Any]] | None = None,
+        remove: list[dict[str, Any]] | None = None,
+        analysis_id: str | None = None,
+        session_id: str | None = None,
+        output_format: str = "rows",
+    ) -> dict[str, Any]:
+        """
+        Add and remove comparisons of a saved analysis, e.g. for a living review.
+
+        The analysis keeps its input records and options, so only the changes
+        are sent; that is the only saving. The updated network is refitted
+        from scratch with the same engine, summary measure and reference:
+        the DerSimonian-Laird estimator is closed-form, so there is no
+        iterative fit to warm start, and its new tau^2 changes the weights of
+        every comparison. The previous analysis is kept.
+
+        Args:
+            add: Pairwise comparisons to add (as for run_netmeta)
+            remove: Comparisons to remove. Each dict has `study` and
+                optionally `treat1` and `treat2` (in either order); without
+                treatments every comparison of the study is removed
+            analysis_id: Analysis to update (default: latest of the session)
+            session_id: MCP session the analyses belong to
+            output_format: Layout of the pairwise estimates (see run_netmeta)
+
+        Returns:
+            run_netmeta output for the updated analysis, plus
+            `previous_analysis_id`, `n_added`, `n_removed` and `diff` (see
+            ResultBundle.diff)
+        """
+        analysis = self._get_analysis(analysis_id, session_id)
+        if isinstance(analysis, dict):
+            return analysis
+        if analysis.data is None:
+            return {"error": f"Analysis {analysis.analysis_id} has no stored input"}
+
+        rows = analysis.data
+        by_study: dict[str, list[int]] = {}
+        for i, row in enumerate(rows):
+            by_study.setdefault(str(row.get("study")), []).append(i)
+        removed: set[int] = set()
+        unmatched = []
+        for spec in remove or []:
+            candidates = by_study.get(str(spec.get("study")), [])
+            if spec.get("treat1") is not None or spec.get("treat2") is not None:
+                pair = {str(spec.get("treat1")), str(spec.get("treat2"))}
+                candidates = [
+                    i
+                    for i in candidates
+                    if {str(rows[i].get("treat1")), str(rows[i].get("treat2"))} == pair
+                ]
+            if not candidates:
+                unmatched.append(spec)
+            removed.update(candidates)
+        if unmatched:
+            return {"error": "Comparisons to remove not found", "not_found": unmatched}
+
+        data = [row for i, row in enumerate(rows) if i not in removed]
+        data.extend(add or [])
+        output = self.run_netmeta(
+            data,
+            session_id=session_id,
+            output_format=output_format,
+            **analysis.options,
+        )
+        if "error" in output:
+            return output
+
+        previous = self._get_bundle(analysis.analysis_id, None)
+        current = self._get_bundle(output["analysis_id"], None)
+        output["previous_analysis_id"] = analysis.analysis_id
+        output["n_added"] = len(add or [])
+        output["n_removed"] = len(removed)
+        if isinstance(previous, ResultBundle) and isinstance(current, ResultBundle):
+            output["diff"] = current.diff(
+                previous, random=analysis.options.get("comb_random", True)
+            )
+        return output
+
+    def _get_analysis(
+        self, analysis_id: str | None, session_id: str | None
+    ) -> Analysis | dict[str, Any]:
+        """Resolve an analysis, or return an error dict if there is none."""
+        analysis = self._store.get(analysis_id, session_id)
+        if analysis is not None:
+            return analysis
+        if analysis_id is not None:
+            return {"error": f"Unknown or expired analysis_id: {analysis_id}"}
+        return {"error": "No netmeta result available. Run runnetmeta first."}
+
+    def _load_state_script(self, analysis: Analysis) -> str:
+        """Return R code to load saved state, from memory when possible."""
+        return f'''
+        result <- .netmeta_recall("{analysis.analysis_id}", "{analysis.path}")
         '''
 
-        return self._run_r_script(script)
+    def _get_bundle(
+        self, analysis_id: str | None, session_id: str | None
+    ) -> ResultBundle | dict[str, Any]:
+        """
+        Return the result bundle of an analysis, or an error dict.
+
+        Bundles are normally built by run_netmeta; for analyses run with
+        bundle=False it is built from the saved result on first use.
+        """
+        analysis = self._get_analysis(analysis_id, session_id)
+        if isinstance(analysis, dict):
+            return analysis
+        if analysis.bundle is not None:
+            return analysis.bundle
+
+        script = f"""
+        {self._load_state_script(analysis)}
+        {_BUNDLE_SCRIPT}
+        cat(toJSON(bundle, auto_unbox = TRUE, digits = NA, na = "null"))
+        """
+        output = self._run_r_script(script)
+        if "error" in output:
+            return output
+        bundle = ResultBundle.from_r(output)
+        self._store.attach_bundle(analysis, bundle)
+        return bundle
+
+    def get_network_graph(
+        self, analysis_id: str | None = None, session_id: str | None = None
+    ) -> dict[str, Any]:
+        """Get network structure from a saved netmeta result."""
+        bundle = self._get_bundle(analysis_id, session_id)
+        if isinstance(bundle, dict):
+            return bundle
+        return bundle.network_graph()
+
+    def get_league_table(
+        self,
+        random: bool = True,
+        analysis_id: str | None = None,
+        session_id: str | None = None,
+        format: str = "nested",
+        dtype: str = "float64",
+    ) -> dict[str, Any]:
+        """Get league table of pairwise comparisons (see ResultBundle.league_table)."""
+        bundle = self._get_bundle(analysis_id, session_id)
+        if isinstance(bundle, dict):
+            return bundle
+        return bundle.league_table(random=random, format=format, dtype=dtype)
+
+    def get_ranking(
+        self,
+        random: bool = True,
+        analysis_id: str | None = None,
+        session_id: str | None = None,
+        small_values: str = "undesirable",
+        treatments: list[str] | None = None,
+    ) -> dict[str, Any]:
+        """Get treatment rankings using P-scores (see ResultBundle.ranking)."""
+        bundle = self._get_bundle(analysis_id, session_id)
+        if isinstance(bundle, dict):
+            return bundle
+        return bundle.ranking(
+            random=random, small_values=small_values, treatments=treatments
+        )
 
     def get_forest_data(
-        self, reference: str | None = None, random: bool = True
+        self,
+        reference: str | None = None,
+        random: bool = True,
+        analysis_id: str | None = None,
+        session_id: str | None = None,
     ) -> dict[str, Any]:
         """Get data for forest plot visualization."""
-        ref_arg = f'"{reference}"' if reference else "NULL"
-        effect_type = "random" if random else "common"
+        bundle = self._get_bundle(analysis_id, session_id)
+        if isinstance(bundle, dict):
+            return bundle
+        return bundle.forest_data(reference=reference, random=random)
 
-        script = f'''
-        {self._load_state_script()}
-        
-        ref <- {ref_arg}
-        if (is.null(ref)) ref <- result$reference.group
-        if (is.null(ref)) ref <- result$trts[1]
-        
-        if ("{effect_type}" == "random") {{
-            te <- result$TE.random
-            lower <- result$lower.random
-            upper <- result$upper.random
-        }} else {{
-            te <- result$TE.common
-            lower <- result$lower.common
-            upper <- result$upper.common
-        }}
-        
-        # Get effects vs reference
-        ref_idx <- which(result$trts == ref)
-        other_trts <- result$trts[-ref_idx]
-        
-        comparisons <- lapply(other_trts, function(trt) {{
-            trt_idx <- which(result$trts == trt)
-            list(
-                treatment = trt,
-                effect = te[trt_idx, ref_idx],
-                ci_lower = lower[trt_idx, ref_idx],
-                ci_upper = upper[trt_idx, ref_idx]
+    def leave_one_out(
+        self,
+        data: list[dict[str, Any]] | None = None,
+        sm: str = "OR",
+        random: bool = True,
+        dataset_id: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Leave-one-study-out sensitivity analysis.
+
+        Refits the network once without each study. The refits are split
+        into one chunk per R worker and run in parallel; the full-data fit
+        runs as part of the first chunk.
+
+        Args:
+            data: List of pairwise comparisons (as for run_netmeta)
+            sm: Summary measure
+            random: Use random effects (True) or common effect (False) estimates
+            dataset_id: Pairwise dataset from load_csv, instead of `data`
+
+        Returns:
+            The full-data estimates (`baseline`) and, per omitted study, the
+            shift of every pairwise effect (`effect_shift`, pairs in the order
+            of `comparisons`), of tau^2 (`tau2_shift`) and of every P-score
+            (`pscore_shift`, in the order of `treatments`). Shifts are None
+            where an estimate is unavailable; studies whose refit failed are
+            listed in `failed`.
+        """
+        data = self._resolve_data(data, dataset_id, ("pairwise",))
+        if isinstance(data, dict):
+            return data
+        try:
+            self.start()
+        except RuntimeError as e:
+            return {"error": str(e)}
+
+        # Labels are sent to R as text, so both sides compare the same strings
+        rows = [
+            {**row, **{f: _label(row.get(f)) for f in ("study", "treat1", "treat2")}}
+            for row in data
+        ]
+        studies = list(dict.fromkeys(row["study"] for row in rows))
+        trts = sorted(
+            {row[f] for row in rows for f in ("treat1", "treat2")},
+            key=numpy_engine.collation_key,
+        )
+        if len(studies) < 2:
+            return {"error": "Leave-one-out needs at least two studies"}
+
+        model = "random" if random else "common"
+        n_chunks = min(self._pool.size if self._pool is not None else 1, len(studies))
+        chunks = [studies[i::n_chunks] for i in range(n_chunks)]
+        input_path = self._write_input(rows, PAIRWISE_FIELDS)
+
+        def run_chunk(i: int) -> dict[str, Any]:
+            job_path = self._write_json({"studies": chunks[i], "baseline": i == 0})
+            script = f"""
+            data <- fromJSON("{input_path}")
+            job <- fromJSON("{job_path}")
+            sm <- "{sm}"
+            model <- "{model}"
+            {_LEAVE_ONE_OUT_SCRIPT}
+            cat(toJSON(output, auto_unbox = TRUE, digits = NA, na = "null"))
+            """
+            try:
+                return self._run_r_script(script)
+            finally:
+                job_path.unlink(missing_ok=True)
+
+        try:
+            with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+                outputs = list(
+                    metrics.map_in_context(executor, run_chunk, range(n_chunks))
+                )
+        finally:
+            input_path.unlink(missing_ok=True)
+
+        for output in outputs:
+            if "error" in output:
+                return output
+        baseline = outputs[0].get("baseline")
+        if baseline is None or "error" in baseline:
+            return {"error": "Full-data fit failed", "details": baseline}
+
+        refits = {}
+        for chunk, output in zip(chunks, outputs):
+            refits.update(zip(chunk, output["refits"]))
+
+        def as_array(values) -> np.ndarray:
+            return np.array(values, dtype=float)
+
+        pairs = [(a, b) for i, a in enumerate(trts) for b in trts[i + 1 :]]
+        base_effects, base_pscores = _align_fit(baseline, trts, pairs)
+        effect_shift, tau2_shift, pscore_shift, failed = [], [], [], {}
+        for study in studies:
+            refit = refits[study]
+            if "error" in refit:
+                failed[study] = refit["error"]
+                effect_shift.append(None)
+                tau2_shift.append(None)
+                pscore_shift.append(None)
+                continue
+            effects, p_scores = _align_fit(refit, trts, pairs)
+            effect_shift.append(json_values(effects - base_effects))
+            tau2_shift.append(
+                json_values(as_array([refit["tau2"]]) - as_array([baseline["tau2"]]))[0]
             )
-        }})
-        
-        cat(toJSON(list(
-            reference = ref,
-            sm = result$sm,
-            comparisons = comparisons
-        ), auto_unbox = TRUE))
-        '''
+            pscore_shift.append(json_values(p_scores - base_pscores))
 
-        return self._run_r_script(script)
+        return {
+            "model": model,
+            "sm": sm,
+            "treatments": trts,
+            "comparisons": {
+                "treat1": [a for a, _ in pairs],
+                "treat2": [b for _, b in pairs],
+            },
+            "baseline": {
+                "effects": json_values(base_effects),
+                "tau2": baseline["tau2"],
+                "p_scores": json_values(base_pscores),
+            },
+            "studies": studies,
+            "effect_shift": effect_shift,
+            "tau2_shift": tau2_shift,
+            "pscore_shift": pscore_shift,
+            "failed": failed,
+        }
 
     def pairwise_to_netmeta(
         self,
-        data: list[dict[str, Any]],
+        data: list[dict[str, Any]] | None = None,
         outcome_type: str = "binary",
+        sm: str | None = None,
+        engine: str = "r",
+        dataset_id: str | None = None,
     ) -> list[dict[str, Any]] | dict[str, Any]:
-        """Convert arm-level data to pairwise contrasts."""
-        data_json = json.dumps(data).replace("'", "\\'")
+        """
+        Convert arm-level data to pairwise contrasts.
+
+        Args:
+            data: List of study arms
+            outcome_type: "binary" or "continuous"
+            sm: Summary measure; "OR" (default), "RR" or "RD" for binary and
+                "MD" (default) or "SMD" for continuous outcomes
+            engine: "r" uses meta::pairwise(); "numpy" converts in Python
+                (experimental, see contrasts.py)
+            dataset_id: Arm-level dataset from load_csv, instead of `data`;
+                its format sets the outcome type
 
+        Returns:
+            List of contrasts, or an error dict
+        """
+        if engine not in numpy_engine.ENGINES:
+            return {
+                "error": f"Unknown engine: {engine}",
+                "valid_engines": list(numpy_engine.ENGINES),
+            }
+        if dataset_id is not None:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None and dataset.data_format == "arm_continuous":
+                outcome_type = "continuous"
+            elif dataset is not None and dataset.data_format == "arm_binary":
+                outcome_type = "binary"
+        data = self._resolve_data(data, dataset_id, ("arm_binary", "arm_continuous"))
+        if isinstance(data, dict):
+            return data
+        if engine == "numpy":
+            try:
+                with profiling.phase("numpy_convert"):
+                    return arms_to_contrasts(data, outcome_type=outcome_type, sm=sm)
+            except ConversionError as e:
+                return {"error": str(e)}
+
+        if outcome_type not in SUMMARY_MEASURES:
+            return {"error": f"Unknown outcome_type: {outcome_type}"}
+        sm = sm or SUMMARY_MEASURES[outcome_type][0]
+        if sm not in SUMMARY_MEASURES[outcome_type]:
+            return {
+                "error": f"Unknown summary measure for {outcome_type} outcomes: {sm}",
+                "valid_sm": list(SUMMARY_MEASURES[outcome_type]),
+            }
         if outcome_type == "binary":
-            sm = "OR"
             args = "event = data$events, n = data$n"
         else:
-            sm = "MD"
             args = "mean = data$mean, sd = data$sd, n = data$n"
+        input_path = self._write_input(data, ARM_FIELDS[outcome_type])
 
         script = f'''
         library(meta)
         
-        data <- fromJSON('{data_json}')
+        data <- fromJSON("{input_path}")
         
         # Use pairwise function from meta package
         pw <- pairwise(
@@ -401,17 +1280,56 @@ class NetmetaBridge:
         )
         
         # Format output as list of comparisons
-        comparisons <- lapply(1:nrow(pw), function(i) {{
-            list(
-                study = pw$studlab[i],
-                treat1 = as.character(pw$treat1[i]),
-                treat2 = as.character(pw$treat2[i]),
-                TE = pw$TE[i],
-                seTE = pw$seTE[i]
-            )
-        }})
+        comparisons <- data.frame(
+            study = pw$studlab,
+            treat1 = as.character(pw$treat1),
+            treat2 = as.character(pw$treat2),
+            TE = pw$TE,
+            seTE = pw$seTE,
+            stringsAsFactors = FALSE
+        )
         
-        cat(toJSON(comparisons, auto_unbox = TRUE))
+        cat(toJSON(comparisons, auto_unbox = TRUE, digits = NA, na = "null"))
         '''
 
-        return self._run_r_script(script)
+        try:
+            return self._run_r_script(script)
+        finally:
+            input_path.unlink(missing_ok=True)
+
+
+class AsyncNetmetaBridge:
+    """
+    Async interface to a NetmetaBridge.
+
+    Every public bridge method is available as a coroutine that runs the
+    blocking call in a worker thread, so an event loop (such as the MCP
+    server's) keeps serving other requests while R works. Threads mostly
+    wait on worker pipes, so calls proceed in parallel up to the size of
+    the R worker pool and queue behind it beyond that. Worker threads see
+    the caller's context, so their metrics are attributed to the MCP tool
+    being served (see metrics.record_tool). Every coroutine takes a
+    `profile` flag that adds a `_timings` breakdown to the result (see
+    profiling.py).
+    """
+
+    def __init__(self, bridge: NetmetaBridge):
+        self.bridge = bridge
+
+    def __getattr__(self, name: str):
+        method = getattr(self.bridge, name)
+        if name.startswith("_") or not callable(method):
+            raise AttributeError(name)
+
+        @functools.wraps(method)
+        async def call(*args, profile: bool = False, **kwargs):
+            run = functools.partial(method, *args, **kwargs)
+            with profiling.profiled(profile) as report:
+                if report is not None and report.cprofile:
+                    run = functools.partial(report.run_cprofile, run)
+                result = await anyio.to_thread.run_sync(run)
+            if report is not None:
+                result = report.attach(result)
+            return result
+
+        return call
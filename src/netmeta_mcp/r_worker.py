@@ -0,0 +1,385 @@
+"""
+Persistent R workers
+
+Keeps R processes alive with netmeta and jsonlite preloaded and feeds them
+scripts over stdin, so each call pays only for the computation instead of
+R startup and package loading. RWorkerPool serves concurrent callers from
+several such processes.
+"""
+
+import contextlib
+import logging
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Iterator
+
+from . import jobs, metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+# Default number of netmeta results each R process keeps in memory
+DEFAULT_CACHE_SIZE = 20
+
+# Packages and helpers available to every script. .netmeta_remember() and
+# .netmeta_recall() keep recently used netmeta results in memory, so that
+# follow-up calls on a warm worker skip readRDS; the RDS file stays the
+# source of truth.
+_R_PRELUDE = """
+suppressPackageStartupMessages({{
+    library(netmeta)
+    library(jsonlite)
+}})
+.netmeta_results <- new.env()
+.netmeta_results_order <- character(0)
+.netmeta_remember <- function(id, result) {{
+    assign(id, result, envir = .netmeta_results)
+    .netmeta_results_order <<- c(setdiff(.netmeta_results_order, id), id)
+    while (length(.netmeta_results_order) > {cache_size}) {{
+        rm(list = .netmeta_results_order[1], envir = .netmeta_results)
+        .netmeta_results_order <<- .netmeta_results_order[-1]
+    }}
+}}
+.netmeta_recall <- function(id, path) {{
+    if (exists(id, envir = .netmeta_results, inherits = FALSE)) {{
+        .netmeta_results_order <<- c(setdiff(.netmeta_results_order, id), id)
+        return(get(id, envir = .netmeta_results))
+    }}
+    if (!file.exists(path)) {{
+        stop("No netmeta result available. Run runnetmeta first.")
+    }}
+    result <- readRDS(path)
+    .netmeta_remember(id, result)
+    result
+}}
+"""
+
+
+def r_prelude(cache_size: int = DEFAULT_CACHE_SIZE) -> str:
+    """Return R code that loads packages and defines the result cache."""
+    return _R_PRELUDE.format(cache_size=max(cache_size, 0))
+
+
+# R read-eval loop. Each request is a line count on its own line followed by
+# that many lines of R code. Output of every request is terminated by the
+# sentinel line so the Python side knows where one response ends.
+_WORKER_LOOP = """
+.netmeta_stdin <- file("stdin", open = "r", encoding = "UTF-8")
+cat("\\n{sentinel}\\n")
+flush(stdout())
+repeat {{
+    .netmeta_header <- readLines(.netmeta_stdin, n = 1L)
+    if (length(.netmeta_header) == 0L) break
+    .netmeta_code <- readLines(.netmeta_stdin, n = as.integer(.netmeta_header))
+    tryCatch({{
+        eval(parse(text = .netmeta_code), envir = new.env(parent = globalenv()))
+    }}, error = function(e) {{
+        cat(toJSON(list(error = conditionMessage(e)), auto_unbox = TRUE))
+    }})
+    cat("\\n{sentinel}\\n")
+    flush(stdout())
+}}
+"""
+
+_STDERR_TAIL_LINES = 50
+
+
+class RWorkerError(RuntimeError):
+    """Raised when the R worker cannot run a script."""
+
+
+class RWorker:
+    """A long-lived R process that evaluates scripts sent over a pipe."""
+
+    def __init__(
+        self,
+        r_executable: str,
+        timeout: float | None = None,
+        startup_timeout: float = 60.0,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """
+        Args:
+            r_executable: Path to the R executable
+            timeout: Per-call timeout in seconds (None waits forever)
+            startup_timeout: Seconds to wait for netmeta to load
+            cache_size: Number of netmeta results kept in memory
+        """
+        self._r_executable = r_executable
+        self._cache_size = cache_size
+        self._timeout = timeout
+        self._startup_timeout = startup_timeout
+        self._sentinel = f"__NETMETA_WORKER_DONE_{uuid.uuid4().hex}__"
+        self._lock = threading.Lock()
+        self._process: subprocess.Popen | None = None
+        self._stdout: queue.Queue[str | None] = queue.Queue()
+        self._stderr: deque[str] = deque(maxlen=_STDERR_TAIL_LINES)
+        self.n_jobs = 0
+
+    @property
+    def alive(self) -> bool:
+        """Whether the R process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """Start the R process and wait until netmeta is loaded."""
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        self._kill()
+        self._stdout = queue.Queue()
+        self._stderr = deque(maxlen=_STDERR_TAIL_LINES)
+        self.n_jobs = 0
+
+        start = time.perf_counter()
+        try:
+            self._process = subprocess.Popen(
+                [
+                    self._r_executable,
+                    "--vanilla",
+                    "--slave",
+                    "-e",
+                    r_prelude(self._cache_size)
+                    + _WORKER_LOOP.format(sentinel=self._sentinel),
+                ],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+            )
+        except OSError as e:
+            self._process = None
+            raise RWorkerError(f"Failed to start R worker: {e}") from e
+
+        threading.Thread(
+            target=self._pump,
+            args=(self._process.stdout, self._stdout.put),
+            daemon=True,
+        ).start()
+        threading.Thread(
+            target=self._pump,
+            args=(self._process.stderr, self._stderr.append),
+            daemon=True,
+        ).start()
+
+        try:
+            self._read_response(self._startup_timeout)
+        except RWorkerError as e:
+            self._kill()
+            raise RWorkerError(f"R worker failed to start: {e}") from e
+        metrics.R_SPAWN.observe(time.perf_counter() - start)
+        logger.debug("R worker started (pid %s)", self._process.pid)
+
+    @staticmethod
+    def _pump(stream, sink) -> None:
+        """Forward lines from a pipe to a sink, then signal EOF with None."""
+        for line in stream:
+            sink(line.rstrip("\n"))
+        sink(None)
+
+    def _read_response(self, timeout: float | None) -> str:
+        """Collect output lines up to the sentinel."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        lines = []
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise RWorkerError(f"R worker timed out after {timeout:g}s")
+            try:
+                line = self._stdout.get(timeout=remaining)
+            except queue.Empty:
+                raise RWorkerError(f"R worker timed out after {timeout:g}s")
+            if line is None:
+                stderr = "\n".join(l for l in self._stderr if l is not None)
+                raise RWorkerError(f"R worker exited unexpectedly: {stderr}")
+            if line == self._sentinel:
+                return "\n".join(lines)
+            lines.append(line)
+
+    def run(self, script: str) -> str:
+        """
+        Evaluate an R script in the worker and return its stdout.
+
+        The worker is (re)started if it is not running. On timeout, crash or
+        cancellation of the job being served (see jobs.py) the process is
+        killed and the next call starts a fresh one.
+        """
+        with self._lock:
+            if not self.alive:
+                self._start()
+
+            lines = script.split("\n")
+            try:
+                self._process.stdin.write(f"{len(lines)}\n" + "\n".join(lines) + "\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self._kill()
+                raise RWorkerError(f"R worker is not accepting input: {e}") from e
+
+            try:
+                # Cancelling the job being served kills the process
+                with jobs.on_cancel(self._process.kill):
+                    output = self._read_response(self._timeout)
+            except RWorkerError as e:
+                self._kill()
+                if jobs.cancelled():
+                    raise RWorkerError("Job cancelled") from e
+                raise
+            self.n_jobs += 1
+            return output
+
+    def _kill(self) -> None:
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.kill()
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (self._process.stdin, self._process.stdout, self._process.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        self._process = None
+
+    def close(self) -> None:
+        """Stop the R process."""
+        with self._lock:
+            if self.alive:
+                try:
+                    self._process.stdin.close()
+                    self._process.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+            self._kill()
+
+
+class RWorkerPool:
+    """
+    A fixed-size pool of R workers.
+
+    Callers check a worker out for the duration of one script. When every
+    worker is busy, callers queue for up to `checkout_timeout` seconds.
+    Workers that have served `max_jobs` scripts are restarted in the
+    background to cap memory growth of the R processes.
+    """
+
+    def __init__(
+        self,
+        r_executable: str,
+        size: int = 1,
+        timeout: float | None = None,
+        max_jobs: int = 0,
+        checkout_timeout: float | None = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
+        """
+        Args:
+            r_executable: Path to the R executable
+            size: Number of R worker processes
+            timeout: Per-call timeout in seconds (None waits forever)
+            max_jobs: Recycle a worker after this many scripts (0 never)
+            checkout_timeout: Seconds to wait for a free worker (None forever)
+            cache_size: Number of netmeta results each worker keeps in memory
+        """
+        if size < 1:
+            raise ValueError("R worker pool size must be at least 1")
+        self.size = size
+        self._max_jobs = max_jobs
+        self._checkout_timeout = checkout_timeout
+        self._workers = [
+            RWorker(r_executable, timeout=timeout, cache_size=cache_size)
+            for _ in range(size)
+        ]
+        self._idle: queue.Queue[RWorker] = queue.Queue()
+        self._closed = False
+
+    @property
+    def busy(self) -> int:
+        """Number of workers currently checked out or restarting."""
+        return self.size - self._idle.qsize()
+
+    def start(self) -> None:
+        """Start all workers in parallel and wait until they are ready."""
+        errors: list[RWorkerError] = []
+
+        def start_worker(worker: RWorker) -> None:
+            try:
+                worker.start()
+            except RWorkerError as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=start_worker, args=(worker,), daemon=True)
+            for worker in self._workers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            for worker in self._workers:
+                worker.close()
+            raise errors[0]
+
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    @contextlib.contextmanager
+    def checkout(self) -> Iterator[RWorker]:
+        """Borrow a worker, waiting for one to become free if necessary."""
+        if self._closed:
+            raise RWorkerError("R worker pool is closed")
+        try:
+            worker = self._idle.get(timeout=self._checkout_timeout)
+        except queue.Empty:
+            raise RWorkerError(
+                f"No R worker became available within {self._checkout_timeout:g}s "
+                f"(all {self.size} busy)"
+            )
+        try:
+            yield worker
+        finally:
+            self._checkin(worker)
+
+    def _checkin(self, worker: RWorker) -> None:
+        if self._closed:
+            worker.close()
+        elif self._max_jobs and worker.n_jobs >= self._max_jobs:
+            threading.Thread(target=self._recycle, args=(worker,), daemon=True).start()
+        else:
+            self._idle.put(worker)
+
+    def _recycle(self, worker: RWorker) -> None:
+        """Restart a worker; a failed restart is retried on its next run."""
+        worker.close()
+        try:
+            worker.start()
+        except RWorkerError as e:
+            logger.warning("Failed to recycle R worker: %s", e)
+        self._idle.put(worker)
+
+    def run(self, script: str) -> str:
+        """Evaluate an R script on the next free worker."""
+        with contextlib.ExitStack() as stack:
+            with profiling.phase("r_pool_wait", metrics.R_POOL_WAIT):
+                worker = stack.enter_context(self.checkout())
+            with profiling.phase(
+                "r_exec", metrics.R_EXEC.labels(metrics.current_tool(), "worker")
+            ):
+                return worker.run(script)
+
+    def close(self) -> None:
+        """Stop all workers."""
+        self._closed = True
+        for worker in self._workers:
+            worker.close()
@@ -0,0 +1,523 @@
+"""
+Result bundles for NetMeta
+
+A ResultBundle holds everything the follow-up tools need from a netmeta
+fit (effect matrices for both models, heterogeneity and the edge summary)
+as NumPy arrays, so league tables, rankings, forest plots and the network
+graph are answered in Python without another R call. P-scores are computed
+here from the effect matrices, as netrank() does.
+"""
+
+import base64
+import json
+import math
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+# Encodings supported by ResultBundle.league_table
+LEAGUE_TABLE_FORMATS = ("nested", "dense", "triangle", "base64")
+
+# Float types for the base64 league table encoding
+LEAGUE_TABLE_DTYPES = ("float64", "float32")
+
+# Directions of the small.values argument of netrank()
+SMALL_VALUES = ("undesirable", "desirable")
+
+# Arrays of a ModelResult, as saved by ResultBundle.save
+_MODEL_FIELDS = ("te", "se", "lower", "upper")
+
+# Coefficients of Cody's rational approximations of the normal distribution
+# function, as used by R's pnorm()
+_PNORM_A = (
+    2.2352520354606839287,
+    161.02823106855587881,
+    1067.6894854603709582,
+    18154.981253343561249,
+    0.065682337918207449113,
+)
+_PNORM_B = (
+    47.20258190468824187,
+    976.09855173777669322,
+    10260.932208618978205,
+    45507.789335026729956,
+)
+_PNORM_C = (
+    0.39894151208813466764,
+    8.8831497943883759412,
+    93.506656132177855979,
+    597.27027639480026226,
+    2494.5375852903726711,
+    6848.1904505362823326,
+    11602.651437647350124,
+    9842.7148383839780218,
+    1.0765576773720192317e-8,
+)
+_PNORM_D = (
+    22.266688044328115691,
+    235.38790178262499861,
+    1519.377599407554805,
+    6485.558298266760755,
+    18615.571640885098091,
+    34900.952721145977266,
+    38912.003286093271411,
+    19685.429676859990727,
+)
+_PNORM_P = (
+    0.21589853405795699,
+    0.1274011611602473639,
+    0.022235277870649807,
+    0.001421619193227893466,
+    2.9112874951168792e-5,
+    0.02307344176494017303,
+)
+_PNORM_Q = (
+    1.28426009614491121,
+    0.468238212480865118,
+    0.0659881378689285515,
+    0.00378239633202758244,
+    7.29751555083966205e-5,
+)
+
+
+def _matrix(values: list[float | None], n: int) -> np.ndarray:
+    """Rebuild an n x n matrix from R's column-major vector."""
+    return np.array(values, dtype=float).reshape((n, n), order="F")
+
+
+def _number(value: float) -> float | int | None:
+    """Convert a NumPy scalar to a JSON-friendly number."""
+    value = float(value)
+    if np.isnan(value):
+        return None
+    if value.is_integer():
+        return int(value)
+    return value
+
+
+def json_values(array: np.ndarray) -> list[float | None]:
+    """Flatten an array to a list of floats, with NaN as None."""
+    return [None if v != v else v for v in array.ravel().tolist()]
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal distribution function, elementwise (R's pnorm)."""
+    x = np.asarray(x, dtype=float)
+    y = np.abs(x)
+    out = np.full(x.shape, np.nan)
+
+    # |x| <= qnorm(3/4)
+    centre = y <= 0.67448975
+    xc = x[centre]
+    xsq = xc * xc
+    num, den = _PNORM_A[4] * xsq, xsq
+    for a, b in zip(_PNORM_A[:3], _PNORM_B[:3]):
+        num, den = (num + a) * xsq, (den + b) * xsq
+    out[centre] = 0.5 + xc * (num + _PNORM_A[3]) / (den + _PNORM_B[3])
+
+    # Upper tail probability of |x| elsewhere
+    tail = np.isfinite(x) & ~centre
+    yt = y[tail]
+    inner = yt <= math.sqrt(32)
+    scaled = np.empty_like(yt)
+    yi = yt[inner]
+    num, den = _PNORM_C[8] * yi, yi
+    for c, d in zip(_PNORM_C[:7], _PNORM_D[:7]):
+        num, den = (num + c) * yi, (den + d) * yi
+    scaled[inner] = (num + _PNORM_C[7]) / (den + _PNORM_D[7])
+    yo = yt[~inner]
+    inv = 1 / (yo * yo)
+    num, den = _PNORM_P[5] * inv, inv
+    for p, q in zip(_PNORM_P[:4], _PNORM_Q[:4]):
+        num, den = (num + p) * inv, (den + q) * inv
+    scaled[~inner] = (
+        1 / math.sqrt(2 * math.pi) - inv * (num + _PNORM_P[4]) / (den + _PNORM_Q[4])
+    ) / yo
+    # exp(-y^2 / 2) split in two factors to avoid cancellation
+    rounded = np.trunc(yt * 16) / 16
+    upper = (
+        np.exp(-rounded * rounded * 0.5)
+        * np.exp(-(yt - rounded) * (yt + rounded) * 0.5)
+        * scaled
+    )
+    out[tail] = np.where(x[tail] > 0, 1 - upper, upper)
+
+    out[np.isposinf(x)] = 1.0
+    out[np.isneginf(x)] = 0.0
+    return out
+
+
+def pscores(
+    te: np.ndarray, se: np.ndarray, small_values: str = "undesirable"
+) -> np.ndarray:
+    """
+    P-scores of all treatments from their effect and standard error matrices.
+
+    The P-score of treatment i is the mean over j != i of
+    pnorm(TE[i, j] / seTE[i, j]) when large effects are better
+    (small_values="undesirable"), or of pnorm(-TE[i, j] / seTE[i, j]).
+    Pairs without an estimate are skipped, as in netrank().
+    """
+    n = te.shape[0]
+    if n < 2:
+        return np.full(n, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = te / se
+    if small_values == "desirable":
+        z = -z
+    np.fill_diagonal(z, np.nan)
+    p = norm_cdf(z)
+    with np.errstate(invalid="ignore"):
+        return np.nansum(p, axis=1) / np.sum(~np.isnan(p), axis=1)
+
+
+def _rank_desc(scores: np.ndarray) -> np.ndarray:
+    """Rank scores from highest (1) to lowest, averaging ties like R's rank()."""
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores))
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and scores[order[j + 1]] == scores[order[i]]:
+            j += 1
+        ranks[order[i : j + 1]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+@dataclass
+class ModelResult:
+    """Estimates of one model (common or random effects)."""
+
+    te: np.ndarray
+    se: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    @classmethod
+    def from_r(cls, payload: dict[str, Any], n: int) -> "ModelResult":
+        return cls(
+            te=_matrix(payload["TE"], n),
+            se=_matrix(payload["seTE"], n),
+            lower=_matrix(payload["lower"], n),
+            upper=_matrix(payload["upper"], n),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.te, self.se, self.lower, self.upper))
+
+    def pscores(
+        self, small_values: str = "undesirable", subset: np.ndarray | None = None
+    ) -> np.ndarray:
+        """P-scores of all treatments, or among the treatment indices `subset`."""
+        if subset is None:
+            return pscores(self.te, self.se, small_values)
+        cells = np.ix_(subset, subset)
+        return pscores(self.te[cells], self.se[cells], small_values)
+
+
+@dataclass
+class ResultBundle:
+    """All derived outputs of a netmeta fit."""
+
+    treatments: list[str]
+    sm: str
+    reference: str
+    common: ModelResult
+    random: ModelResult
+    heterogeneity: dict[str, float | None]
+    edges: list[dict[str, Any]]
+
+    @classmethod
+    def from_r(cls, payload: dict[str, Any]) -> "ResultBundle":
+        """Build a bundle from the JSON emitted by the R bundle script."""
+        treatments = list(payload["treatments"])
+        n = len(treatments)
+        edges = payload["edges"]
+        return cls(
+            treatments=treatments,
+            sm=payload["sm"],
+            reference=payload["reference"],
+            common=ModelResult.from_r(payload["common"], n),
+            random=ModelResult.from_r(payload["random"], n),
+            heterogeneity=payload["heterogeneity"],
+            edges=[
+                {"from": f, "to": t, "n_studies": k}
+                for f, t, k in zip(edges["from"], edges["to"], edges["n_studies"])
+            ],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the bundle's arrays."""
+        return self.common.nbytes + self.random.nbytes
+
+    def save(self, file, **meta: Any) -> None:
+        """
+        Write the bundle in .npz format.
+
+        Args:
+            file: Path or binary file object
+            meta: JSON-serialisable values saved with the bundle
+        """
+        meta = {
+            "treatments": self.treatments,
+            "sm": self.sm,
+            "reference": self.reference,
+            "heterogeneity": self.heterogeneity,
+            "edges": self.edges,
+            **meta,
+        }
+        arrays = {"meta": np.array(json.dumps(meta))}
+        for name in ("common", "random"):
+            model = self.model(name == "random")
+            for field in _MODEL_FIELDS:
+                arrays[f"{name}_{field}"] = getattr(model, field)
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, file) -> tuple["ResultBundle", dict[str, Any]]:
+        """Read a bundle written by save; returns it with its meta values."""
+        with np.load(file, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays["meta"]))
+            models = {
+                name: ModelResult(
+                    **{field: arrays[f"{name}_{field}"] for field in _MODEL_FIELDS}
+                )
+                for name in ("common", "random")
+            }
+        bundle = cls(
+            treatments=meta.pop("treatments"),
+            sm=meta.pop("sm"),
+            reference=meta.pop("reference"),
+            common=models["common"],
+            random=models["random"],
+            heterogeneity=meta.pop("heterogeneity"),
+            edges=meta.pop("edges"),
+        )
+        return bundle, meta
+
+    def model(self, random: bool) -> ModelResult:
+        return self.random if random else self.common
+
+    def network_graph(self) -> dict[str, Any]:
+        """Nodes and edges of the network."""
+        nodes = [{"id": i + 1, "label": t} for i, t in enumerate(self.treatments)]
+        return {"nodes": nodes, "edges": self.edges}
+
+    def league_table(
+        self, random: bool = True, format: str = "nested", dtype: str = "float64"
+    ) -> dict[str, Any]:
+        """
+        Effect and confidence interval matrices.
+
+        Args:
+            random: Random effects (True) or common effect (False) model
+            format: "nested" gives one {treatment: value} object per row;
+                "dense" gives row-major value lists plus `shape`;
+                "triangle" gives only the cells above the diagonal in
+                row-major order, since effect[j][i] = -effect[i][j] and
+                ci_lower[j][i] = -ci_upper[i][j] (log scale for ratios);
+                "base64" gives row-major little-endian buffers of `dtype`
+            dtype: "float64" or "float32", for the base64 format
+        """
+        if format not in LEAGUE_TABLE_FORMATS:
+            return {
+                "error": f"Unknown format: {format}",
+                "valid_formats": list(LEAGUE_TABLE_FORMATS),
+            }
+        if dtype not in LEAGUE_TABLE_DTYPES:
+            return {
+                "error": f"Unknown dtype: {dtype}",
+                "valid_dtypes": list(LEAGUE_TABLE_DTYPES),
+            }
+
+        model = self.model(random)
+        matrices = {
+            "effects": model.te,
+            "ci_lower": model.lower,
+            "ci_upper": model.upper,
+        }
+        output: dict[str, Any] = {"treatments": self.treatments}
+
+        if format == "nested":
+            for key, matrix in matrices.items():
+                output[key] = [
+                    {t: _number(v) for t, v in zip(self.treatments, row)}
+                    for row in matrix
+                ]
+        elif format == "dense":
+            output["shape"] = list(model.te.shape)
+            for key, matrix in matrices.items():
+                output[key] = json_values(matrix)
+        elif format == "triangle":
+            rows, cols = np.triu_indices(len(self.treatments), k=1)
+            output["triangle"] = "upper"
+            for key, matrix in matrices.items():
+                output[key] = json_values(matrix[rows, cols])
+        else:
+            output["shape"] = list(model.te.shape)
+            output["dtype"] = dtype
+            output["byteorder"] = "little"
+            for key, matrix in matrices.items():
+                buffer = np.ascontiguousarray(
+                    matrix, dtype=np.dtype(dtype).newbyteorder("<")
+                )
+                output[key] = base64.b64encode(buffer.tobytes()).decode("ascii")
+
+        if format != "nested":
+            output["format"] = format
+        output["sm"] = self.sm
+        return output
+
+    def pairwise_estimates(
+        self, random: bool = True, output_format: str = "rows"
+    ) -> list[dict[str, Any]] | dict[str, list[Any]]:
+        """
+        Estimates for every treatment pair (i < j), as run_netmeta returns them.
+
+        Args:
+            random: Random effects (True) or common effect (False) model
+            output_format: "rows" for one object per pair, "columns" for one
+                list per field
+        """
+        model = self.model(random)
+        rows, cols = np.triu_indices(len(self.treatments), k=1)
+        columns = {
+            "treat1": [self.treatments[i] for i in rows],
+            "treat2": [self.treatments[j] for j in cols],
+            "effect": json_values(model.te[rows, cols]),
+            "ci_lower": json_values(model.lower[rows, cols]),
+            "ci_upper": json_values(model.upper[rows, cols]),
+        }
+        if output_format == "columns":
+            return columns
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def ranking(
+        self,
+        random: bool = True,
+        small_values: str = "undesirable",
+        treatments: list[str] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Treatments ordered by P-score.
+
+        Args:
+            random: Random effects (True) or common effect (False) model
+            small_values: "undesirable" if larger effects are better,
+                "desirable" if smaller effects are better
+            treatments: Rank only these treatments against each other
+                (default: all)
+        """
+        if small_values not in SMALL_VALUES:
+            return {
+                "error": f"Unknown small_values: {small_values}",
+                "valid_small_values": list(SMALL_VALUES),
+            }
+        if treatments is None:
+            labels = self.treatments
+            subset = None
+        else:
+            labels = list(dict.fromkeys(treatments))
+            unknown = [t for t in labels if t not in self.treatments]
+            if unknown:
+                return {
+                    "error": f"Unknown treatments: {unknown}",
+                    "treatments": self.treatments,
+                }
+            if len(labels) < 2:
+                return {"error": "Ranking needs at least two treatments"}
+            subset = np.array([self.treatments.index(t) for t in labels])
+
+        scores = self.model(random).pscores(small_values, subset)
+        ranks = _rank_desc(scores)
+        order = np.argsort(ranks, kind="stable")
+        return {
+            "treatments": [labels[i] for i in order],
+            "p_scores": [_number(scores[i]) for i in order],
+            "ranks": [_number(ranks[i]) for i in order],
+            "small_values": small_values,
+        }
+
+    def diff(self, previous: "ResultBundle", random: bool = True) -> dict[str, Any]:
+        """
+        Changes from an earlier fit of the same network.
+
+        Effects are compared for every pair of treatments present in both
+        fits (i < j in this bundle's order); P-scores and ranks are those of
+        each full fit.
+
+        Args:
+            previous: The earlier fit
+            random: Compare random effects (True) or common effect (False)
+                estimates
+        """
+        shared = [t for t in self.treatments if t in previous.treatments]
+        now = np.array([self.treatments.index(t) for t in shared], dtype=int)
+        before = np.array([previous.treatments.index(t) for t in shared], dtype=int)
+        rows, cols = np.triu_indices(len(shared), k=1)
+        effect_after = self.model(random).te[np.ix_(now, now)][rows, cols]
+        effect_before = previous.model(random).te[np.ix_(before, before)][rows, cols]
+
+        scores_after = self.model(random).pscores()
+        scores_before = previous.model(random).pscores()
+        ranks_after = _rank_desc(scores_after)
+        ranks_before = _rank_desc(scores_before)
+
+        return {
+            "model": "random" if random else "common",
+            "treatments_added": [
+                t for t in self.treatments if t not in previous.treatments
+            ],
+            "treatments_removed": [
+                t for t in previous.treatments if t not in self.treatments
+            ],
+            "heterogeneity": {
+                key: {
+                    "before": previous.heterogeneity.get(key),
+                    "after": self.heterogeneity.get(key),
+                }
+                for key in ("tau2", "tau", "I2")
+            },
+            "effects": {
+                "treat1": [shared[i] for i in rows],
+                "treat2": [shared[j] for j in cols],
+                "before": json_values(effect_before),
+                "after": json_values(effect_after),
+                "change": json_values(effect_after - effect_before),
+            },
+            "ranking": {
+                "treatments": shared,
+                "p_score_before": json_values(scores_before[before]),
+                "p_score_after": json_values(scores_after[now]),
+                "rank_before": json_values(ranks_before[before]),
+                "rank_after": json_values(ranks_after[now]),
+            },
+        }
+
+    def forest_data(
+        self, reference: str | None = None, random: bool = True
+    ) -> dict[str, Any]:
+        """Effects of every treatment versus a reference."""
+        ref = reference or self.reference or self.treatments[0]
+        if ref not in self.treatments:
+            return {
+                "error": f"Unknown reference treatment: {ref}",
+                "treatments": self.treatments,
+            }
+        model = self.model(random)
+        j = self.treatments.index(ref)
+        comparisons = [
+            {
+                "treatment": t,
+                "effect": _number(model.te[i, j]),
+                "ci_lower": _number(model.lower[i, j]),
+                "ci_upper": _number(model.upper[i, j]),
+            }
+            for i, t in enumerate(self.treatments)
+            if i != j
+        ]
+        return {"reference": ref, "sm": self.sm, "comparisons": comparisons}
@@ -4,14 +4,18 @@ NetMeta MCP Server
 An MCP server that provides network meta-analysis capabilities using the R netmeta package.
 """
 
-import csv
-import io
+import argparse
+import functools
+import inspect
 import json
+import os
 from typing import Any
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 
-from .r_bridge import NetmetaBridge
+from . import metrics
+from .jobs import JobQueue, SharedJobQueue
+from .r_bridge import AsyncNetmetaBridge, NetmetaBridge
 
 # Initialize the MCP server
 mcp = FastMCP(
@@ -22,11 +26,17 @@ mcp = FastMCP(
     Available tools:
     - csv_to_json: Convert CSV data to JSON format for netmeta
     - runnetmeta: Run a network meta-analysis on pairwise contrast data
+    - runnetmeta_batch: Run network meta-analyses on many datasets in one call
     - get_network_graph: Get the network structure as edge list
     - get_league_table: Get the league table of treatment comparisons
     - get_ranking: Get treatment rankings (P-scores)
     - get_forest_data: Get data for forest plot visualization
+    - update_netmeta: Add or remove studies of an analysis and see what changed
+    - leave_one_out: Leave-one-study-out sensitivity analysis
     - pairwise_to_netmeta: Convert arm-level data to pairwise contrasts
+    - submit_job, job_status, job_result, cancel_job: Run a tool in the
+      background, for calls that may outlast the client's timeout
+    - get_server_status: Check whether the R backend is ready
     
     Data format for runnetmeta:
     The data should be a list of pairwise comparisons with fields:
@@ -35,20 +45,67 @@ mcp = FastMCP(
     - treat2: Second treatment name  
     - TE: Treatment effect (e.g., log odds ratio, mean difference)
     - seTE: Standard error of the treatment effect
+    
+    runnetmeta returns an analysis_id. The follow-up tools (get_network_graph,
+    get_league_table, get_ranking, get_forest_data) use the latest analysis
+    of the current session unless an analysis_id is given.
+    
+    Every tool except get_server_status and the job tools accepts
+    profile=true to return a _timings breakdown of where the call spent its
+    time.
+    
+    runnetmeta with engine="numpy" fits the common effect and
+    DerSimonian-Laird random effects models natively, without R. This
+    engine is experimental; use the default engine="r" where results must
+    match netmeta.
     """,
 )
 
-# Initialize R bridge
+# Initialize R bridge (R itself is started lazily or by start_background)
 r_bridge = NetmetaBridge()
 
+# Async view of the bridge used by the tools, so R calls run off the event loop
+async_bridge = AsyncNetmetaBridge(r_bridge)
+
+# Background jobs of submit_job, visible to the other server processes if
+# NETMETA_STATE_SHARED=1
+job_queue = (
+    SharedJobQueue()
+    if os.environ.get("NETMETA_STATE_SHARED", "0") == "1"
+    else JobQueue()
+)
+
+
+def _tool(fn):
+    """Register an MCP tool, recording its calls in the metrics by tool name."""
+    return mcp.tool()(metrics.record_tool(fn))
+
 
-@mcp.tool()
-def runnetmeta(
-    data: list[dict[str, Any]],
+def _session_id(ctx: Context) -> str | None:
+    """Return the MCP session id of the current request, if any."""
+    try:
+        request = getattr(ctx.request_context, "request", None)
+    except (AttributeError, ValueError):
+        # No request context (direct call or stdio without HTTP)
+        return None
+    if request is None:
+        return None
+    return request.headers.get("mcp-session-id")
+
+
+@_tool
+async def runnetmeta(
+    data: list[dict[str, Any]] | None = None,
     sm: str = "OR",
     reference: str | None = None,
     comb_fixed: bool = True,
     comb_random: bool = True,
+    output_format: str = "rows",
+    engine: str = "r",
+    dataset_id: str | None = None,
+    cache: bool = True,
+    profile: bool = False,
+    ctx: Context = None,
 ) -> dict[str, Any]:
     """
     Run network meta-analysis using the R netmeta package.
@@ -65,9 +122,21 @@ def runnetmeta(
         reference: Reference treatment for rankings (optional)
         comb_fixed: Include fixed effect model (default: True)
         comb_random: Include random effects model (default: True)
+        output_format: Layout of fixed_effects/random_effects - "rows" (list of
+            comparison dicts, default) or "columns" (dict of arrays with keys
+            treat1, treat2, effect, ci_lower, ci_upper; compact for big networks)
+        engine: "r" (netmeta, default) or "numpy" (experimental native engine
+            for the common effect and DerSimonian-Laird random effects models;
+            faster and needs no R, but its agreement with netmeta is not yet
+            verified against recorded netmeta results)
+        dataset_id: Pairwise dataset from csv_to_json, instead of data
+        cache: Reuse the result of an identical earlier analysis (same rows,
+            sm, reference and engine) without refitting (default: True)
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
+        - analysis_id: Handle for querying this analysis with follow-up tools
         - treatments: List of treatments in the network
         - n_studies: Number of studies
         - n_comparisons: Number of direct comparisons
@@ -76,35 +145,124 @@ def runnetmeta(
         - heterogeneity: Heterogeneity statistics (tau2, I2)
         - inconsistency: Inconsistency test results
     """
-    return r_bridge.run_netmeta(
+    return await async_bridge.run_netmeta(
         data=data,
         sm=sm,
         reference=reference,
         comb_fixed=comb_fixed,
         comb_random=comb_random,
+        output_format=output_format,
+        engine=engine,
+        dataset_id=dataset_id,
+        cache=cache,
+        session_id=_session_id(ctx),
+        profile=profile,
+    )
+
+
+@_tool
+async def runnetmeta_batch(
+    items: list[dict[str, Any]],
+    sm: str = "OR",
+    reference: str | None = None,
+    comb_fixed: bool = True,
+    comb_random: bool = True,
+    output_format: str = "rows",
+    engine: str = "r",
+    cache: bool = True,
+    profile: bool = False,
+    ctx: Context = None,
+) -> dict[str, Any]:
+    """
+    Run network meta-analyses on many datasets (e.g. outcomes) in one call.
+
+    Items are analysed in parallel over the server's R workers. A failing
+    item does not affect the others.
+
+    Args:
+        items: List of datasets. Each dict should have:
+               - data: List of pairwise comparisons (as for runnetmeta), or
+               - dataset_id: Pairwise dataset from csv_to_json
+               - name: Key for this item in the results (default: item1, ...)
+               - sm, reference, comb_fixed, comb_random, engine: Optional per-item
+                 overrides of the defaults below
+        sm: Default summary measure
+        reference: Default reference treatment
+        comb_fixed: Default for including the fixed effect model
+        comb_random: Default for including the random effects model
+        output_format: "rows" or "columns" (see runnetmeta)
+        engine: Default engine, "r" or "numpy" (experimental; see runnetmeta)
+        cache: Reuse results of identical earlier analyses (see runnetmeta)
+        profile: Add `_timings`, a breakdown of where the call spent its time
+
+    Returns:
+        Dictionary containing:
+        - results: Item name -> runnetmeta result (each with its own
+          analysis_id for follow-up tools) or {"error": ...}
+        - n_items: Number of items
+        - n_failed: Number of items that failed
+    """
+    return await async_bridge.run_netmeta_batch(
+        items=items,
+        sm=sm,
+        reference=reference,
+        comb_fixed=comb_fixed,
+        comb_random=comb_random,
+        session_id=_session_id(ctx),
+        output_format=output_format,
+        engine=engine,
+        cache=cache,
+        profile=profile,
     )
 
 
-@mcp.tool()
-def get_network_graph() -> dict[str, Any]:
+@_tool
+async def get_network_graph(
+    analysis_id: str | None = None,
+    profile: bool = False,
+    ctx: Context = None,
+) -> dict[str, Any]:
     """
-    Get the network structure from the last network meta-analysis.
+    Get the network structure from a network meta-analysis.
+
+    Args:
+        analysis_id: Analysis returned by runnetmeta (default: latest in session)
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
         - nodes: List of treatment nodes with labels
         - edges: List of edges with study counts and sample sizes
     """
-    return r_bridge.get_network_graph()
+    return await async_bridge.get_network_graph(
+        analysis_id=analysis_id, session_id=_session_id(ctx), profile=profile
+    )
 
 
-@mcp.tool()
-def get_league_table(random: bool = True) -> dict[str, Any]:
+@_tool
+async def get_league_table(
+    random: bool = True,
+    analysis_id: str | None = None,
+    format: str = "nested",
+    dtype: str = "float64",
+    profile: bool = False,
+    ctx: Context = None,
+) -> dict[str, Any]:
     """
     Get the league table of all pairwise treatment comparisons.
 
     Args:
         random: Use random effects model (True) or fixed effect model (False)
+        analysis_id: Analysis returned by runnetmeta (default: latest in session)
+        format: Matrix encoding:
+            - "nested": one {treatment: value} object per row (default)
+            - "dense": flat row-major lists plus "shape"
+            - "triangle": row-major cells above the diagonal only; the rest
+              follows from effect[j][i] = -effect[i][j] and
+              ci_lower[j][i] = -ci_upper[i][j] (log scale for ratios)
+            - "base64": base64 of little-endian row-major buffers plus "shape"
+        dtype: "float64" or "float32", used by the "base64" format
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
@@ -113,16 +271,35 @@ def get_league_table(random: bool = True) -> dict[str, Any]:
         - ci_lower: Matrix of lower confidence intervals
         - ci_upper: Matrix of upper confidence intervals
     """
-    return r_bridge.get_league_table(random=random)
+    return await async_bridge.get_league_table(
+        random=random,
+        analysis_id=analysis_id,
+        session_id=_session_id(ctx),
+        format=format,
+        dtype=dtype,
+        profile=profile,
+    )
 
 
-@mcp.tool()
-def get_ranking(random: bool = True) -> dict[str, Any]:
+@_tool
+async def get_ranking(
+    random: bool = True,
+    analysis_id: str | None = None,
+    small_values: str = "undesirable",
+    treatments: list[str] | None = None,
+    profile: bool = False,
+    ctx: Context = None,
+) -> dict[str, Any]:
     """
     Get treatment rankings using P-scores.
 
     Args:
         random: Use random effects model (True) or fixed effect model (False)
+        analysis_id: Analysis returned by runnetmeta (default: latest in session)
+        small_values: "undesirable" (default) if larger effects are better,
+            "desirable" if smaller effects are better (e.g. harmful outcomes)
+        treatments: Rank only these treatments against each other (default: all)
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
@@ -130,12 +307,23 @@ def get_ranking(random: bool = True) -> dict[str, Any]:
         - p_scores: P-score for each treatment (0-1, higher is better)
         - rank: Rank of each treatment (1 = best)
     """
-    return r_bridge.get_ranking(random=random)
+    return await async_bridge.get_ranking(
+        random=random,
+        analysis_id=analysis_id,
+        session_id=_session_id(ctx),
+        small_values=small_values,
+        treatments=treatments,
+        profile=profile,
+    )
 
 
-@mcp.tool()
-def get_forest_data(
-    reference: str | None = None, random: bool = True
+@_tool
+async def get_forest_data(
+    reference: str | None = None,
+    random: bool = True,
+    analysis_id: str | None = None,
+    profile: bool = False,
+    ctx: Context = None,
 ) -> dict[str, Any]:
     """
     Get data for creating a forest plot of treatment effects vs reference.
@@ -143,20 +331,115 @@ def get_forest_data(
     Args:
         reference: Reference treatment (uses network reference if not specified)
         random: Use random effects model (True) or fixed effect model (False)
+        analysis_id: Analysis returned by runnetmeta (default: latest in session)
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
         - reference: The reference treatment
         - comparisons: List of dicts with treatment, effect, ci_lower, ci_upper
     """
-    return r_bridge.get_forest_data(reference=reference, random=random)
+    return await async_bridge.get_forest_data(
+        reference=reference,
+        random=random,
+        analysis_id=analysis_id,
+        session_id=_session_id(ctx),
+        profile=profile,
+    )
+
+
+@_tool
+async def update_netmeta(
+    add: list[dict[str, Any]] | None = None,
+    remove: list[dict[str, Any]] | None = None,
+    analysis_id: str | None = None,
+    output_format: str = "rows",
+    profile: bool = False,
+    ctx: Context = None,
+) -> dict[str, Any]:
+    """
+    Add or remove comparisons of an analysis and refit it (living reviews).
 
+    Only the changes are sent: the analysis keeps its input data and its
+    options (summary measure, reference, engine). The previous analysis
+    stays available under its analysis_id.
 
-@mcp.tool()
-def pairwise_to_netmeta(
-    data: list[dict[str, Any]],
+    The update is not incremental, and its only saving is not sending the
+    data again: the edited network is refitted from scratch, so with
+    engine="r" this is a full netmeta() run that costs as much as calling
+    runnetmeta on the edited comparisons.
+
+    Args:
+        add: Pairwise comparisons to add (same format as runnetmeta)
+        remove: Comparisons to remove, each with `study` and optionally
+            `treat1` and `treat2`; without treatments the whole study is removed
+        analysis_id: Analysis returned by runnetmeta (default: latest in session)
+        output_format: "rows" (default) or "columns" for pairwise estimates
+        profile: Add `_timings`, a breakdown of where the call spent its time
+
+    Returns:
+        runnetmeta output for the updated analysis (with a new analysis_id),
+        plus previous_analysis_id, n_added, n_removed and a diff with the
+        treatments added/removed, heterogeneity before and after, and the
+        changes of every effect estimate, P-score and rank
+    """
+    return await async_bridge.update_netmeta(
+        add=add,
+        remove=remove,
+        analysis_id=analysis_id,
+        session_id=_session_id(ctx),
+        output_format=output_format,
+        profile=profile,
+    )
+
+
+@_tool
+async def leave_one_out(
+    data: list[dict[str, Any]] | None = None,
+    sm: str = "OR",
+    random: bool = True,
+    dataset_id: str | None = None,
+    profile: bool = False,
+) -> dict[str, Any]:
+    """
+    Leave-one-study-out sensitivity analysis.
+
+    Refits the network without each study in turn (in parallel on the
+    server) and reports how the estimates move.
+
+    Args:
+        data: List of pairwise comparisons (same format as runnetmeta)
+        sm: Summary measure
+        random: Use random effects model (True) or fixed effect model (False)
+        dataset_id: Pairwise dataset from csv_to_json, instead of data
+        profile: Add `_timings`, a breakdown of where the call spent its time
+
+    Returns:
+        Dictionary containing:
+        - treatments: Treatments, in the order used by p_scores/pscore_shift
+        - comparisons: treat1 and treat2 arrays, in the order used by
+          effects/effect_shift
+        - baseline: Full-data effects, tau2 and p_scores
+        - studies: Omitted study per row of the shift matrices
+        - effect_shift: Per study, refit minus baseline for every comparison
+        - tau2_shift: Per study, change of tau2
+        - pscore_shift: Per study, change of every P-score
+        - failed: Studies whose removal made the refit fail, with the reason
+    """
+    return await async_bridge.leave_one_out(
+        data=data, sm=sm, random=random, dataset_id=dataset_id, profile=profile
+    )
+
+
+@_tool
+async def pairwise_to_netmeta(
+    data: list[dict[str, Any]] | None = None,
     outcome_type: str = "binary",
-) -> list[dict[str, Any]]:
+    sm: str | None = None,
+    engine: str = "r",
+    dataset_id: str | None = None,
+    profile: bool = False,
+) -> list[dict[str, Any]] | dict[str, Any]:
     """
     Convert arm-level data to pairwise contrast format for netmeta.
 
@@ -176,17 +459,38 @@ def pairwise_to_netmeta(
               - n: Sample size
 
         outcome_type: "binary" or "continuous"
+        sm: Summary measure - "OR" (default), "RR" or "RD" for binary outcomes,
+            "MD" (default) or "SMD" for continuous outcomes
+        engine: "r" (meta::pairwise, default) or "numpy" (experimental, computed
+            in Python without R). Comparisons with zero or only events in both
+            arms get a null TE and seTE for OR and RR, as in meta::pairwise;
+            runnetmeta leaves them out
+        dataset_id: Arm-level dataset from csv_to_json, instead of data (sets
+            outcome_type from its format)
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
-        List of pairwise contrasts ready for runnetmeta
+        List of pairwise contrasts ready for runnetmeta; multi-arm studies
+        give one contrast per pair of arms. With profile, a dictionary with
+        the contrasts under data and the _timings block
     """
-    return r_bridge.pairwise_to_netmeta(data=data, outcome_type=outcome_type)
+    return await async_bridge.pairwise_to_netmeta(
+        data=data,
+        outcome_type=outcome_type,
+        sm=sm,
+        engine=engine,
+        dataset_id=dataset_id,
+        profile=profile,
+    )
 
 
-@mcp.tool()
-def csv_to_json(
+@_tool
+async def csv_to_json(
     csv_content: str,
     data_format: str = "pairwise",
+    output_format: str = "rows",
+    include_data: bool = True,
+    profile: bool = False,
 ) -> dict[str, Any]:
     """
     Convert CSV data to JSON format for network meta-analysis.
@@ -215,124 +519,215 @@ def csv_to_json(
             - n: Sample size
 
         data_format: One of "pairwise", "arm_binary", or "arm_continuous"
+        output_format: "rows" (list of records, default) or "columns" (dict of
+            arrays, compact for big files)
+        include_data: Return the parsed data (default: True). Set to False for
+            large files and pass dataset_id to the analysis tools instead.
+        profile: Add `_timings`, a breakdown of where the call spent its time
 
     Returns:
         Dictionary containing:
-        - data: List of records ready for runnetmeta or pairwise_to_netmeta
+        - data: Records ready for runnetmeta or pairwise_to_netmeta
+        - dataset_id: Handle that runnetmeta, runnetmeta_batch, leave_one_out
+          and pairwise_to_netmeta accept instead of data
         - n_records: Number of records parsed
         - columns: List of column names found
         - format: The data format
         - next_step: Suggested next step to run
+        On invalid values: error, plus errors (line, column, value) and n_errors
     """
-    # Parse CSV
-    reader = csv.DictReader(io.StringIO(csv_content.strip()))
-    records = list(reader)
-
-    if not records:
-        return {"error": "No data found in CSV"}
-
-    columns = list(records[0].keys())
-
-    # Validate and convert based on format
-    if data_format == "pairwise":
-        required = {"study", "treat1", "treat2", "TE", "seTE"}
-        missing = required - set(columns)
-        if missing:
-            return {
-                "error": f"Missing required columns for pairwise format: {missing}",
-                "found_columns": columns,
-                "required_columns": list(required),
-            }
-
-        # Convert numeric fields
-        data = []
-        for row in records:
-            data.append(
-                {
-                    "study": row["study"],
-                    "treat1": row["treat1"],
-                    "treat2": row["treat2"],
-                    "TE": float(row["TE"]),
-                    "seTE": float(row["seTE"]),
-                }
-            )
+    output = await async_bridge.load_csv(
+        csv_content=csv_content,
+        data_format=data_format,
+        output_format=output_format,
+        include_data=include_data,
+        profile=profile,
+    )
+    if "error" not in output:
+        output["next_step"] = _NEXT_STEPS[data_format]
+    return output
+
+
+_NEXT_STEPS = {
+    "pairwise": "Use runnetmeta(dataset_id=result['dataset_id'], sm='OR') to run "
+    "network meta-analysis",
+    "arm_binary": "Use pairwise_to_netmeta(dataset_id=result['dataset_id']) to "
+    "convert, then runnetmeta()",
+    "arm_continuous": "Use pairwise_to_netmeta(dataset_id=result['dataset_id']) to "
+    "convert, then runnetmeta()",
+}
+
+
+# Tools submit_job can run
+JOB_TOOLS = {
+    function.__name__: function
+    for function in (
+        runnetmeta,
+        runnetmeta_batch,
+        get_network_graph,
+        get_league_table,
+        get_ranking,
+        get_forest_data,
+        update_netmeta,
+        leave_one_out,
+        pairwise_to_netmeta,
+        csv_to_json,
+    )
+}
 
-        return {
-            "data": data,
-            "n_records": len(data),
-            "columns": columns,
-            "format": "pairwise",
-            "next_step": "Use runnetmeta(data=result['data'], sm='OR') to run network meta-analysis",
-        }
 
-    elif data_format == "arm_binary":
-        required = {"study", "treatment", "events", "n"}
-        missing = required - set(columns)
-        if missing:
-            return {
-                "error": f"Missing required columns for arm_binary format: {missing}",
-                "found_columns": columns,
-                "required_columns": list(required),
-            }
-
-        data = []
-        for row in records:
-            data.append(
-                {
-                    "study": row["study"],
-                    "treatment": row["treatment"],
-                    "events": int(row["events"]),
-                    "n": int(row["n"]),
-                }
-            )
+@_tool
+async def submit_job(
+    tool: str,
+    arguments: dict[str, Any] | None = None,
+    ctx: Context = None,
+) -> dict[str, Any]:
+    """
+    Run a tool in the background and return at once with a job id.
+
+    Use this for calls that may take longer than the client waits for a
+    response, such as large networks, runnetmeta_batch or leave_one_out.
+    Poll job_status until the job is finished, then call job_result.
+    Jobs run in the order submitted, a few at a time.
+
+    Args:
+        tool: Name of the tool to run: runnetmeta, runnetmeta_batch,
+            update_netmeta, leave_one_out, pairwise_to_netmeta, csv_to_json
+            or a follow-up tool (get_league_table, ...)
+        arguments: The tool's arguments, as for calling it directly
 
+    Returns:
+        The job's status (see job_status), including its job_id
+    """
+    function = JOB_TOOLS.get(tool)
+    if function is None:
         return {
-            "data": data,
-            "n_records": len(data),
-            "columns": columns,
-            "format": "arm_binary",
-            "next_step": "Use pairwise_to_netmeta(data=result['data'], outcome_type='binary') to convert, then runnetmeta()",
+            "error": f"Tool cannot be run as a job: {tool}",
+            "valid_tools": list(JOB_TOOLS),
         }
+    kwargs = dict(arguments or {})
+    signature = inspect.signature(function)
+    if "ctx" in signature.parameters:
+        kwargs["ctx"] = ctx
+    try:
+        signature.bind(**kwargs)
+    except TypeError as e:
+        return {"error": f"Invalid arguments for {tool}: {e}"}
+    job = job_queue.submit(tool, functools.partial(function, **kwargs))
+    if job is None:
+        return {"error": "Too many jobs held by the server; try again later"}
+    return job_queue.status(job)
+
+
+@_tool
+async def job_status(job_id: str) -> dict[str, Any]:
+    """
+    Get the status of a job started with submit_job.
 
-    elif data_format == "arm_continuous":
-        required = {"study", "treatment", "mean", "sd", "n"}
-        missing = required - set(columns)
-        if missing:
-            return {
-                "error": f"Missing required columns for arm_continuous format: {missing}",
-                "found_columns": columns,
-                "required_columns": list(required),
-            }
-
-        data = []
-        for row in records:
-            data.append(
-                {
-                    "study": row["study"],
-                    "treatment": row["treatment"],
-                    "mean": float(row["mean"]),
-                    "sd": float(row["sd"]),
-                    "n": int(row["n"]),
-                }
-            )
+    Args:
+        job_id: Job returned by submit_job
 
-        return {
-            "data": data,
-            "n_records": len(data),
-            "columns": columns,
-            "format": "arm_continuous",
-            "next_step": "Use pairwise_to_netmeta(data=result['data'], outcome_type='continuous') to convert, then runnetmeta()",
-        }
+    Returns:
+        Dictionary containing:
+        - job_id, tool: The job and the tool it runs
+        - status: "queued", "running", "done", "failed" or "cancelled"
+        - position: Place in the queue, 1 being next (while queued)
+        - elapsed: Seconds since submission (until it finished)
+        - queued_time, run_time: Seconds spent waiting and running
+        - expires_in: Seconds until a finished job and its result are
+          deleted
+        - error: Why the job failed
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job_id: {job_id}"}
+    return job_queue.status(job)
 
-    else:
-        return {
-            "error": f"Unknown data_format: {data_format}",
-            "valid_formats": ["pairwise", "arm_binary", "arm_continuous"],
-        }
+
+@_tool
+async def job_result(job_id: str) -> dict[str, Any]:
+    """
+    Get the output of a job started with submit_job.
+
+    Args:
+        job_id: Job returned by submit_job
+
+    Returns:
+        The job's status (see job_status), plus result, the tool's output,
+        once the job is done or failed. While it is queued or running,
+        call again later.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job_id: {job_id}"}
+    output = job_queue.status(job)
+    if job.status in ("done", "failed"):
+        output["result"] = job.result
+    return output
+
+
+@_tool
+async def cancel_job(job_id: str) -> dict[str, Any]:
+    """
+    Cancel a job started with submit_job.
+
+    A queued job never runs; a running job has its R processes killed
+    and its output discarded. Finished jobs are not affected.
+
+    Args:
+        job_id: Job returned by submit_job
+
+    Returns:
+        The job's status (see job_status) after cancelling
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job_id: {job_id}"}
+    return job_queue.status(job)
+
+
+@_tool
+async def get_server_status() -> dict[str, Any]:
+    """
+    Get the readiness of the R backend.
+
+    Tools that do not need R (csv_to_json) are available immediately; the
+    others wait for R to start on first use.
+
+    Returns:
+        Dictionary containing:
+        - status: "stopped", "starting", "ready" or "failed"
+        - r_executable, r_version: The R installation in use
+        - workers, workers_busy: Size and occupancy of the R worker pool
+        - result_cache: Hit/miss counters of the result cache
+        - error: Why initialization failed (if status is "failed")
+    """
+    return r_bridge.status()
+
+
+def add_bridge_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add command-line options that configure the R bridge."""
+    parser.add_argument(
+        "--r-workers",
+        type=int,
+        default=None,
+        help="Number of persistent R worker processes "
+        "(default: NETMETA_R_WORKERS or 1)",
+    )
+
+
+def configure_bridge(args: argparse.Namespace) -> None:
+    """Apply R bridge command-line options."""
+    if args.r_workers is not None:
+        r_bridge.start_pool(args.r_workers)
 
 
 def main():
     """Run the MCP server."""
+    parser = argparse.ArgumentParser(description="NetMeta MCP server (stdio)")
+    add_bridge_arguments(parser)
+    configure_bridge(parser.parse_args())
+    r_bridge.start_background()
     mcp.run()
 
 
@@ -0,0 +1,509 @@
+"""
+Analysis state for NetMeta
+
+Keeps saved netmeta results so that follow-up tools can query a specific
+analysis. Every analysis gets an id and its own RDS file in a private
+directory, and the most recent analysis of each MCP session is remembered
+so follow-up calls without an explicit id keep working. Analyses expire
+after a TTL and the least recently used ones are evicted when the budget,
+counting both RDS files and in-memory result bundles, is exceeded.
+
+When several server processes serve the same clients (NETMETA_STATE_SHARED=1,
+set by `python -m netmeta_mcp.http_server --workers N`), SharedAnalysisStore
+keeps the registry in a SQLite database in the state directory instead, so
+any process can answer follow-up calls on an analysis run by another.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .results import ResultBundle
+
+# Default seconds an unused analysis is kept
+DEFAULT_TTL = 3600.0
+
+# Default memory and disk budget for saved analyses, in megabytes
+DEFAULT_MAX_MB = 512.0
+
+# Default maximum number of analyses held at once
+DEFAULT_MAX_ANALYSES = 1000
+
+# Rough in-memory size of one stored input record, for the budget
+_RECORD_BYTES = 256
+
+# Database of the shared state, in the state directory
+STATE_DB = "state.sqlite3"
+
+# Seconds a process waits for another one's write to the database
+DB_TIMEOUT = 30.0
+
+# Analyses each process keeps loaded from the shared database
+LOADED_ANALYSES = 64
+
+
+@dataclass
+class Analysis:
+    """A saved netmeta result."""
+
+    analysis_id: str
+    session_id: str | None
+    path: Path
+    created: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    size: int = 0
+    bundle: ResultBundle | None = None
+    # Input records and run_netmeta options, kept for update_netmeta
+    data: list[dict[str, Any]] | None = None
+    options: dict[str, Any] = field(default_factory=dict)
+
+    def _update_size(self) -> None:
+        try:
+            self.size = self.path.stat().st_size
+        except OSError:
+            self.size = 0
+        if self.bundle is not None:
+            self.size += self.bundle.nbytes
+        if self.data is not None:
+            self.size += _RECORD_BYTES * len(self.data)
+
+
+class AnalysisStore:
+    """Thread-safe registry of saved analyses."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        ttl: float | None = None,
+        max_bytes: int | None = None,
+        max_analyses: int | None = None,
+    ):
+        """
+        Args:
+            directory: Where RDS files are written. Defaults to
+                NETMETA_STATE_DIR or a fresh temporary directory.
+            ttl: Seconds an unused analysis is kept. Defaults to
+                NETMETA_STATE_TTL or 3600; 0 keeps analyses forever.
+            max_bytes: Memory and disk budget. Defaults to
+                NETMETA_STATE_MAX_MB or 512 MB.
+            max_analyses: Maximum number of analyses. Defaults to
+                NETMETA_STATE_MAX_ANALYSES or 1000.
+        """
+        if directory is None:
+            directory = os.environ.get("NETMETA_STATE_DIR")
+        self._owns_directory = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="netmeta_state_")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        if ttl is None:
+            ttl = float(os.environ.get("NETMETA_STATE_TTL", DEFAULT_TTL))
+        self._ttl = ttl or None
+        if max_bytes is None:
+            max_mb = float(os.environ.get("NETMETA_STATE_MAX_MB", DEFAULT_MAX_MB))
+            max_bytes = int(max_mb * 1024 * 1024)
+        self._max_bytes = max_bytes
+        if max_analyses is None:
+            max_analyses = int(
+                os.environ.get("NETMETA_STATE_MAX_ANALYSES", DEFAULT_MAX_ANALYSES)
+            )
+        self._max_analyses = max_analyses
+
+        self._lock = threading.Lock()
+        self._analyses: dict[str, Analysis] = {}
+        self._latest: dict[str | None, str] = {}
+
+    def create(
+        self,
+        session_id: str | None = None,
+        data: list[dict[str, Any]] | None = None,
+        options: dict[str, Any] | None = None,
+    ) -> Analysis:
+        """Allocate a new analysis; it is registered by `commit`."""
+        analysis_id = uuid.uuid4().hex
+        return Analysis(
+            analysis_id=analysis_id,
+            session_id=session_id,
+            path=self.directory / f"{analysis_id}.rds",
+            data=data,
+            options=options or {},
+        )
+
+    def commit(self, analysis: Analysis) -> None:
+        """Register a saved analysis as the latest of its session."""
+        analysis._update_size()
+        analysis.last_access = time.time()
+        with self._lock:
+            self._analyses[analysis.analysis_id] = analysis
+            self._latest[analysis.session_id] = analysis.analysis_id
+            self._evict(keep=analysis.analysis_id)
+
+    def attach_bundle(self, analysis: Analysis, bundle: ResultBundle) -> None:
+        """Keep the derived outputs of an analysis in memory."""
+        with self._lock:
+            analysis.bundle = bundle
+            analysis._update_size()
+            self._evict(keep=analysis.analysis_id)
+
+    def get(
+        self, analysis_id: str | None = None, session_id: str | None = None
+    ) -> Analysis | None:
+        """
+        Look up an analysis by id, or the latest one of a session.
+
+        Returns None if the analysis does not exist or has expired.
+        """
+        with self._lock:
+            self._evict()
+            if analysis_id is None:
+                analysis_id = self._latest.get(session_id)
+                if analysis_id is None:
+                    return None
+            analysis = self._analyses.get(analysis_id)
+            if analysis is not None:
+                analysis.last_access = time.time()
+            return analysis
+
+    def discard(self, analysis: Analysis) -> None:
+        """Forget an analysis and delete its files."""
+        with self._lock:
+            self._remove(analysis.analysis_id)
+        analysis.path.unlink(missing_ok=True)
+
+    def _remove(self, analysis_id: str) -> Analysis | None:
+        analysis = self._analyses.pop(analysis_id, None)
+        for session_id, latest_id in list(self._latest.items()):
+            if latest_id == analysis_id:
+                del self._latest[session_id]
+        return analysis
+
+    def _evict(self, keep: str | None = None) -> None:
+        """
+        Drop expired analyses, then least recently used ones over budget.
+
+        The budget never evicts `keep` (the analysis being saved) or the
+        most recently used analysis, so an analysis larger than the whole
+        budget stays available to the next call, at the cost of all others.
+        """
+        now = time.time()
+        evicted = []
+        if self._ttl is not None:
+            for analysis in list(self._analyses.values()):
+                if now - analysis.last_access > self._ttl:
+                    evicted.append(self._remove(analysis.analysis_id))
+
+        by_age = sorted(self._analyses.values(), key=lambda a: a.last_access)
+        total = sum(analysis.size for analysis in by_age)
+        count = len(by_age)
+        candidates = [a for a in by_age[:-1] if a.analysis_id != keep]
+        while candidates and (total > self._max_bytes or count > self._max_analyses):
+            analysis = candidates.pop(0)
+            total -= analysis.size
+            count -= 1
+            evicted.append(self._remove(analysis.analysis_id))
+
+        for analysis in evicted:
+            analysis.path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove all analyses, and the state directory if it is temporary."""
+        with self._lock:
+            analyses = list(self._analyses.values())
+            self._analyses.clear()
+            self._latest.clear()
+        for analysis in analyses:
+            analysis.path.unlink(missing_ok=True)
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def connect(directory: Path) -> sqlite3.Connection:
+    """
+    Open the shared state database of a state directory.
+
+    The connection is in autocommit mode (use `transaction` for writes)
+    and may be used from any thread, under the caller's lock.
+    """
+    db = sqlite3.connect(
+        directory / STATE_DB,
+        timeout=DB_TIMEOUT,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    # Readers do not block the writer, and the writer does not block readers
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+@contextlib.contextmanager
+def transaction(db: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run statements atomically, holding the database's write lock."""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+
+class SharedAnalysisStore(AnalysisStore):
+    """
+    Registry of saved analyses shared by several processes.
+
+    Analyses are rows of a SQLite database in the state directory, with
+    their input records, options and result bundle, next to their RDS
+    files; the latest analysis of each session is a row too. SQLite
+    serialises writers across processes, so commits are atomic and
+    eviction is consistent. An analysis never changes once committed, so
+    each process keeps the ones it has loaded in memory.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        ttl: float | None = None,
+        max_bytes: int | None = None,
+        max_analyses: int | None = None,
+    ):
+        """Arguments as for AnalysisStore; the directory must be shared."""
+        super().__init__(directory, ttl, max_bytes, max_analyses)
+        self._db = connect(self.directory)
+        with transaction(self._db) as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analyses (
+                    analysis_id TEXT PRIMARY KEY,
+                    session_id TEXT,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    options TEXT NOT NULL,
+                    data BLOB,
+                    bundle BLOB
+                )
+                """
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_last_access "
+                "ON analyses (last_access)"
+            )
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS latest (
+                    session_id TEXT PRIMARY KEY,
+                    analysis_id TEXT NOT NULL
+                )
+                """
+            )
+        self._loaded: OrderedDict[str, Analysis] = OrderedDict()
+
+    def commit(self, analysis: Analysis) -> None:
+        """Register a saved analysis as the latest of its session."""
+        analysis._update_size()
+        data = None
+        if analysis.data is not None:
+            data = json.dumps(analysis.data).encode("utf-8")
+        bundle = _bundle_bytes(analysis.bundle)
+        analysis.last_access = time.time()
+        with self._lock:
+            with transaction(self._db) as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        analysis.analysis_id,
+                        analysis.session_id,
+                        analysis.created,
+                        analysis.last_access,
+                        analysis.size,
+                        json.dumps(analysis.options),
+                        data,
+                        bundle,
+                    ),
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO latest VALUES (?, ?)",
+                    (analysis.session_id or "", analysis.analysis_id),
+                )
+                evicted = self._evict_rows(db, budget=True, keep=analysis.analysis_id)
+            self._remember(analysis)
+        _unlink(evicted)
+
+    def attach_bundle(self, analysis: Analysis, bundle: ResultBundle) -> None:
+        """Save the derived outputs of an analysis with it."""
+        analysis.bundle = bundle
+        analysis._update_size()
+        payload = _bundle_bytes(bundle)
+        with self._lock:
+            with transaction(self._db) as db:
+                db.execute(
+                    "UPDATE analyses SET bundle = ?, size = ? WHERE analysis_id = ?",
+                    (payload, analysis.size, analysis.analysis_id),
+                )
+                evicted = self._evict_rows(db, budget=True, keep=analysis.analysis_id)
+        _unlink(evicted)
+
+    def get(
+        self, analysis_id: str | None = None, session_id: str | None = None
+    ) -> Analysis | None:
+        """
+        Look up an analysis by id, or the latest one of a session.
+
+        Returns None if the analysis does not exist or has expired.
+        """
+        now = time.time()
+        with self._lock:
+            with transaction(self._db) as db:
+                evicted = self._evict_rows(db, budget=False)
+                if analysis_id is None:
+                    row = db.execute(
+                        "SELECT analysis_id FROM latest WHERE session_id = ?",
+                        (session_id or "",),
+                    ).fetchone()
+                    analysis_id = row[0] if row is not None else None
+                found = analysis_id is not None and bool(
+                    db.execute(
+                        "UPDATE analyses SET last_access = ? WHERE analysis_id = ?",
+                        (now, analysis_id),
+                    ).rowcount
+                )
+            _unlink(evicted)
+            if not found:
+                return None
+
+            analysis = self._loaded.get(analysis_id)
+            if analysis is None or analysis.bundle is None:
+                # Not loaded yet, or another process may have built its bundle
+                analysis = self._load(analysis_id)
+                if analysis is None:
+                    return None
+            self._remember(analysis)
+            analysis.last_access = now
+            return analysis
+
+    def discard(self, analysis: Analysis) -> None:
+        """Forget an analysis and delete its files."""
+        with self._lock:
+            with transaction(self._db) as db:
+                db.execute(
+                    "DELETE FROM analyses WHERE analysis_id = ?",
+                    (analysis.analysis_id,),
+                )
+                db.execute(
+                    "DELETE FROM latest WHERE analysis_id = ?",
+                    (analysis.analysis_id,),
+                )
+            self._loaded.pop(analysis.analysis_id, None)
+        analysis.path.unlink(missing_ok=True)
+
+    def _load(self, analysis_id: str) -> Analysis | None:
+        row = self._db.execute(
+            "SELECT session_id, created, last_access, size, options, data, bundle "
+            "FROM analyses WHERE analysis_id = ?",
+            (analysis_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        session_id, created, last_access, size, options, data, bundle = row
+        return Analysis(
+            analysis_id=analysis_id,
+            session_id=session_id,
+            path=self.directory / f"{analysis_id}.rds",
+            created=created,
+            last_access=last_access,
+            size=size,
+            bundle=_load_bundle(bundle),
+            data=None if data is None else json.loads(data),
+            options=json.loads(options),
+        )
+
+    def _remember(self, analysis: Analysis) -> None:
+        self._loaded[analysis.analysis_id] = analysis
+        self._loaded.move_to_end(analysis.analysis_id)
+        while len(self._loaded) > LOADED_ANALYSES:
+            self._loaded.popitem(last=False)
+
+    def _evict_rows(
+        self, db: sqlite3.Connection, budget: bool, keep: str | None = None
+    ) -> list[Path]:
+        """
+        Delete expired analyses, and with `budget` least recently used ones
+        over budget, sparing `keep` and the most recently used analysis as
+        AnalysisStore._evict does; returns the RDS files to delete once
+        committed.
+        """
+        evicted = []
+        if self._ttl is not None:
+            evicted += [
+                row[0]
+                for row in db.execute(
+                    "SELECT analysis_id FROM analyses WHERE last_access < ?",
+                    (time.time() - self._ttl,),
+                )
+            ]
+        if budget:
+            rows = db.execute(
+                "SELECT analysis_id, size FROM analyses ORDER BY last_access DESC"
+            ).fetchall()
+            # Spared analyses count first, so older ones make room for them
+            spared = {keep, rows[0][0]} if rows else set()
+            total = sum(size for analysis_id, size in rows if analysis_id in spared)
+            count = sum(analysis_id in spared for analysis_id, _ in rows)
+            for analysis_id, size in rows:
+                if analysis_id in spared:
+                    continue
+                total += size
+                count += 1
+                if total > self._max_bytes or count > self._max_analyses:
+                    evicted.append(analysis_id)
+        evicted = list(dict.fromkeys(evicted))
+        for analysis_id in evicted:
+            db.execute("DELETE FROM analyses WHERE analysis_id = ?", (analysis_id,))
+            db.execute("DELETE FROM latest WHERE analysis_id = ?", (analysis_id,))
+            self._loaded.pop(analysis_id, None)
+        return [self.directory / f"{analysis_id}.rds" for analysis_id in evicted]
+
+    def clear(self) -> None:
+        """
+        Forget the analyses loaded by this process; the shared ones are
+        kept for the other processes, unless the state directory is
+        temporary.
+        """
+        with self._lock:
+            self._loaded.clear()
+            self._db.close()
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _bundle_bytes(bundle: ResultBundle | None) -> bytes | None:
+    if bundle is None:
+        return None
+    buffer = io.BytesIO()
+    bundle.save(buffer)
+    return buffer.getvalue()
+
+
+def _load_bundle(payload: bytes | None) -> ResultBundle | None:
+    if payload is None:
+        return None
+    return ResultBundle.load(io.BytesIO(payload))[0]
+
+
+def _unlink(paths: list[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
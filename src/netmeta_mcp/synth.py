@@ -0,0 +1,330 @@
+"""
+Synthetic networks for NetMeta
+
+Generates arm-level and pairwise datasets of any size for scale and load
+testing, deterministically from a seed. Studies are drawn from the edges
+of a chosen network topology, and three-arm studies from pairs of
+adjacent edges, so the shape of the evidence (a star around a common comparator, a ring, a
+random sparse or dense graph, or two disconnected subnetworks) can be
+controlled independently of its size.
+
+Arm-level outcomes are simulated from a random effects model: each study
+has its own baseline, treatment T1 is the reference, and the other
+treatments have true effects (log odds ratios for binary outcomes, mean
+differences for continuous ones) with between-study heterogeneity `tau`.
+Pairwise contrasts are derived from the arms with arms_to_contrasts, so
+both layouts describe the same data. Records use the schemas of
+datasets.DATA_FORMATS, as csv_to_json and runnetmeta expect them.
+
+Usage:
+    python -m netmeta_mcp.synth --treatments 50 --studies 500 \\
+        --multi-arm 0.2 --topology random --outcome binary --format arm \\
+        --seed 1 --output network.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .contrasts import SUMMARY_MEASURES, arms_to_contrasts
+from .datasets import DATA_FORMATS
+
+TOPOLOGIES = ("star", "ring", "random", "disconnected")
+OUTCOME_TYPES = tuple(SUMMARY_MEASURES)
+LAYOUTS = ("pairwise", "arm")
+
+# Default share of treatment pairs compared in random topologies
+DEFAULT_DENSITY = 0.3
+
+# Spread of the true treatment effects around the reference
+EFFECT_SD = 0.5
+
+# Range of arm sizes
+ARM_SIZES = (40, 400)
+
+# Mean event risk of the reference arm for binary outcomes
+BASELINE_RISK = 0.3
+
+
+def _labels(prefix: str, n: int) -> list[str]:
+    """Zero-padded labels, so they sort in numeric order."""
+    width = len(str(n))
+    return [f"{prefix}{i + 1:0{width}d}" for i in range(n)]
+
+
+def _random_edges(
+    nodes: list[int], density: float, rng: np.random.Generator
+) -> set[tuple[int, int]]:
+    """A random spanning tree over nodes plus random extra edges."""
+    order = rng.permutation(nodes).tolist()
+    edges = set()
+    for i in range(1, len(order)):
+        j = order[int(rng.integers(0, i))]
+        edges.add((min(order[i], j), max(order[i], j)))
+    possible = len(nodes) * (len(nodes) - 1) // 2
+    target = max(len(edges), round(density * possible))
+    while len(edges) < target:
+        a, b = rng.choice(nodes, 2, replace=False).tolist()
+        edges.add((min(a, b), max(a, b)))
+    return edges
+
+
+def _topology_edges(
+    n_treatments: int, topology: str, density: float, rng: np.random.Generator
+) -> list[tuple[int, int]]:
+    """Comparisons studies may make, as sorted pairs of treatment indices."""
+    if topology == "star":
+        edges = {(0, i) for i in range(1, n_treatments)}
+    elif topology == "ring":
+        edges = {
+            (min(i, (i + 1) % n_treatments), max(i, (i + 1) % n_treatments))
+            for i in range(n_treatments)
+        }
+    elif topology == "random":
+        edges = _random_edges(list(range(n_treatments)), density, rng)
+    else:
+        half = n_treatments // 2
+        edges = _random_edges(list(range(half)), density, rng) | _random_edges(
+            list(range(half, n_treatments)), density, rng
+        )
+    return sorted(edges)
+
+
+def _designs(
+    n_treatments: int,
+    n_studies: int,
+    multi_arm: float,
+    topology: str,
+    density: float,
+    rng: np.random.Generator,
+) -> list[list[int]]:
+    """The treatments compared by each study."""
+    edges = _topology_edges(n_treatments, topology, density, rng)
+    if n_studies < len(edges):
+        raise ValueError(
+            f"A {topology} network of {n_treatments} treatments needs at least "
+            f"{len(edges)} studies to cover its comparisons"
+        )
+    # Every edge once, so the network has the intended shape, then at random
+    chosen = list(range(len(edges)))
+    chosen += rng.integers(0, len(edges), n_studies - len(edges)).tolist()
+    chosen = rng.permutation(chosen).tolist()
+
+    neighbours: dict[int, set[int]] = {i: set() for i in range(n_treatments)}
+    for a, b in edges:
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+
+    designs = [list(edges[i]) for i in chosen]
+    # A third arm is a neighbour of one of the arms, so a three-arm study
+    # spans two adjacent edges and adds the comparison closing their
+    # triangle (in a star: the hub and two spokes)
+    candidates = [sorted((neighbours[a] | neighbours[b]) - {a, b}) for a, b in designs]
+    eligible = [s for s, c in enumerate(candidates) if c]
+    n_multi = round(multi_arm * n_studies)
+    if n_multi > len(eligible):
+        raise ValueError(
+            f"A {topology} network of {n_treatments} treatments can have at "
+            f"most {len(eligible)} three-arm studies, not {n_multi}"
+        )
+    for s in rng.choice(eligible, n_multi, replace=False).tolist():
+        c = candidates[s]
+        designs[s].append(c[int(rng.integers(0, len(c)))])
+    return designs
+
+
+def generate(
+    n_treatments: int = 10,
+    n_studies: int = 30,
+    multi_arm: float = 0.1,
+    topology: str = "random",
+    density: float = DEFAULT_DENSITY,
+    tau: float = 0.1,
+    outcome_type: str = "binary",
+    layout: str = "pairwise",
+    sm: str | None = None,
+    seed: int = 0,
+) -> list[dict[str, Any]]:
+    """
+    Generate a synthetic network meta-analysis dataset.
+
+    Args:
+        n_treatments: Number of treatments (T1 is the reference)
+        n_studies: Number of studies; at least the number of comparisons
+            in the topology (e.g. n_treatments - 1 for a star)
+        multi_arm: Proportion of three-arm studies. The third arm is a
+            neighbour of one of the other two in the topology, and its
+            comparison with the other arm is added to the network (in a
+            star, the hub and two spokes)
+        topology: "star" (every study includes T1), "ring" (neighbouring
+            treatments), "random" (random connected graph) or
+            "disconnected" (two random subnetworks)
+        density: Share of all treatment pairs that studies compare, for
+            the random and disconnected topologies
+        tau: Between-study heterogeneity (standard deviation)
+        outcome_type: "binary" or "continuous"
+        layout: "pairwise" (contrasts for runnetmeta) or "arm" (arm-level
+            records for pairwise_to_netmeta)
+        sm: Summary measure of pairwise contrasts (default: OR for binary,
+            MD for continuous outcomes)
+        seed: Random seed; the same arguments always give the same data
+
+    Returns:
+        Records in the schema of DATA_FORMATS["pairwise"] or of the arm
+        format of the outcome type
+
+    Raises:
+        ValueError: If an argument is out of range, or the topology has
+            too few treatments for the three-arm studies
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {topology}; use one of {TOPOLOGIES}")
+    if outcome_type not in OUTCOME_TYPES:
+        raise ValueError(f"Unknown outcome_type: {outcome_type}")
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}; use one of {LAYOUTS}")
+    minimum = 4 if topology == "disconnected" else 2
+    if n_treatments < minimum:
+        raise ValueError(f"A {topology} network needs at least {minimum} treatments")
+    if not 0 <= multi_arm <= 1 or not 0 <= density <= 1 or tau < 0:
+        raise ValueError("Need 0 <= multi_arm <= 1, 0 <= density <= 1 and tau >= 0")
+
+    rng = np.random.default_rng(seed)
+    treatments = _labels("T", n_treatments)
+    studies = _labels("S", n_studies)
+    designs = _designs(n_treatments, n_studies, multi_arm, topology, density, rng)
+
+    effects = np.concatenate([[0.0], rng.normal(0.0, EFFECT_SD, n_treatments - 1)])
+    arm_study = np.repeat(np.arange(n_studies), [len(d) for d in designs])
+    arm_treatment = np.concatenate([np.array(d) for d in designs])
+    n_arms = len(arm_study)
+    # Independent arm deviations with variance tau^2 / 2 give every contrast
+    # variance tau^2, with the covariance tau^2 / 2 of multi-arm studies
+    deviation = rng.normal(0.0, tau / np.sqrt(2), n_arms)
+    n = rng.integers(ARM_SIZES[0], ARM_SIZES[1] + 1, n_arms)
+
+    if outcome_type == "binary":
+        baseline = np.log(BASELINE_RISK / (1 - BASELINE_RISK))
+        baseline = rng.normal(baseline, 0.5, n_studies)
+        logit = baseline[arm_study] + effects[arm_treatment] + deviation
+        events = rng.binomial(n, 1 / (1 + np.exp(-logit)))
+        values = {"events": events.tolist(), "n": n.tolist()}
+    else:
+        baseline = rng.normal(0.0, 1.0, n_studies)
+        sd = rng.uniform(0.8, 1.2, n_arms)
+        true_mean = baseline[arm_study] + effects[arm_treatment] + deviation
+        mean = true_mean + rng.normal(0.0, sd / np.sqrt(n))
+        values = {
+            "mean": np.round(mean, 4).tolist(),
+            "sd": np.round(sd, 4).tolist(),
+            "n": n.tolist(),
+        }
+
+    arm_format = f"arm_{outcome_type}"
+    fields = [name for name, _ in DATA_FORMATS[arm_format]]
+    columns = {
+        "study": [studies[s] for s in arm_study.tolist()],
+        "treatment": [treatments[t] for t in arm_treatment.tolist()],
+        **values,
+    }
+    arms = [dict(zip(fields, row)) for row in zip(*(columns[f] for f in fields))]
+    if layout == "arm":
+        return arms
+    return arms_to_contrasts(arms, outcome_type=outcome_type, sm=sm)
+
+
+def to_csv(records: list[dict[str, Any]]) -> str:
+    """Records as CSV text with a header row, as csv_to_json accepts it."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(records[0]), lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Write a synthetic dataset as CSV or JSON."""
+    parser = argparse.ArgumentParser(
+        prog="python -m netmeta_mcp.synth",
+        description="Generate a synthetic network meta-analysis dataset.",
+    )
+    parser.add_argument("--treatments", type=int, default=10)
+    parser.add_argument("--studies", type=int, default=30)
+    parser.add_argument(
+        "--multi-arm",
+        type=float,
+        default=0.1,
+        help="Proportion of three-arm studies",
+    )
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="random")
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=DEFAULT_DENSITY,
+        help="Share of treatment pairs compared (random/disconnected topologies)",
+    )
+    parser.add_argument("--tau", type=float, default=0.1, help="Heterogeneity SD")
+    parser.add_argument("--outcome", choices=OUTCOME_TYPES, default="binary")
+    parser.add_argument("--format", choices=LAYOUTS, default="pairwise")
+    parser.add_argument("--sm", help="Summary measure of pairwise contrasts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Output file; .json writes an example-style JSON file, anything "
+        "else CSV (default: CSV on stdout)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        records = generate(
+            n_treatments=args.treatments,
+            n_studies=args.studies,
+            multi_arm=args.multi_arm,
+            topology=args.topology,
+            density=args.density,
+            tau=args.tau,
+            outcome_type=args.outcome,
+            layout=args.format,
+            sm=args.sm,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output is not None and args.output.suffix == ".json":
+        sm = args.sm or SUMMARY_MEASURES[args.outcome][0]
+        content = json.dumps(
+            {
+                "name": args.output.stem,
+                "description": f"Synthetic {args.topology} network",
+                "source": "python -m netmeta_mcp.synth "
+                + " ".join(sys.argv[1:] if argv is None else argv),
+                "outcome": args.outcome,
+                "sm": sm,
+                "reference": _labels("T", args.treatments)[0],
+                **({"format": "arm-level"} if args.format == "arm" else {}),
+                "n_studies": args.studies,
+                "n_treatments": args.treatments,
+                "data": records,
+            },
+            indent=2,
+        )
+    else:
+        content = to_csv(records)
+
+    if args.output is None:
+        sys.stdout.write(content)
+    else:
+        args.output.write_text(content)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from netmeta_mcp import contrasts
+from netmeta_mcp.cache import ResultCache
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+# Set to 1 (e.g. in CI) to fail, rather than skip, comparisons with R whose
+# reference results are not recorded in tests/data
+REQUIRE_RECORDED = os.environ.get("NETMETA_REQUIRE_RECORDED", "0") == "1"
+
+
+def require_recorded(path: Path, reason: str) -> None:
+    """Skip the calling test if `path` is not recorded, or fail if required."""
+    if path.exists():
+        return
+    if REQUIRE_RECORDED:
+        pytest.fail(f"{reason} (NETMETA_REQUIRE_RECORDED=1)")
+    pytest.skip(reason)
+
+
+def _load_example(name: str) -> tuple[list[dict[str, Any]], str, str | None]:
+    """Pairwise data, summary measure and reference of a bundled example."""
+    example = json.loads((EXAMPLES / f"{name}.json").read_text())
+    data = example["data"]
+    if example.get("format") == "arm-level":
+        outcome = "binary" if "events" in data[0] else "continuous"
+        data = contrasts.arms_to_contrasts(data, outcome, example["sm"])
+    return data, example["sm"], example.get("reference")
+
+
+@pytest.fixture
+def load_example():
+    return _load_example
+
+
+@pytest.fixture(autouse=True)
+def result_cache_dir(tmp_path, monkeypatch) -> Path:
+    """
+    Keep on-disk caches in the test's temporary directory, never in the
+    user's cache directory. The server's bridge is created at import, so
+    it gets a fresh result cache there too.
+    """
+    directory = tmp_path / "netmeta_cache"
+    monkeypatch.setenv("NETMETA_CACHE_DIR", str(directory))
+    server = sys.modules.get("netmeta_mcp.server")
+    if server is not None and server.r_bridge._cache is not None:
+        monkeypatch.setattr(server.r_bridge, "_cache", ResultCache())
+    return directory
+
+
+# Stands in for R in RWorker tests: answers with the sentinel protocol of its
+# read-eval loop. Sys.sleep(x) sleeps, quit() exits mid-job and Sys.getpid()
+# prints the process id; any other script prints {"ok": true}.
+FAKE_R = """#!{python}
+import os
+import re
+import sys
+import time
+
+sentinel = re.search(r"__NETMETA_WORKER_DONE_[0-9a-f]+__", sys.argv[-1]).group()
+print("\\n" + sentinel, flush=True)
+for header in sys.stdin:
+    code = "".join(sys.stdin.readline() for _ in range(int(header)))
+    sleep = re.search(r"Sys.sleep\\(([0-9.]+)\\)", code)
+    if sleep:
+        time.sleep(float(sleep.group(1)))
+    if "quit(" in code:
+        print("Fatal error", file=sys.stderr, flush=True)
+        sys.exit(1)
+    output = os.getpid() if "Sys.getpid()" in code else '{{"ok": true}}'
+    print(f"{{output}}\\n" + sentinel, flush=True)
+"""
+
+
+@pytest.fixture
+def fake_r(tmp_path) -> str:
+    """Path to an executable that answers RWorker like R."""
+    executable = tmp_path / "R"
+    executable.write_text(FAKE_R.format(python=sys.executable))
+    executable.chmod(0o755)
+    return str(executable)
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.r_bridge import NetmetaBridge
+from netmeta_mcp.r_worker import RWorkerPool
+
+ROWS = [
+    {"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.5, "seTE": 0.2},
+    {"study": "s2", "treat1": "A", "treat2": "C", "TE": 0.3, "seTE": 0.25},
+    {"study": "s3", "treat1": "B", "treat2": "C", "TE": -0.1, "seTE": 0.3},
+]
+# Two separate sub-networks
+DISCONNECTED = [
+    {"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.5, "seTE": 0.2},
+    {"study": "s2", "treat1": "C", "treat2": "D", "TE": 0.3, "seTE": 0.25},
+]
+
+
+def _shifted(shift: float) -> list[dict]:
+    return [{**row, "TE": row["TE"] + shift} for row in ROWS]
+
+
+@pytest.fixture
+def bridge(tmp_path, monkeypatch):
+    monkeypatch.setenv("NETMETA_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("NETMETA_STATE_SHARED", "0")
+    monkeypatch.setenv("NETMETA_RESULT_CACHE", "0")
+    bridge = NetmetaBridge()
+    yield bridge
+    bridge.close()
+
+
+def test_results_come_back_in_input_order(bridge, fake_r, monkeypatch):
+    # A pool of three (never started, as numpy items do not use R) lets the
+    # items run in parallel; earlier items are made to finish last
+    bridge._pool = RWorkerPool(fake_r, size=3)
+    fit = bridge._run_netmeta_numpy
+
+    def slow_fit(data, sm, reference):
+        time.sleep(0.3 - data[0]["TE"] / 10)
+        return fit(data, sm, reference)
+
+    monkeypatch.setattr(bridge, "_run_netmeta_numpy", slow_fit)
+    items = [{"name": f"n{i}", "data": _shifted(i / 2)} for i in range(4)]
+    output = bridge.run_netmeta_batch(items, sm="MD", engine="numpy")
+    assert list(output["results"]) == ["n0", "n1", "n2", "n3"]
+    for i, result in enumerate(output["results"].values()):
+        expected = engine.fit(_shifted(i / 2), sm="MD")
+        assert result["treatments"] == expected.treatments
+        (row,) = [
+            row
+            for row in result["random_effects"]
+            if (row["treat1"], row["treat2"]) == ("A", "B")
+        ]
+        assert row["effect"] == pytest.approx(expected.random.te[0, 1])
+
+
+def test_failed_item_does_not_fail_the_others(bridge):
+    items = [
+        {"data": ROWS},
+        {"data": DISCONNECTED},
+        {"name": "no data"},
+        {"data": ROWS, "reference": "Z"},
+        {"data": _shifted(1.0)},
+    ]
+    output = bridge.run_netmeta_batch(items, sm="MD", engine="numpy")
+    results = output["results"]
+    assert list(results) == ["item1", "item2", "no data", "item4", "item5"]
+    assert (output["n_items"], output["n_failed"]) == (5, 3)
+    assert "sub-networks" in results["item2"]["error"]
+    assert results["no data"] == {"error": "Item has no 'data' list or 'dataset_id'"}
+    assert "Reference treatment 'Z'" in results["item4"]["error"]
+    assert "error" not in results["item1"]
+    assert "error" not in results["item5"]
+
+
+def test_each_result_is_an_analysis_of_the_session(bridge):
+    dataset = bridge.load_csv(
+        "study,treat1,treat2,TE,seTE\n"
+        + "".join(
+            f"{r['study']},{r['treat1']},{r['treat2']},{r['TE']},{r['seTE']}\n"
+            for r in ROWS
+        )
+    )
+    items = [
+        {"name": "rows", "data": ROWS},
+        {"name": "dataset", "dataset_id": dataset["dataset_id"]},
+        {"name": "failed", "data": DISCONNECTED},
+    ]
+    output = bridge.run_netmeta_batch(items, sm="MD", engine="numpy", session_id="s")
+    results = output["results"]
+    ids = [results[name]["analysis_id"] for name in ("rows", "dataset")]
+    assert ids[0] != ids[1]
+    for analysis_id in ids:
+        ranking = bridge.get_ranking(analysis_id=analysis_id, session_id="s")
+        assert "error" not in ranking
+    # The session's latest analysis is one of the batch's
+    assert bridge._store.get(session_id="s").analysis_id in ids
+    assert bridge._store.get(session_id="other") is None
+    assert "analysis_id" not in results["failed"]
+
+
+def test_duplicate_names(bridge):
+    output = bridge.run_netmeta_batch(
+        [{"name": "a", "data": ROWS}, {"name": "a", "data": ROWS}], engine="numpy"
+    )
+    assert output == {"error": "Duplicate item names: ['a']"}
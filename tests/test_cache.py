@@ -0,0 +1,150 @@
+import os
+
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.cache import CachedResult, ResultCache, cache_key
+
+ROWS = [
+    {"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.5, "seTE": 0.2},
+    {"study": "s2", "treat1": "A", "treat2": "C", "TE": -0.3, "seTE": 0.3},
+    {"study": "s3", "treat1": "B", "treat2": "C", "TE": 0.1, "seTE": 0.25},
+]
+
+
+@pytest.fixture(autouse=True)
+def _commit(monkeypatch):
+    monkeypatch.setenv("NETMETA_COMMIT", "abc123")
+
+
+def _result(te: float = 0.5) -> CachedResult:
+    rows = [{**ROWS[0], "TE": te}, *ROWS[1:]]
+    return CachedResult(engine.fit(rows, sm="MD"), n_studies=3, n_comparisons=3)
+
+
+def test_key_ignores_row_order_and_types():
+    key = cache_key(ROWS, "MD", "A", "numpy")
+    assert cache_key(ROWS[::-1], "MD", "A", "numpy") == key
+    retyped = [{**ROWS[0], "TE": "0.5", "seTE": 0.2}, *ROWS[1:]]
+    assert cache_key(retyped, "MD", "A", "numpy") == key
+    extra = [{**row, "notes": "ignored"} for row in ROWS]
+    assert cache_key(extra, "MD", "A", "numpy") == key
+
+
+def test_key_ignores_missing_reference_spelling():
+    assert cache_key(ROWS, "MD", None, "r") == cache_key(ROWS, "MD", "", "r")
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        {"sm": "SMD"},
+        {"reference": "B"},
+        {"engine": "r"},
+        {"data": [{**ROWS[0], "TE": 0.51}, *ROWS[1:]]},
+        {"data": ROWS[:2]},
+    ],
+)
+def test_key_changes_with_inputs(changed):
+    arguments = {"data": ROWS, "sm": "MD", "reference": "A", "engine": "numpy"}
+    assert cache_key(**{**arguments, **changed}) != cache_key(**arguments)
+
+
+def test_key_changes_with_netmeta_commit(monkeypatch):
+    key = cache_key(ROWS, "MD", "A", "r")
+    monkeypatch.setenv("NETMETA_COMMIT", "def456")
+    assert cache_key(ROWS, "MD", "A", "r") != key
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        {"study": "s", "treat1": "A", "treat2": "B", "TE": None, "seTE": 0.1},
+        {"study": "s", "treat1": "A", "treat2": "B", "TE": 0.1},
+    ],
+)
+def test_rows_that_cannot_be_keyed_are_not_cached(row):
+    assert cache_key([*ROWS, row], "MD", "A", "r") is None
+
+
+def test_memory_hit(tmp_path):
+    cache = ResultCache(tmp_path, max_entries=4, max_bytes=1 << 20)
+    result = _result()
+    cache.put("k1", result)
+    assert cache.get("k1") is result
+    assert cache.get("k2") is None
+    assert cache.stats() == {
+        "hits": 1,
+        "disk_hits": 0,
+        "misses": 1,
+        "memory_entries": 1,
+    }
+
+
+def test_memory_tier_evicts_to_disk(tmp_path):
+    cache = ResultCache(tmp_path, max_entries=1, max_bytes=1 << 20)
+    first, second = _result(0.5), _result(0.7)
+    cache.put("k1", first)
+    cache.put("k2", second)
+    assert cache.stats()["memory_entries"] == 1
+
+    # k1 left memory but is still on disk, and is promoted back
+    restored = cache.get("k1")
+    assert restored is not first
+    assert restored.bundle.common.te[1, 0] == pytest.approx(
+        first.bundle.common.te[1, 0]
+    )
+    assert restored.n_studies == 3
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("k1") is restored
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    ResultCache(tmp_path, max_bytes=1 << 20).put("k1", _result())
+    restarted = ResultCache(tmp_path, max_bytes=1 << 20)
+    assert restarted.get("k1") is not None
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    probe = ResultCache(tmp_path / "probe", max_bytes=1 << 20)
+    probe.put("probe", _result())
+    size = (tmp_path / "probe" / "probe.npz").stat().st_size
+
+    cache = ResultCache(tmp_path / "cache", max_entries=0, max_bytes=int(2.5 * size))
+    cache.put("k1", _result(0.1))
+    cache.put("k2", _result(0.2))
+    os.utime(tmp_path / "cache" / "k1.npz", (1, 1))
+    os.utime(tmp_path / "cache" / "k2.npz", (2, 2))
+    cache.put("k3", _result(0.3))
+
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == [
+        "k2.npz",
+        "k3.npz",
+    ]
+    assert cache.get("k1") is None
+    assert cache.get("k2") is not None
+
+
+def test_unreadable_entries_are_discarded(tmp_path):
+    cache = ResultCache(tmp_path, max_entries=0, max_bytes=1 << 20)
+    (tmp_path / "bad.npz").write_bytes(b"not a zip file")
+    assert cache.get("bad") is None
+    assert not (tmp_path / "bad.npz").exists()
+
+
+def test_disk_tier_can_be_disabled(tmp_path):
+    cache = ResultCache(tmp_path / "results", max_entries=0, max_bytes=0)
+    cache.put("k1", _result())
+    assert not (tmp_path / "results").exists()
+    assert cache.get("k1") is None
+
+
+def test_clear_keeps_the_disk_tier(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=1 << 20)
+    result = _result()
+    cache.put("k1", result)
+    cache.clear()
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.get("k1") is not result
+    assert cache.stats()["disk_hits"] == 1
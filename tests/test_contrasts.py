@@ -0,0 +1,221 @@
+import json
+import math
+from pathlib import Path
+
+import pytest
+from conftest import require_recorded
+
+from netmeta_mcp import engine
+from netmeta_mcp.contrasts import (
+    SUMMARY_MEASURES,
+    ConversionError,
+    arms_to_contrasts,
+    max_difference,
+)
+from netmeta_mcp.datasets import parse_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ARM_FILES = [
+    ROOT / "examples" / "depression_arms.csv",
+    ROOT / "examples" / "parkinson_arms.csv",
+    ROOT / "tests" / "data" / "zero_cells_arms.csv",
+]
+
+# meta::pairwise() output recorded by `python -m netmeta_mcp.contrasts --record`
+PAIRWISE = ROOT / "tests" / "data" / "pairwise"
+
+
+def _arms(path: Path) -> tuple[list[dict], str]:
+    content = path.read_text()
+    outcome = "binary" if "events" in content.splitlines()[0] else "continuous"
+    return parse_csv(content, f"arm_{outcome}").records(), outcome
+
+
+def _contrast(contrasts, study, treat1, treat2):
+    (row,) = [
+        row
+        for row in contrasts
+        if (row["study"], row["treat1"], row["treat2"]) == (study, treat1, treat2)
+    ]
+    return row
+
+
+@pytest.fixture
+def zero_cells():
+    data, _ = _arms(ROOT / "tests" / "data" / "zero_cells_arms.csv")
+    return data
+
+
+@pytest.mark.parametrize(
+    "path, sm",
+    [(path, sm) for path in ARM_FILES for sm in SUMMARY_MEASURES[_arms(path)[1]]],
+    ids=lambda value: value.stem if isinstance(value, Path) else value,
+)
+def test_matches_meta_pairwise(path, sm):
+    recorded_file = PAIRWISE / f"{path.stem}.json"
+    require_recorded(
+        recorded_file,
+        f"No meta::pairwise() output recorded for {path.name}; run "
+        "python -m netmeta_mcp.contrasts --record tests/data/pairwise on "
+        "a machine with R",
+    )
+    recorded = json.loads(recorded_file.read_text())
+    data, outcome = _arms(path)
+    contrasts = arms_to_contrasts(data, outcome, sm)
+    assert max_difference(contrasts, recorded["contrasts"][sm]) <= 1e-10
+
+
+def test_odds_ratio():
+    data = [
+        {"study": "s", "treatment": "A", "events": 12, "n": 30},
+        {"study": "s", "treatment": "B", "events": 20, "n": 33},
+    ]
+    (row,) = arms_to_contrasts(data, "binary", "OR")
+    assert row["TE"] == pytest.approx(math.log(12 * 13 / (18 * 20)))
+    assert row["seTE"] == pytest.approx(math.sqrt(1 / 12 + 1 / 18 + 1 / 20 + 1 / 13))
+
+
+def test_risk_ratio():
+    data = [
+        {"study": "s", "treatment": "A", "events": 12, "n": 30},
+        {"study": "s", "treatment": "B", "events": 20, "n": 33},
+    ]
+    (row,) = arms_to_contrasts(data, "binary", "RR")
+    assert row["TE"] == pytest.approx(math.log((12 / 30) / (20 / 33)))
+    assert row["seTE"] == pytest.approx(math.sqrt(1 / 12 - 1 / 30 + 1 / 20 - 1 / 33))
+
+
+def test_three_arm_study_gives_every_pair():
+    contrasts = arms_to_contrasts(
+        [
+            {"study": "s", "treatment": t, "events": 5 + i, "n": 40}
+            for i, t in enumerate(["C", "A", "B"])
+        ]
+    )
+    assert [(row["treat1"], row["treat2"]) for row in contrasts] == [
+        ("C", "A"),
+        ("C", "B"),
+        ("A", "B"),
+    ]
+
+
+def test_zero_cell_corrects_every_arm_of_the_study(zero_cells):
+    contrasts = arms_to_contrasts(zero_cells, "binary", "OR")
+    # Arm B of the three-arm study has no events, so A versus C is corrected too
+    row = _contrast(contrasts, "Three arms", "A", "C")
+    assert row["TE"] == pytest.approx(math.log(3.5 * 35.5 / (37.5 * 6.5)))
+    # No zero cell: no correction
+    row = _contrast(contrasts, "No zero", "A", "B")
+    assert row["TE"] == pytest.approx(math.log(5 * 39 / (45 * 9)))
+
+
+@pytest.mark.parametrize("sm", ["OR", "RR"])
+def test_double_zero_and_double_full_rows_are_missing(zero_cells, sm):
+    contrasts = arms_to_contrasts(zero_cells, "binary", sm)
+    assert len(contrasts) == 7
+    for study in ("Double zero", "Double full"):
+        (row,) = [row for row in contrasts if row["study"] == study]
+        assert row["TE"] is None
+        assert row["seTE"] is None
+    assert _contrast(contrasts, "Single zero", "A", "C")["TE"] is not None
+
+
+def test_risk_difference(zero_cells):
+    contrasts = arms_to_contrasts(zero_cells, "binary", "RD")
+    assert all(row["TE"] is not None for row in contrasts)
+
+    # Without zero cells: Wald standard error
+    row = _contrast(contrasts, "No zero", "A", "B")
+    assert row["TE"] == pytest.approx(5 / 50 - 9 / 48)
+    assert row["seTE"] == pytest.approx(
+        math.sqrt(0.1 * 0.9 / 50 + (9 / 48) * (39 / 48) / 48)
+    )
+
+    # With a zero cell: the estimate is uncorrected, the standard error is
+    row = _contrast(contrasts, "Single zero", "A", "C")
+    assert row["TE"] == pytest.approx(0 / 30 - 4 / 28)
+    assert row["seTE"] == pytest.approx(
+        math.sqrt(0.5 * 30.5 / 31**3 + 4.5 * 24.5 / 29**3)
+    )
+
+    row = _contrast(contrasts, "Double zero", "A", "B")
+    assert row["TE"] == 0.0
+    assert row["seTE"] == pytest.approx(
+        math.sqrt(0.5 * 20.5 / 21**3 + 0.5 * 22.5 / 23**3)
+    )
+
+
+def test_missing_rows_are_left_out_of_the_fit(zero_cells):
+    contrasts = arms_to_contrasts(zero_cells, "binary", "OR")
+    bundle = engine.fit(contrasts, sm="OR")
+    expected = engine.fit([row for row in contrasts if row["TE"] is not None])
+    assert max(engine.compare(bundle, expected).values()) == 0.0
+
+
+def test_multi_arm_study_with_a_missing_row_is_rejected():
+    data = [
+        {"study": "s1", "treatment": "A", "events": 0, "n": 25},
+        {"study": "s1", "treatment": "B", "events": 0, "n": 24},
+        {"study": "s1", "treatment": "C", "events": 5, "n": 26},
+    ]
+    contrasts = arms_to_contrasts(data, "binary", "OR")
+    assert _contrast(contrasts, "s1", "A", "B")["TE"] is None
+    # As in netmeta, the study no longer has all of its comparisons
+    with pytest.raises(engine.EngineError, match="needs each of its 3 pairs"):
+        engine.Network(contrasts)
+
+
+def test_continuous():
+    data = [
+        {"study": "s", "treatment": "A", "mean": -1.22, "sd": 3.7, "n": 54},
+        {"study": "s", "treatment": "B", "mean": -1.53, "sd": 4.28, "n": 95},
+    ]
+    (md,) = arms_to_contrasts(data, "continuous")
+    assert md["TE"] == pytest.approx(-1.22 + 1.53)
+    assert md["seTE"] == pytest.approx(math.sqrt(3.7**2 / 54 + 4.28**2 / 95))
+
+    (smd,) = arms_to_contrasts(data, "continuous", "SMD")
+    pooled = math.sqrt((53 * 3.7**2 + 94 * 4.28**2) / 147)
+    g = (-1.22 + 1.53) / pooled * (1 - 3 / (4 * 149 - 9))
+    assert smd["TE"] == pytest.approx(g)
+    assert smd["seTE"] == pytest.approx(
+        math.sqrt(149 / (54 * 95) + g**2 / (2 * (149 - 3.94)))
+    )
+
+
+@pytest.mark.parametrize(
+    "data, outcome_type, sm, message",
+    [
+        ([], "survival", None, "Unknown outcome_type"),
+        ([], "binary", "MD", "not available for binary"),
+        (
+            [{"study": 1, "treatment": "A"}, {"study": 1, "treatment": "B"}],
+            "binary",
+            None,
+            "Missing field",
+        ),
+        (
+            [
+                {"study": 1, "treatment": "A", "events": 5, "n": 4},
+                {"study": 1, "treatment": "B", "events": 1, "n": 4},
+            ],
+            "binary",
+            None,
+            "0 <= events <= n",
+        ),
+    ],
+)
+def test_invalid_input(data, outcome_type, sm, message):
+    with pytest.raises(ConversionError, match=message):
+        arms_to_contrasts(data, outcome_type, sm)
+
+
+def test_max_difference():
+    rows = [{"study": 1, "treat1": "A", "treat2": "B", "TE": 0.5, "seTE": 0.1}]
+    shifted = [{**rows[0], "TE": 0.5 + 1e-3}]
+    assert max_difference(rows, shifted) == pytest.approx(1e-3)
+    assert max_difference(rows, [{**rows[0], "TE": None}]) == math.inf
+    assert max_difference(rows, [{**rows[0], "treat1": "B", "treat2": "A"}]) == (
+        math.inf
+    )
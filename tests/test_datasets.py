@@ -0,0 +1,214 @@
+import time
+
+import numpy as np
+import pytest
+
+from netmeta_mcp.datasets import (
+    MAX_REPORTED_ERRORS,
+    DatasetStore,
+    SharedDatasetStore,
+    parse_csv,
+)
+
+PAIRWISE = """study,treat1,treat2,TE,seTE,notes
+DeFronzo1995,Metformin,Placebo,-1.9,0.1414,first
+
+Lewin2007, Metformin ,Placebo,-0.82,0.0992,
+"""
+
+
+def test_parse_pairwise():
+    dataset = parse_csv(PAIRWISE, "pairwise")
+    assert dataset.n_rows == 2
+    assert dataset.source_columns == [
+        "study",
+        "treat1",
+        "treat2",
+        "TE",
+        "seTE",
+        "notes",
+    ]
+    assert dataset.columns["TE"].dtype == np.float64
+    assert dataset.records() == [
+        {
+            "study": "DeFronzo1995",
+            "treat1": "Metformin",
+            "treat2": "Placebo",
+            "TE": -1.9,
+            "seTE": 0.1414,
+        },
+        {
+            "study": "Lewin2007",
+            "treat1": "Metformin",
+            "treat2": "Placebo",
+            "TE": -0.82,
+            "seTE": 0.0992,
+        },
+    ]
+
+
+def test_parse_arm_binary_types():
+    dataset = parse_csv(
+        "study,treatment,events,n\ns1,A,3,40\ns1,B,5,41\n", "arm_binary"
+    )
+    assert dataset.columns["events"].dtype == np.int64
+    assert dataset.records()[1] == {
+        "study": "s1",
+        "treatment": "B",
+        "events": 5,
+        "n": 41,
+    }
+
+
+@pytest.mark.parametrize(
+    "content, data_format, message",
+    [
+        ("study,treat1\n", "long", "Unknown data_format"),
+        ("", "pairwise", "No data found"),
+        ("study,treat1,treat2,TE,seTE\n\n", "pairwise", "No data found"),
+        ("study,treat1,TE\ns1,A,0.1\n", "pairwise", "Missing required columns"),
+    ],
+)
+def test_parse_errors(content, data_format, message):
+    result = parse_csv(content, data_format)
+    assert message in result["error"]
+
+
+def test_invalid_cells_are_reported_with_line_numbers():
+    content = (
+        "study,treatment,events,n\n"
+        "s1,A,3,40\n"
+        "s1,B,five,41\n"
+        "\n"
+        ",C,2,30\n"
+        "s2,A,2.5,x\n"
+        "s2,B\n"
+    )
+    result = parse_csv(content, "arm_binary")
+    assert result["error"] == "5 invalid values in CSV"
+    assert result["n_errors"] == 5
+    assert result["errors"] == [
+        {"line": 3, "column": "events", "value": "five", "error": "Expected int"},
+        {"line": 5, "column": "study", "value": "", "error": "Expected str"},
+        {"line": 6, "column": "events", "value": "2.5", "error": "Expected int"},
+        {"line": 6, "column": "n", "value": "x", "error": "Expected int"},
+        {"line": 7, "error": "Expected 4 fields, got 2"},
+    ]
+
+
+def test_line_numbers_count_blank_lines_before_the_header():
+    content = "\n  \nstudy,treatment,events,n\ns1,A,3,40\ns1,B,five,41\n\n\n"
+    result = parse_csv(content, "arm_binary")
+    assert result["errors"] == [
+        {"line": 5, "column": "events", "value": "five", "error": "Expected int"}
+    ]
+    assert parse_csv("\n\n \n", "arm_binary") == {"error": "No data found in CSV"}
+
+
+def test_reported_errors_are_capped():
+    rows = "".join(f"s{i},A,B,x,0.1\n" for i in range(MAX_REPORTED_ERRORS + 10))
+    result = parse_csv("study,treat1,treat2,TE,seTE\n" + rows, "pairwise")
+    assert result["n_errors"] == MAX_REPORTED_ERRORS + 10
+    assert len(result["errors"]) == MAX_REPORTED_ERRORS
+    assert result["errors"][-1]["line"] == MAX_REPORTED_ERRORS + 1
+
+
+def _dataset(rows: int = 10):
+    content = "study,treat1,treat2,TE,seTE\n" + "".join(
+        f"s{i},A,B,0.1,0.2\n" for i in range(rows)
+    )
+    return parse_csv(content, "pairwise")
+
+
+def test_store_add_and_get():
+    store = DatasetStore(ttl=60, max_bytes=1 << 20)
+    dataset = _dataset()
+    store.add(dataset)
+    assert store.get(dataset.dataset_id) is dataset
+    assert store.get("unknown") is None
+
+
+def test_store_expires_unused_datasets():
+    store = DatasetStore(ttl=60, max_bytes=1 << 20)
+    old, recent = _dataset(), _dataset()
+    store.add(old)
+    store.add(recent)
+    old.last_access = time.time() - 61
+    assert store.get(old.dataset_id) is None
+    assert store.get(recent.dataset_id) is recent
+
+
+def test_store_without_ttl_keeps_datasets():
+    store = DatasetStore(ttl=0, max_bytes=1 << 20)
+    dataset = _dataset()
+    store.add(dataset)
+    dataset.last_access = time.time() - 10**6
+    assert store.get(dataset.dataset_id) is dataset
+
+
+def test_store_evicts_least_recently_used_over_budget():
+    first, second, third = _dataset(), _dataset(), _dataset()
+    store = DatasetStore(ttl=0, max_bytes=2 * first.nbytes)
+    store.add(first)
+    store.add(second)
+    first.last_access = second.last_access - 1
+    # Using the second dataset makes the first the least recently used one
+    assert store.get(second.dataset_id) is second
+    third.last_access = time.time() + 1
+    store.add(third)
+    assert store.get(first.dataset_id) is None
+    assert store.get(second.dataset_id) is second
+    assert store.get(third.dataset_id) is third
+
+
+def test_store_keeps_the_newest_dataset_over_budget():
+    store = DatasetStore(ttl=0, max_bytes=1)
+    dataset = _dataset()
+    store.add(dataset)
+    assert store.get(dataset.dataset_id) is dataset
+
+
+def test_store_clear():
+    store = DatasetStore(ttl=0, max_bytes=1 << 20)
+    dataset = _dataset()
+    store.add(dataset)
+    store.clear()
+    assert store.get(dataset.dataset_id) is None
+
+
+def test_shared_store_is_read_by_another_instance(tmp_path):
+    writer = SharedDatasetStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    reader = SharedDatasetStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    dataset = parse_csv(PAIRWISE, "pairwise")
+    writer.add(dataset)
+
+    loaded = reader.get(dataset.dataset_id)
+    assert loaded is not dataset
+    assert loaded.data_format == "pairwise"
+    assert loaded.n_rows == 2
+    assert loaded.source_columns == dataset.source_columns
+    assert loaded.records() == dataset.records()
+    assert reader.get("unknown") is None
+
+
+def test_shared_store_evicts_for_every_instance(tmp_path):
+    first, second = _dataset(), _dataset()
+    writer = SharedDatasetStore(tmp_path, ttl=60, max_bytes=first.nbytes)
+    reader = SharedDatasetStore(tmp_path, ttl=60, max_bytes=first.nbytes)
+    first.last_access = time.time() - 1
+    writer.add(first)
+    reader.add(second)
+    assert writer.get(first.dataset_id) is None
+    assert writer.get(second.dataset_id) is not None
+
+    second_copy = reader.get(second.dataset_id)
+    assert second_copy.records() == second.records()
+
+
+def test_shared_store_expires_for_every_instance(tmp_path):
+    writer = SharedDatasetStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    reader = SharedDatasetStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    dataset = _dataset()
+    dataset.last_access = time.time() - 61
+    writer.add(dataset)
+    assert reader.get(dataset.dataset_id) is None
@@ -0,0 +1,231 @@
+import json
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+from conftest import require_recorded
+
+from netmeta_mcp import engine
+from netmeta_mcp.results import ModelResult, ResultBundle
+
+EXAMPLES = ["Senn2013", "smokingcessation", "Linde2015", "parkinson"]
+
+# netmeta results recorded by `python -m netmeta_mcp.engine --record`
+NETMETA = Path(__file__).parent / "data" / "netmeta"
+
+
+def _dense_fit(data, sm, reference):
+    """
+    netmeta's fit written out with dense matrices: incidence matrix B,
+    reduced multi-arm weights W (Rücker 2012), hat matrix H and the
+    DerSimonian-Laird estimate tau^2 = (Q - df) / tr((I - H) (BB' * E / 2) W)
+    of nma_ruecker(), where E marks comparisons of the same study.
+    """
+    treatments = sorted(
+        {row["treat1"] for row in data} | {row["treat2"] for row in data},
+        key=engine.collation_key,
+    )
+    n, m = len(treatments), len(data)
+    b = np.zeros((m, n))
+    y = np.array([row["TE"] for row in data], dtype=float)
+    v = np.array([row["seTE"] for row in data], dtype=float) ** 2
+    for e, row in enumerate(data):
+        b[e, treatments.index(row["treat1"])] = 1.0
+        b[e, treatments.index(row["treat2"])] = -1.0
+    studies = [str(row["study"]) for row in data]
+    same = np.array([[s == t for t in studies] for s in studies], dtype=float)
+
+    def weights(tau2):
+        w = np.zeros((m, m))
+        for study in set(studies):
+            rows = [e for e in range(m) if studies[e] == study]
+            arms = sorted({j for e in rows for j in np.flatnonzero(b[e])})
+            k = len(arms)
+            variances = np.zeros((k, k))
+            for e in rows:
+                i, j = (arms.index(a) for a in np.flatnonzero(b[e]))
+                variances[i, j] = variances[j, i] = v[e] + tau2
+            centre = np.eye(k) - np.ones((k, k)) / k
+            laplacian = np.linalg.pinv(-0.5 * centre @ variances @ centre)
+            for e in rows:
+                i, j = (arms.index(a) for a in np.flatnonzero(b[e]))
+                w[e, e] = -laplacian[i, j]
+        return w
+
+    z = NormalDist().inv_cdf(0.975)
+
+    def model(w):
+        lp = np.linalg.pinv(b.T @ w @ b)
+        theta = lp @ b.T @ w @ y
+        hat = b @ lp @ b.T @ w
+        residuals = y - hat @ y
+        te = theta[:, None] - theta[None, :]
+        se = np.sqrt(np.maximum(np.add.outer(np.diag(lp), np.diag(lp)) - 2 * lp, 0))
+        np.fill_diagonal(se, 0.0)
+        result = ModelResult(te=te, se=se, lower=te - z * se, upper=te + z * se)
+        return result, float(residuals @ w @ residuals), hat
+
+    w = weights(0.0)
+    common, q, hat = model(w)
+    arms = {s: set() for s in studies}
+    for row in data:
+        arms[str(row["study"])] |= {row["treat1"], row["treat2"]}
+    df = sum(len(a) - 1 for a in arms.values()) - (n - 1)
+    denominator = np.trace((np.eye(m) - hat) @ (b @ b.T * same / 2) @ w)
+    tau2 = max(0.0, (q - df) / denominator)
+    random, _, _ = model(weights(tau2))
+    bundle = ResultBundle(
+        treatments=treatments,
+        sm=sm,
+        reference=reference or "",
+        common=common,
+        random=random,
+        heterogeneity={"tau2": tau2, "tau": tau2**0.5, "I2": (q - df) / q},
+        edges=[],
+    )
+    return bundle, q, df
+
+
+@pytest.mark.parametrize("name", EXAMPLES)
+def test_matches_dense_formulas(name, load_example):
+    data, sm, reference = load_example(name)
+    bundle = engine.fit(data, sm=sm, reference=reference)
+    dense, _, _ = _dense_fit(data, sm, reference)
+    differences = engine.compare(bundle, dense)
+    assert max(differences.values()) <= engine.ENGINE_TOLERANCE, differences
+
+
+@pytest.mark.parametrize("name", EXAMPLES)
+def test_matches_netmeta(name):
+    path = NETMETA / f"{name}.json"
+    require_recorded(
+        path,
+        f"No netmeta results recorded for {name}; run "
+        "python -m netmeta_mcp.engine --record tests/data/netmeta on a "
+        "machine with R",
+    )
+    recorded = json.loads(path.read_text())
+    bundle = engine.fit(
+        recorded["data"], sm=recorded["sm"], reference=recorded["reference"]
+    )
+    netmeta = ResultBundle.from_r(recorded["netmeta"])
+    differences = engine.compare(bundle, netmeta)
+    assert max(differences.values()) <= engine.ENGINE_TOLERANCE, differences
+    if netmeta.heterogeneity["I2"] is not None:
+        assert bundle.heterogeneity["I2"] == pytest.approx(
+            netmeta.heterogeneity["I2"], abs=engine.ENGINE_TOLERANCE
+        )
+    assert bundle.edges == netmeta.edges
+
+
+def test_senn2013_heterogeneity(load_example):
+    # As printed by netmeta: Q = 96.99 on 18 df, tau^2 = 0.1087, I^2 = 81.4%
+    data, sm, reference = load_example("Senn2013")
+    bundle = engine.fit(data, sm=sm, reference=reference)
+    network = engine.Network(data)
+    _, q, _ = network.model(network.weights())
+    assert network.df == 18
+    assert q == pytest.approx(96.99, abs=5e-3)
+    assert bundle.heterogeneity["tau2"] == pytest.approx(0.1087, abs=5e-5)
+    assert bundle.heterogeneity["I2"] == pytest.approx(0.814, abs=5e-4)
+
+
+def test_no_heterogeneity(load_example):
+    data, sm, reference = load_example("parkinson")
+    bundle = engine.fit(data, sm=sm, reference=reference)
+    assert bundle.heterogeneity["tau2"] == 0.0
+    assert bundle.heterogeneity["I2"] == 0.0
+    for field in ("te", "se", "lower", "upper"):
+        np.testing.assert_allclose(
+            getattr(bundle.random, field), getattr(bundle.common, field)
+        )
+
+
+def test_multi_arm_study_needs_all_pairs(load_example):
+    data, _, _ = load_example("Linde2015")
+    sizes = {}
+    for row in data:
+        sizes[row["study"]] = sizes.get(row["study"], 0) + 1
+    study = next(s for s, k in sizes.items() if k == 3)
+    incomplete = data.copy()
+    incomplete.remove(next(row for row in data if row["study"] == study))
+    with pytest.raises(engine.EngineError, match="needs each of its 3 pairs"):
+        engine.Network(incomplete)
+
+
+def test_orientation_and_order():
+    data = [
+        {"study": "s1", "treat1": "b", "treat2": "A", "TE": 0.5, "seTE": 0.2},
+        {"study": "s2", "treat1": "A", "treat2": "c", "TE": -0.3, "seTE": 0.3},
+    ]
+    bundle = engine.fit(data, sm="MD")
+    assert bundle.treatments == ["A", "b", "c"]
+    assert bundle.common.te[1, 0] == pytest.approx(0.5)
+    assert bundle.common.te[0, 2] == pytest.approx(-0.3)
+    assert [(e["from"], e["to"]) for e in bundle.edges] == [("A", "b"), ("A", "c")]
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ([], "No comparisons"),
+        ([{"study": 1, "treat1": "A", "treat2": "B", "TE": 0.1}], "Missing field"),
+        (
+            [{"study": 1, "treat1": "A", "treat2": "B", "TE": 0.1, "seTE": 0}],
+            "No comparison has a TE and a positive seTE",
+        ),
+        (
+            [{"study": 1, "treat1": "A", "treat2": "B", "TE": "x", "seTE": 1}],
+            "must be numeric",
+        ),
+        (
+            [
+                {"study": 1, "treat1": "A", "treat2": "B", "TE": 0.1, "seTE": 0.1},
+                {"study": 2, "treat1": "C", "treat2": "D", "TE": 0.1, "seTE": 0.1},
+            ],
+            "2 separate sub-networks",
+        ),
+    ],
+)
+def test_invalid_networks(data, message):
+    with pytest.raises(engine.EngineError, match=message):
+        engine.fit(data)
+
+
+def test_missing_estimates_are_left_out(load_example):
+    data, sm, reference = load_example("Senn2013")
+    missing = [
+        {
+            "study": "extra",
+            "treat1": "Placebo",
+            "treat2": "Acarbose",
+            "TE": None,
+            "seTE": None,
+        },
+        {
+            "study": "extra2",
+            "treat1": "Placebo",
+            "treat2": "Acarbose",
+            "TE": 0.1,
+            "seTE": 0.0,
+        },
+    ]
+    bundle = engine.fit(data + missing, sm=sm, reference=reference)
+    expected = engine.fit(data, sm=sm, reference=reference)
+    assert max(engine.compare(bundle, expected).values()) == 0.0
+
+
+def test_unknown_reference(load_example):
+    data, sm, _ = load_example("Senn2013")
+    with pytest.raises(engine.EngineError, match="must match one of"):
+        engine.fit(data, sm=sm, reference="Insulin")
+
+
+def test_bundle_payload_round_trip(load_example):
+    data, sm, reference = load_example("Linde2015")
+    bundle = engine.fit(data, sm=sm, reference=reference)
+    restored = ResultBundle.from_r(engine.bundle_payload(bundle))
+    assert max(engine.compare(restored, bundle).values()) == 0.0
+    assert restored.edges == bundle.edges
+    assert restored.heterogeneity == bundle.heterogeneity
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from netmeta_mcp.http_server import SessionIds
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+async def _request(headers):
+    """Send one request through SessionIds; returns the headers it reached
+    the app with and the response headers."""
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["headers"] = scope["headers"]
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": headers}
+    await SessionIds(app)(scope, None, send)
+    assert sent[1]["type"] == "http.response.body"
+    return seen["headers"], sent[0]["headers"]
+
+
+def _session_ids(headers):
+    return [value for name, value in headers if name == b"mcp-session-id"]
+
+
+async def test_issues_a_session_id():
+    _, first = await _request([])
+    _, second = await _request([])
+    (first_id,) = _session_ids(first)
+    (second_id,) = _session_ids(second)
+    assert len(first_id) == 32
+    assert first_id != second_id
+
+
+async def test_keeps_the_client_session_id():
+    headers = [(b"mcp-session-id", b"abc")]
+    received, response = await _request(headers)
+    assert received == headers
+    assert _session_ids(response) == []
+
+
+async def test_passes_other_scopes_through():
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope["type"])
+
+    await SessionIds(app)({"type": "lifespan"}, None, None)
+    assert called == ["lifespan"]
+
+
+def _configuration(workers: int) -> str:
+    """Import the HTTP app with NETMETA_HTTP_WORKERS set, in a fresh process."""
+    script = (
+        "from netmeta_mcp import http_server as h; "
+        "print(h.mcp.settings.stateless_http, "
+        "isinstance(h.app.app.routes[-1].app, h.SessionIds), "
+        "h.metrics.REGISTRY.constant_labels == {'pid': str(h.os.getpid())})"
+    )
+    env = {**os.environ, "NETMETA_HTTP_WORKERS": str(workers), "PYTHONPATH": str(SRC)}
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_several_workers_issue_session_ids_and_label_metrics_by_pid():
+    assert _configuration(2) == "True True True"
+
+
+def test_one_worker_keeps_mcp_sessions_and_plain_metrics():
+    assert _configuration(1) == "False False False"
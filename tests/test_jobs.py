@@ -0,0 +1,312 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from netmeta_mcp import jobs, server
+from netmeta_mcp.jobs import JobQueue, SharedJobQueue
+from netmeta_mcp.r_worker import RWorker, RWorkerError
+
+ROWS = [{"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.1, "seTE": 0.2}]
+
+
+class BlockingCall:
+    """
+    Stand-in for a bridge method: blocks its worker thread until released,
+    registering a cancellation callback the way the bridge does for R.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.killed = threading.Event()
+
+    def __call__(self, **kwargs):
+        with jobs.on_cancel(self.killed.set):
+            self.started.set()
+            self.release.wait(5)
+        if jobs.cancelled():
+            return {"error": "Job cancelled"}
+        return {"ok": True}
+
+    async def wait_started(self):
+        assert await asyncio.to_thread(self.started.wait, 5)
+
+
+async def _until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _gated(gate: asyncio.Event, order: list[str], name: str):
+    async def run():
+        order.append(name)
+        await gate.wait()
+        return {"name": name}
+
+    return run
+
+
+async def test_jobs_run_first_in_first_out_within_the_concurrency_limit():
+    queue = JobQueue(concurrency=2, ttl=60, max_jobs=10)
+    gates = [asyncio.Event() for _ in range(4)]
+    order = []
+    submitted = [
+        queue.submit("tool", _gated(gate, order, str(i)))
+        for i, gate in enumerate(gates)
+    ]
+    await asyncio.sleep(0)
+    assert [job.status for job in submitted] == [
+        "running",
+        "running",
+        "queued",
+        "queued",
+    ]
+    assert queue.status(submitted[2])["position"] == 1
+    assert queue.status(submitted[3])["position"] == 2
+    assert order == ["0", "1"]
+
+    gates[1].set()
+    await _until(lambda: submitted[2].status == "running")
+    assert submitted[1].status == "done"
+    assert submitted[1].result == {"name": "1"}
+    assert submitted[3].status == "queued"
+    assert queue.status(submitted[3])["position"] == 1
+
+    for gate in gates:
+        gate.set()
+    await _until(lambda: all(job.status == "done" for job in submitted))
+    assert order == ["0", "1", "2", "3"]
+
+
+async def test_failed_jobs():
+    queue = JobQueue(concurrency=2, ttl=60, max_jobs=10)
+
+    async def raises():
+        raise ValueError("bad input")
+
+    async def returns_error():
+        return {"error": "R error"}
+
+    raised = queue.submit("tool", raises)
+    returned = queue.submit("tool", returns_error)
+    await _until(lambda: raised.status in jobs.FINISHED)
+    await _until(lambda: returned.status in jobs.FINISHED)
+    assert raised.status == "failed"
+    assert raised.error == "ValueError: bad input"
+    assert returned.status == "failed"
+    assert returned.error == "R error"
+    assert returned.result == {"error": "R error"}
+
+
+async def test_cancel_queued_job():
+    queue = JobQueue(concurrency=1, ttl=60, max_jobs=10)
+    gate = asyncio.Event()
+    order = []
+    running = queue.submit("tool", _gated(gate, order, "running"))
+    queued = queue.submit("tool", _gated(gate, order, "queued"))
+
+    assert queue.cancel(queued.job_id) is queued
+    assert queued.status == "cancelled"
+    assert "position" not in queue.status(queued)
+
+    gate.set()
+    await _until(lambda: running.status == "done")
+    await asyncio.sleep(0.01)
+    assert order == ["running"]
+    assert queued.result is None
+
+
+async def test_cancel_running_job_reaches_the_bridge():
+    queue = JobQueue(concurrency=1, ttl=60, max_jobs=10)
+    call = BlockingCall()
+    results = []
+
+    async def run():
+        results.append(await asyncio.to_thread(call))
+
+    job = queue.submit("tool", run)
+    await call.wait_started()
+    queue.cancel(job.job_id)
+    # The callback registered in the worker thread runs at once
+    assert call.killed.is_set()
+    assert job.status == "cancelled"
+    await _until(lambda: job.job_id not in queue._tasks)
+
+    call.release.set()
+    await asyncio.sleep(0.05)
+    assert results == []
+    assert job.result is None
+    assert queue.cancel(job.job_id).status == "cancelled"
+
+
+def test_on_cancel_outside_jobs_does_nothing():
+    called = []
+    with jobs.on_cancel(lambda: called.append(True)):
+        assert not jobs.cancelled()
+    assert called == []
+
+
+async def test_finished_jobs_expire():
+    queue = JobQueue(concurrency=1, ttl=60, max_jobs=10)
+
+    async def done():
+        return {}
+
+    job = queue.submit("tool", done)
+    await _until(lambda: job.status == "done")
+    assert queue.status(job)["expires_in"] == pytest.approx(60, abs=1)
+    job.finished = time.time() - 61
+    assert queue.get(job.job_id) is None
+
+
+async def test_max_jobs_evicts_the_oldest_finished_job():
+    queue = JobQueue(concurrency=2, ttl=0, max_jobs=2)
+    gate = asyncio.Event()
+
+    async def done():
+        return {}
+
+    first = queue.submit("tool", done)
+    await _until(lambda: first.status == "done")
+    second = queue.submit("tool", _gated(gate, [], "second"))
+    third = queue.submit("tool", _gated(gate, [], "third"))
+    assert third is not None
+    assert queue.get(first.job_id) is None
+
+    # Unfinished jobs are never evicted
+    assert queue.submit("tool", done) is None
+    gate.set()
+    await _until(lambda: third.status == "done")
+    assert queue.submit("tool", done) is not None
+    assert queue.get(second.job_id) is None
+
+
+async def test_shared_queue_reports_jobs_of_another_process(tmp_path):
+    owner = SharedJobQueue(tmp_path, concurrency=1, ttl=60, max_jobs=10)
+    other = SharedJobQueue(tmp_path, concurrency=1, ttl=60, max_jobs=10)
+    gate = asyncio.Event()
+    running = owner.submit("runnetmeta", _gated(gate, [], "running"))
+    queued = owner.submit("leave_one_out", _gated(gate, [], "queued"))
+
+    seen = other.get(running.job_id)
+    assert seen is not running
+    assert (seen.tool, seen.status) == ("runnetmeta", "running")
+    assert other.status(other.get(queued.job_id))["position"] == 1
+    assert other.get("unknown") is None
+
+    gate.set()
+    await _until(lambda: queued.status == "done")
+    seen = other.get(queued.job_id)
+    assert seen.status == "done"
+    assert seen.result == {"name": "queued"}
+
+
+async def test_shared_queue_applies_cancellations_from_another_process(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(jobs, "CANCEL_POLL", 0.01)
+    owner = SharedJobQueue(tmp_path, concurrency=1, ttl=60, max_jobs=10)
+    other = SharedJobQueue(tmp_path, concurrency=1, ttl=60, max_jobs=10)
+    call = BlockingCall()
+
+    async def run():
+        return await asyncio.to_thread(call)
+
+    job = owner.submit("runnetmeta", run)
+    await call.wait_started()
+
+    flagged = other.cancel(job.job_id)
+    assert flagged.status == "running"
+    assert other.status(flagged)["cancel_requested"] is True
+
+    await _until(call.killed.is_set)
+    assert job.status == "cancelled"
+    assert other.get(job.job_id).status == "cancelled"
+    call.release.set()
+
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    queue = JobQueue(concurrency=1, ttl=60, max_jobs=10)
+    monkeypatch.setattr(server, "job_queue", queue)
+    return queue
+
+
+async def test_cancelled_job_result(job_queue, monkeypatch):
+    call = BlockingCall()
+    monkeypatch.setattr(server.r_bridge, "run_netmeta", call)
+
+    submitted = await server.submit_job("runnetmeta", {"data": ROWS})
+    assert submitted["tool"] == "runnetmeta"
+    await call.wait_started()
+
+    cancelled = await server.cancel_job(submitted["job_id"])
+    assert cancelled["status"] == "cancelled"
+    assert call.killed.is_set()
+    call.release.set()
+
+    output = await server.job_result(submitted["job_id"])
+    assert output["status"] == "cancelled"
+    assert "result" not in output
+
+
+async def test_job_result(job_queue, monkeypatch):
+    call = BlockingCall()
+    monkeypatch.setattr(server.r_bridge, "run_netmeta", call)
+    call.release.set()
+
+    submitted = await server.submit_job("runnetmeta", {"data": ROWS})
+    await _until(lambda: job_queue.get(submitted["job_id"]).status == "done")
+    output = await server.job_result(submitted["job_id"])
+    assert output["result"] == {"ok": True}
+    assert not call.killed.is_set()
+
+
+async def test_submit_job_errors(job_queue):
+    assert "valid_tools" in await server.submit_job("submit_job")
+    output = await server.submit_job("runnetmeta", {"unknown": 1})
+    assert output["error"].startswith("Invalid arguments for runnetmeta")
+    assert "error" in await server.job_result("unknown")
+
+
+@pytest.fixture
+def worker(fake_r):
+    worker = RWorker(fake_r, timeout=10, startup_timeout=10)
+    yield worker
+    worker.close()
+
+
+async def test_cancel_kills_the_r_worker(worker):
+    assert worker.run("1 + 1") == '{"ok": true}'
+    queue = JobQueue(concurrency=1, ttl=60, max_jobs=10)
+    outcome = []
+    started = threading.Event()
+
+    def run_script():
+        started.set()
+        try:
+            outcome.append(worker.run("Sys.sleep(60)"))
+        except RWorkerError as e:
+            outcome.append(e)
+
+    async def run():
+        await asyncio.to_thread(run_script)
+
+    process = worker._process
+    job = queue.submit("runnetmeta", run)
+    assert await asyncio.to_thread(started.wait, 5)
+    # Cancelling before or while R runs the script kills the process
+    queue.cancel(job.job_id)
+
+    await _until(lambda: outcome)
+    assert process.poll() is not None
+    assert str(outcome[0]) == "Job cancelled"
+    assert not worker.alive
+
+    # The next call starts a fresh process
+    assert worker.run("1 + 1") == '{"ok": true}'
+    assert worker._process is not process
@@ -0,0 +1,98 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.r_bridge import NetmetaBridge, _align_fit, _label
+
+# Mixed-case treatments: sorted() gives ["Beta", "Placebo", "aspirin"],
+# R and the engine ["aspirin", "Beta", "Placebo"]. Studies are floats,
+# which R writes as "1", "2", ...
+ROWS = [
+    {"study": 1.0, "treat1": "aspirin", "treat2": "Placebo", "TE": -0.4, "seTE": 0.2},
+    {"study": 2.0, "treat1": "Beta", "treat2": "Placebo", "TE": -0.2, "seTE": 0.25},
+    {"study": 3.0, "treat1": "aspirin", "treat2": "Beta", "TE": -0.1, "seTE": 0.3},
+    {"study": 4.0, "treat1": "aspirin", "treat2": "Placebo", "TE": -0.5, "seTE": 0.3},
+    {"study": 5.5, "treat1": "Beta", "treat2": "Placebo", "TE": -0.3, "seTE": 0.2},
+]
+
+
+@pytest.mark.parametrize(
+    "value, label",
+    [
+        (1.0, "1"),
+        (12, "12"),
+        (1.5, "1.5"),
+        ("1.0", "1.0"),
+        ("Smith 2001", "Smith 2001"),
+    ],
+)
+def test_labels_follow_r(value, label):
+    assert _label(value) == label
+
+
+def _fit_payload(bundle, trts):
+    """A leave_one_out fit as R reports it, with treatments in `trts` order."""
+    index = [bundle.treatments.index(t) for t in trts]
+    te = bundle.random.te[np.ix_(index, index)]
+    scores = bundle.random.pscores()[index]
+    return {
+        "trts": trts,
+        "TE": te.flatten(order="F").tolist(),
+        "tau2": bundle.heterogeneity["tau2"],
+        "p_scores": scores.tolist(),
+    }
+
+
+def test_fits_are_aligned_by_label():
+    bundle = engine.fit(ROWS)
+    trts = bundle.treatments
+    assert trts == ["aspirin", "Beta", "Placebo"]
+    pairs = [(a, b) for i, a in enumerate(trts) for b in trts[i + 1 :]]
+    expected_effects = [
+        bundle.random.te[trts.index(a), trts.index(b)] for a, b in pairs
+    ]
+    expected_scores = bundle.random.pscores()
+
+    # Byte order, as R gives it in the C locale
+    fit = _fit_payload(bundle, sorted(trts))
+    effects, scores = _align_fit(fit, trts, pairs)
+    np.testing.assert_allclose(effects, expected_effects)
+    np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_missing_treatments_are_nan():
+    bundle = engine.fit([row for row in ROWS if "Beta" not in row.values()])
+    trts = ["aspirin", "Beta", "Placebo"]
+    pairs = [("aspirin", "Beta"), ("aspirin", "Placebo"), ("Beta", "Placebo")]
+    effects, scores = _align_fit(
+        _fit_payload(bundle, ["Placebo", "aspirin"]), trts, pairs
+    )
+    assert np.isnan(effects[[0, 2]]).all()
+    assert effects[1] == pytest.approx(bundle.random.te[0, 1])
+    assert np.isnan(scores[1])
+    assert scores[[0, 2]].tolist() == pytest.approx(bundle.random.pscores().tolist())
+
+
+@pytest.mark.skipif(shutil.which("R") is None, reason="R is not installed")
+def test_matches_refits_of_the_engine(tmp_path, monkeypatch):
+    monkeypatch.setenv("NETMETA_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("NETMETA_RESULT_CACHE", "0")
+    bridge = NetmetaBridge()
+    try:
+        output = bridge.leave_one_out(ROWS, sm="MD")
+    finally:
+        bridge.close()
+
+    assert output["studies"] == ["1", "2", "3", "4", "5.5"]
+    assert output["treatments"] == ["aspirin", "Beta", "Placebo"]
+    baseline = engine.fit(ROWS, sm="MD")
+    pairs = list(zip(output["comparisons"]["treat1"], output["comparisons"]["treat2"]))
+    for study, shift in zip(output["studies"], output["effect_shift"]):
+        refit = engine.fit([row for row in ROWS if _label(row["study"]) != study])
+        for (a, b), value in zip(pairs, shift):
+            i, j = refit.treatments.index(a), refit.treatments.index(b)
+            k, m = baseline.treatments.index(a), baseline.treatments.index(b)
+            expected = refit.random.te[i, j] - baseline.random.te[k, m]
+            assert value == pytest.approx(expected, abs=engine.ENGINE_TOLERANCE)
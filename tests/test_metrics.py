@@ -0,0 +1,80 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from netmeta_mcp import metrics, server
+
+_value = contextvars.ContextVar("value", default="unset")
+
+
+def test_map_in_context_uses_the_context_at_submission():
+    def read(i):
+        return i, _value.get(), metrics.current_tool()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        token = _value.set("first")
+        with metrics.tool_call("runnetmeta"):
+            results = metrics.map_in_context(executor, read, range(3))
+        _value.reset(token)
+        assert list(results) == [(i, "first", "runnetmeta") for i in range(3)]
+
+        # Later submissions see the context as it is then
+        _value.set("second")
+        assert list(metrics.map_in_context(executor, read, [0])) == [
+            (0, "second", metrics.NO_TOOL)
+        ]
+
+
+def test_map_in_context_raises_the_first_error():
+    def fail(i):
+        if i == 1:
+            raise ValueError(i)
+        return i
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = metrics.map_in_context(executor, fail, range(3))
+        assert next(results) == 0
+        with pytest.raises(ValueError):
+            next(results)
+
+
+def _calls(tool: str) -> float:
+    samples = metrics.TOOL_CALLS.labels(tool).samples((), ())
+    return [value for suffix, _, value in samples if suffix == "_count"][0]
+
+
+async def test_tool_calls_are_labelled_by_mcp_tool_name():
+    calls = _calls("csv_to_json")
+    errors = metrics.TOOL_ERRORS.labels("csv_to_json").get()
+
+    await server.csv_to_json("study,treat1,treat2,TE,seTE\ns1,A,B,0.1,0.2\n")
+    await server.csv_to_json("not,a,dataset\n")
+
+    assert _calls("csv_to_json") == calls + 2
+    assert metrics.TOOL_ERRORS.labels("csv_to_json").get() == errors + 1
+    assert metrics.IN_FLIGHT.labels("csv_to_json").get() == 0
+
+
+async def test_record_tool_sets_the_tool_for_the_call():
+    @metrics.record_tool
+    async def my_tool():
+        return metrics.current_tool()
+
+    assert await my_tool() == "my_tool"
+    assert my_tool.__name__ == "my_tool"
+    assert metrics.current_tool() == metrics.NO_TOOL
+
+
+def test_constant_labels():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("calls", "Calls.", ["tool"]))
+    histogram = registry.register(metrics.Histogram("seconds", "Time.", buckets=[1]))
+    counter.labels("runnetmeta").inc()
+    histogram.observe(0.5)
+    registry.constant_labels = {"pid": "42"}
+
+    lines = registry.render().splitlines()
+    assert 'calls_total{pid="42",tool="runnetmeta"} 1' in lines
+    assert 'seconds_bucket{pid="42",le="1"} 1' in lines
+    assert 'seconds_count{pid="42"} 1' in lines
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+
+import pytest
+
+from netmeta_mcp import profiling
+from netmeta_mcp.profiling import R_MARKER, Profile
+
+
+def test_split_r_output_strips_the_timings():
+    profile = Profile()
+    timings = {"eval": 0.25, "startup": 0.5, "package_load": 1.0}
+    stdout = '{"TE": [1, 2]}\n' + R_MARKER + json.dumps(timings) + "\n"
+    assert profiling.split_r_output(stdout, profile) == '{"TE": [1, 2]}\n'
+    profiling.split_r_output("{}\n" + R_MARKER + '{"eval": 0.5}', profile)
+    report = profile.report()
+    assert report["r_scripts"] == 2
+    assert report["r_phases"] == {"eval": 0.75, "startup": 0.5, "package_load": 1.0}
+
+
+def test_split_r_output_without_timings():
+    profile = Profile()
+    # A failed script prints no timings; unreadable ones are dropped
+    assert profiling.split_r_output('{"error": "x"}', profile) == '{"error": "x"}'
+    assert profiling.split_r_output("out\n" + R_MARKER + "{oops", profile) == "out\n"
+    assert "r_scripts" not in profile.report()
+
+
+def test_split_r_output_keeps_rprof_summaries():
+    profile = Profile(rprof=True)
+    rprof = {"function": ["netmeta", "solve"], "total": [0.2, 0.1], "self": [0, 0.1]}
+    for _ in range(2):
+        profiling.split_r_output(
+            R_MARKER + json.dumps({"eval": 0.2, "rprof": rprof}), profile
+        )
+    assert profile.report()["rprof"] == [
+        {"function": "netmeta", "total": 0.4, "self": 0.0},
+        {"function": "solve", "total": 0.2, "self": 0.2},
+    ]
+
+
+def test_nested_phases_add_up():
+    with profiling.profiled(True) as profile:
+        with profiling.phase("outer"):
+            for _ in range(2):
+                with profiling.phase("inner"):
+                    time.sleep(0.02)
+        with profiling.phase("inner"):
+            time.sleep(0.02)
+    assert profiling.current() is None
+    report = profile.report()
+    phases = report["phases"]
+    assert set(phases) == {"outer", "inner"}
+    assert phases["inner"] >= 0.06
+    # The outer phase includes its two inner ones, but not the third
+    assert 0.04 <= phases["outer"] < phases["inner"] + 0.02
+    assert report["total"] >= phases["outer"] + 0.02
+
+
+def test_unprofiled_calls_record_nothing(monkeypatch):
+    monkeypatch.delenv("NETMETA_PROFILE", raising=False)
+    with profiling.profiled() as profile:
+        assert profile is None
+        with profiling.phase("anything"):
+            pass
+    monkeypatch.setenv("NETMETA_PROFILE", "1")
+    with profiling.profiled() as profile:
+        assert profiling.current() is profile
+
+
+def test_profiles_of_concurrent_calls_are_separate():
+    reports = {}
+
+    def call(name, seconds):
+        with profiling.profiled(True) as profile:
+            with profiling.phase(name):
+                time.sleep(seconds)
+        reports[name] = profile.report()["phases"]
+
+    threads = [threading.Thread(target=call, args=(name, 0.05)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert set(reports["a"]) == {"a"}
+    assert set(reports["b"]) == {"b"}
+
+
+def test_concurrent_cprofile_request_is_refused():
+    first, second = Profile(cprofile=True), Profile(cprofile=True)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "first"
+
+    thread = threading.Thread(
+        target=lambda: results.append(first.run_cprofile(blocking))
+    )
+    thread.start()
+    assert started.wait(5)
+    # The second call still runs, without a profiler
+    assert second.run_cprofile(lambda: "second") == "second"
+    release.set()
+    thread.join()
+
+    assert results == ["first"]
+    assert second.report()["cprofile"] == (
+        "unavailable: another call is being profiled"
+    )
+    summary = first.report()["cprofile"]
+    assert isinstance(summary, list)
+    assert any("blocking" in row["function"] for row in summary)
+
+    # The profiler is free again once the first call is done
+    assert second.run_cprofile(lambda: "again") == "again"
+    assert isinstance(second.report()["cprofile"], list)
+
+
+def test_cprofile_summary_survives_an_exception():
+    profile = Profile(cprofile=True)
+
+    def fails():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        profile.run_cprofile(fails)
+    assert isinstance(profile.report()["cprofile"], list)
+
+
+def test_attach():
+    profile = Profile()
+    assert set(profile.attach({"a": 1})) == {"a", "_timings"}
+    assert profile.attach([1, 2])["data"] == [1, 2]
@@ -0,0 +1,127 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from netmeta_mcp.r_worker import RWorker, RWorkerError, RWorkerPool
+
+
+def _pid(runner) -> int:
+    return int(runner.run("Sys.getpid()"))
+
+
+def _until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool_factory(fake_r):
+    pools = []
+
+    def make(**kwargs) -> RWorkerPool:
+        pool = RWorkerPool(fake_r, **kwargs)
+        pool.start()
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_worker_reuses_its_process(fake_r):
+    worker = RWorker(fake_r, timeout=10)
+    try:
+        assert worker.run("1 + 1") == '{"ok": true}'
+        assert _pid(worker) == _pid(worker)
+        assert worker.n_jobs == 3
+    finally:
+        worker.close()
+    assert not worker.alive
+
+
+def test_worker_timeout_restarts_the_process(fake_r):
+    worker = RWorker(fake_r, timeout=0.2)
+    try:
+        pid = _pid(worker)
+        with pytest.raises(RWorkerError, match="timed out after 0.2s"):
+            worker.run("Sys.sleep(5)")
+        assert not worker.alive
+        assert _pid(worker) != pid
+    finally:
+        worker.close()
+
+
+def test_failed_start(tmp_path):
+    executable = tmp_path / "R"
+    executable.write_text(f"#!{sys.executable}\nimport sys\nsys.exit(3)\n")
+    executable.chmod(0o755)
+    pool = RWorkerPool(str(executable), size=2)
+    with pytest.raises(RWorkerError, match="failed to start"):
+        pool.start()
+
+
+def test_checkout_timeout(pool_factory):
+    pool = pool_factory(size=1, checkout_timeout=0.1)
+    with pool.checkout():
+        assert pool.busy == 1
+        start = time.monotonic()
+        with pytest.raises(RWorkerError, match=r"within 0.1s \(all 1 busy\)"):
+            with pool.checkout():
+                pass
+        assert time.monotonic() - start >= 0.1
+    assert pool.busy == 0
+    assert pool.run("1 + 1") == '{"ok": true}'
+
+
+def test_callers_queue_for_a_free_worker(pool_factory):
+    pool = pool_factory(size=2, checkout_timeout=5)
+    outputs = []
+
+    def run():
+        outputs.append(pool.run("Sys.sleep(0.2)"))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Two rounds of two concurrent scripts
+    assert 0.4 <= time.monotonic() - start < 2
+    assert outputs == ['{"ok": true}'] * 4
+    assert pool.busy == 0
+
+
+def test_workers_are_recycled_after_max_jobs(pool_factory):
+    pool = pool_factory(size=1, max_jobs=2)
+    first = _pid(pool)
+    assert _pid(pool) == first
+    # The second script used up the worker: it restarts before serving again
+    third = _pid(pool)
+    assert third != first
+    assert _pid(pool) == third
+    _until(lambda: pool.busy == 0)
+
+
+def test_worker_that_dies_mid_job_is_replaced(pool_factory):
+    pool = pool_factory(size=1, checkout_timeout=1)
+    pid = _pid(pool)
+    with pytest.raises(RWorkerError, match="exited unexpectedly"):
+        pool.run("quit(status = 1)")
+    # The dead worker went back to the pool and starts afresh on its next run
+    assert pool.busy == 0
+    assert _pid(pool) != pid
+
+
+def test_closed_pool(pool_factory):
+    pool = pool_factory(size=1)
+    with pool.checkout() as worker:
+        pool.close()
+    assert not worker.alive
+    with pytest.raises(RWorkerError, match="closed"):
+        pool.run("1 + 1")
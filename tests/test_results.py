@@ -0,0 +1,118 @@
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.results import ResultBundle, norm_cdf, pscores
+
+# netmeta results recorded by `python -m netmeta_mcp.engine --record`
+NETMETA = Path(__file__).parent / "data" / "netmeta"
+
+
+def _pnorm(x: float) -> float:
+    return 0.5 * math.erfc(-x / math.sqrt(2))
+
+
+def _pscores(te, se, small_values="undesirable"):
+    """P-scores written out pair by pair with math.erfc."""
+    sign = -1 if small_values == "desirable" else 1
+    n = len(te)
+    return [
+        sum(_pnorm(sign * te[i][j] / se[i][j]) for j in range(n) if j != i) / (n - 1)
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def senn2013(load_example):
+    data, sm, reference = load_example("Senn2013")
+    return engine.fit(data, sm=sm, reference=reference)
+
+
+def test_norm_cdf_matches_erfc():
+    # Every branch of Cody's approximation: the centre (|x| <= 0.674), the
+    # inner tail (|x| <= sqrt(32)) and the outer tail
+    x = np.concatenate(
+        [np.linspace(-37, 37, 20001), [0.67448975, math.sqrt(32), 1e-300, 0.0]]
+    )
+    x = np.concatenate([x, -x])
+    expected = np.array([_pnorm(v) for v in x])
+    np.testing.assert_allclose(norm_cdf(x), expected, rtol=1e-12, atol=0)
+
+
+def test_norm_cdf_special_values():
+    result = norm_cdf(np.array([np.inf, -np.inf, np.nan, -60.0]))
+    assert result[0] == 1.0
+    assert result[1] == 0.0
+    assert np.isnan(result[2])
+    assert result[3] == 0.0
+    assert norm_cdf(np.zeros((2, 3))).shape == (2, 3)
+
+
+@pytest.mark.parametrize("small_values", ["undesirable", "desirable"])
+@pytest.mark.parametrize("model", ["common", "random"])
+def test_pscores(senn2013, model, small_values):
+    result = getattr(senn2013, model)
+    expected = _pscores(result.te.tolist(), result.se.tolist(), small_values)
+    np.testing.assert_allclose(
+        pscores(result.te, result.se, small_values), expected, rtol=1e-12
+    )
+
+
+def test_pscore_directions(senn2013):
+    n = len(senn2013.treatments)
+    undesirable = senn2013.random.pscores("undesirable")
+    desirable = senn2013.random.pscores("desirable")
+    np.testing.assert_allclose(desirable, 1 - undesirable)
+    assert undesirable.sum() == pytest.approx(n / 2)
+
+
+def test_pscores_skip_missing_pairs():
+    te = np.array([[0.0, 1.0, np.nan], [-1.0, 0.0, 0.5], [np.nan, -0.5, 0.0]])
+    se = np.array([[0.0, 0.5, np.nan], [0.5, 0.0, 0.5], [np.nan, 0.5, 0.0]])
+    np.testing.assert_allclose(
+        pscores(te, se),
+        [_pnorm(2.0), (_pnorm(-2.0) + _pnorm(1.0)) / 2, _pnorm(-1.0)],
+    )
+
+
+@pytest.mark.parametrize("small_values", ["undesirable", "desirable"])
+def test_ranking_subset(senn2013, small_values):
+    subset = ["Placebo", "Metformin", "Sitagliptin", "Acarbose"]
+    ranking = senn2013.ranking(small_values=small_values, treatments=subset)
+    index = [senn2013.treatments.index(t) for t in subset]
+    te = senn2013.random.te[np.ix_(index, index)].tolist()
+    se = senn2013.random.se[np.ix_(index, index)].tolist()
+    expected = dict(zip(subset, _pscores(te, se, small_values)))
+
+    assert sorted(ranking["treatments"]) == sorted(subset)
+    assert ranking["p_scores"] == sorted(ranking["p_scores"], reverse=True)
+    assert ranking["ranks"] == [1, 2, 3, 4]
+    for t, score in zip(ranking["treatments"], ranking["p_scores"]):
+        assert score == pytest.approx(expected[t], rel=1e-12)
+
+
+def test_ranking_errors(senn2013):
+    assert "error" in senn2013.ranking(small_values="bad")
+    assert "error" in senn2013.ranking(treatments=["Placebo", "Insulin"])
+    assert "error" in senn2013.ranking(treatments=["Placebo", "Placebo"])
+
+
+@pytest.mark.parametrize("small_values", ["undesirable", "desirable"])
+@pytest.mark.parametrize("name", ["Senn2013", "smokingcessation", "Linde2015"])
+def test_pscores_match_netrank(name, small_values):
+    path = NETMETA / f"{name}.json"
+    if not path.exists():
+        pytest.skip(f"No netmeta results recorded for {name}")
+    recorded = json.loads(path.read_text())
+    # P-scores from netmeta's own estimates, so only pscores() is compared
+    bundle = ResultBundle.from_r(recorded["netmeta"])
+    for model in ("common", "random"):
+        np.testing.assert_allclose(
+            bundle.model(model == "random").pscores(small_values),
+            recorded["netrank"][small_values][model],
+            atol=engine.ENGINE_TOLERANCE,
+        )
@@ -0,0 +1,194 @@
+import time
+
+import numpy as np
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.state import AnalysisStore, SharedAnalysisStore
+
+
+def _save(store, session_id=None, size=100, data=None):
+    """Commit an analysis whose RDS file has `size` bytes."""
+    analysis = store.create(session_id=session_id, data=data)
+    analysis.path.write_bytes(b"x" * size)
+    store.commit(analysis)
+    return analysis
+
+
+@pytest.fixture
+def senn2013(load_example):
+    data, sm, reference = load_example("Senn2013")
+    return engine.fit(data, sm=sm, reference=reference)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AnalysisStore(tmp_path, ttl=60, max_bytes=1 << 20, max_analyses=100)
+
+
+def test_get_by_id_and_latest(store):
+    first = _save(store, "s1")
+    second = _save(store, "s1")
+    assert store.get(first.analysis_id) is first
+    assert store.get(session_id="s1") is second
+    assert store.get("unknown") is None
+    assert store.get(session_id="s2") is None
+
+
+def test_latest_analysis_is_per_session(store):
+    a = _save(store, "s1")
+    b = _save(store, "s2")
+    c = _save(store)
+    assert store.get(session_id="s1") is a
+    assert store.get(session_id="s2") is b
+    assert store.get() is c
+
+    # Discarding one session's latest analysis leaves the others untouched
+    store.discard(a)
+    assert store.get(session_id="s1") is None
+    assert store.get(session_id="s2") is b
+    assert not a.path.exists()
+
+
+def test_size_counts_file_and_records(store):
+    analysis = _save(store, size=100, data=[{"study": 1}] * 3)
+    assert analysis.size > 100
+    assert store.get(analysis.analysis_id).size == analysis.size
+
+
+def test_unused_analyses_expire(store):
+    old = _save(store, "s1")
+    recent = _save(store, "s2")
+    old.last_access = time.time() - 61
+    assert store.get(old.analysis_id) is None
+    assert store.get(session_id="s1") is None
+    assert not old.path.exists()
+    assert store.get(recent.analysis_id) is recent
+
+
+def test_ttl_zero_keeps_analyses(tmp_path):
+    store = AnalysisStore(tmp_path, ttl=0, max_bytes=1 << 20, max_analyses=10)
+    analysis = _save(store)
+    analysis.last_access = time.time() - 10**6
+    assert store.get(analysis.analysis_id) is analysis
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    store = AnalysisStore(tmp_path, ttl=0, max_bytes=250, max_analyses=10)
+    first = _save(store, "s1")
+    second = _save(store, "s2")
+    first.last_access = second.last_access - 1
+    # Using the first analysis makes the second the least recently used one
+    assert store.get(first.analysis_id) is first
+    third = _save(store, "s3")
+    assert store.get(second.analysis_id) is None
+    assert not second.path.exists()
+    assert store.get(first.analysis_id) is first
+    assert store.get(third.analysis_id) is third
+
+
+def test_count_budget_evicts_least_recently_used(tmp_path):
+    store = AnalysisStore(tmp_path, ttl=0, max_bytes=1 << 20, max_analyses=2)
+    analyses = []
+    for i in range(3):
+        analysis = _save(store, f"s{i}")
+        analysis.last_access = i
+        analyses.append(analysis)
+    _save(store, "s3")
+    assert store.get(analyses[0].analysis_id) is None
+    assert store.get(analyses[1].analysis_id) is None
+    assert store.get(analyses[2].analysis_id) is analyses[2]
+    assert store.get(session_id="s0") is None
+
+
+@pytest.mark.parametrize("store_type", [AnalysisStore, SharedAnalysisStore])
+def test_analysis_over_the_byte_budget_is_kept(tmp_path, store_type):
+    store = store_type(tmp_path, ttl=0, max_bytes=250, max_analyses=10)
+    small = _save(store, "s1")
+    large = _save(store, "s2", size=1000)
+    # Older analyses make room; the one just committed stays the latest
+    assert store.get(small.analysis_id) is None
+    assert store.get(session_id="s2").analysis_id == large.analysis_id
+    assert large.path.exists()
+    # It is evicted like any other once it is no longer the latest used
+    newer = _save(store, "s3")
+    assert store.get(large.analysis_id) is None
+    assert not large.path.exists()
+    assert store.get(newer.analysis_id).analysis_id == newer.analysis_id
+
+
+@pytest.mark.parametrize("store_type", [AnalysisStore, SharedAnalysisStore])
+def test_attached_bundle_over_the_byte_budget_is_kept(tmp_path, store_type, senn2013):
+    store = store_type(tmp_path, ttl=0, max_bytes=senn2013.nbytes // 2)
+    other = _save(store, "s1", size=10)
+    analysis = _save(store, "s2", size=10)
+    store.attach_bundle(analysis, senn2013)
+    assert store.get(other.analysis_id) is None
+    assert store.get(session_id="s2").bundle is not None
+
+
+def test_clear_keeps_a_given_directory(tmp_path):
+    store = AnalysisStore(tmp_path, ttl=0, max_bytes=1 << 20, max_analyses=10)
+    analysis = _save(store)
+    store.clear()
+    assert store.get(analysis.analysis_id) is None
+    assert not analysis.path.exists()
+    assert tmp_path.exists()
+
+
+def test_clear_removes_a_temporary_directory(monkeypatch):
+    monkeypatch.delenv("NETMETA_STATE_DIR", raising=False)
+    store = AnalysisStore(ttl=0)
+    _save(store)
+    store.clear()
+    assert not store.directory.exists()
+
+
+def test_shared_store_is_read_by_another_instance(tmp_path, senn2013):
+    writer = SharedAnalysisStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    reader = SharedAnalysisStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    data = [{"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.1, "seTE": 0.2}]
+    analysis = writer.create(session_id="s1", data=data, options={"sm": "MD"})
+    analysis.path.write_bytes(b"x" * 100)
+    writer.commit(analysis)
+
+    loaded = reader.get(session_id="s1")
+    assert loaded.analysis_id == analysis.analysis_id
+    assert loaded.path == analysis.path
+    assert loaded.data == data
+    assert loaded.options == {"sm": "MD"}
+    assert loaded.bundle is None
+    assert reader.get(session_id="s2") is None
+
+    # A bundle attached by one process is picked up by the other
+    writer.attach_bundle(analysis, senn2013)
+    loaded = reader.get(analysis.analysis_id)
+    assert loaded.bundle.treatments == senn2013.treatments
+    np.testing.assert_array_equal(loaded.bundle.random.te, senn2013.random.te)
+
+    reader.discard(loaded)
+    assert writer.get(analysis.analysis_id) is None
+    assert writer.get(session_id="s1") is None
+    assert not analysis.path.exists()
+
+
+def test_shared_store_evicts_for_every_instance(tmp_path):
+    first = SharedAnalysisStore(tmp_path, ttl=0, max_bytes=1 << 20, max_analyses=2)
+    second = SharedAnalysisStore(tmp_path, ttl=0, max_bytes=1 << 20, max_analyses=2)
+    old = _save(first, "s1")
+    _save(second, "s2")
+    _save(second, "s3")
+    assert first.get(old.analysis_id) is None
+    assert second.get(session_id="s1") is None
+    assert not old.path.exists()
+    assert first.get(session_id="s3") is not None
+
+
+def test_shared_store_expires_for_every_instance(tmp_path):
+    first = SharedAnalysisStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    second = SharedAnalysisStore(tmp_path, ttl=60, max_bytes=1 << 20)
+    analysis = first.create(session_id="s1")
+    first.commit(analysis)
+    first._db.execute("UPDATE analyses SET last_access = ?", (time.time() - 61,))
+    assert second.get(analysis.analysis_id) is None
+    assert first.get(session_id="s1") is None
@@ -0,0 +1,135 @@
+from collections import Counter
+
+import pytest
+
+from netmeta_mcp import synth
+from netmeta_mcp.datasets import parse_csv
+
+
+def _components(records) -> list[set[str]]:
+    """Connected components of the treatments compared by pairwise records."""
+    neighbours: dict[str, set[str]] = {}
+    for row in records:
+        neighbours.setdefault(row["treat1"], set()).add(row["treat2"])
+        neighbours.setdefault(row["treat2"], set()).add(row["treat1"])
+    components, seen = [], set()
+    for start in sorted(neighbours):
+        if start in seen:
+            continue
+        component, stack = set(), [start]
+        while stack:
+            node = stack.pop()
+            if node not in component:
+                component.add(node)
+                stack.extend(neighbours[node] - component)
+        seen |= component
+        components.append(component)
+    return components
+
+
+def _arms_per_study(records) -> Counter:
+    return Counter(Counter(row["study"] for row in records).values())
+
+
+def test_same_seed_gives_the_same_data():
+    options = {"n_treatments": 8, "n_studies": 40, "multi_arm": 0.2}
+    assert synth.generate(seed=3, **options) == synth.generate(seed=3, **options)
+    assert synth.generate(seed=3, **options) != synth.generate(seed=4, **options)
+
+
+@pytest.mark.parametrize("topology", ["star", "ring", "random"])
+@pytest.mark.parametrize("outcome_type", ["binary", "continuous"])
+def test_topologies_are_connected(topology, outcome_type):
+    records = synth.generate(
+        n_treatments=12,
+        n_studies=40,
+        multi_arm=0.2,
+        topology=topology,
+        outcome_type=outcome_type,
+        seed=1,
+    )
+    (component,) = _components(records)
+    assert len(component) == 12
+
+
+def test_disconnected_topology_has_two_subnetworks():
+    records = synth.generate(n_treatments=10, topology="disconnected", seed=1)
+    components = _components(records)
+    assert sorted(len(c) for c in components) == [5, 5]
+
+
+def _studies(records) -> dict[str, set[str]]:
+    arms: dict[str, set[str]] = {}
+    for row in records:
+        arms.setdefault(row["study"], set()).add(row["treatment"])
+    return arms
+
+
+def test_star_studies_all_include_the_hub():
+    records = synth.generate(
+        n_treatments=6, n_studies=30, multi_arm=0.3, topology="star", layout="arm"
+    )
+    studies = _studies(records)
+    assert all("T1" in arms for arms in studies.values())
+    # Three-arm studies compare the hub with two spokes
+    assert sorted(len(arms) for arms in studies.values()) == [2] * 21 + [3] * 9
+
+
+def test_ring_studies_span_adjacent_edges():
+    records = synth.generate(
+        n_treatments=6, n_studies=30, multi_arm=0.3, topology="ring", layout="arm"
+    )
+    ring = {frozenset((f"T{i + 1}", f"T{(i + 1) % 6 + 1}")) for i in range(6)}
+    for arms in _studies(records).values():
+        edges = {frozenset((a, b)) for a in arms for b in arms if a < b} & ring
+        assert len(edges) == len(arms) - 1
+    assert _arms_per_study(records) == {2: 21, 3: 9}
+
+
+def test_too_few_treatments_for_three_arm_studies():
+    with pytest.raises(ValueError, match="at most 0 three-arm studies, not 2"):
+        synth.generate(n_treatments=2, n_studies=10, multi_arm=0.2)
+
+
+def test_proportion_of_three_arm_studies():
+    records = synth.generate(
+        n_treatments=10,
+        n_studies=50,
+        multi_arm=0.2,
+        density=1.0,
+        layout="arm",
+        seed=5,
+    )
+    assert _arms_per_study(records) == {2: 40, 3: 10}
+
+
+def test_three_arm_studies_of_a_triangle():
+    records = synth.generate(
+        n_treatments=3, n_studies=10, multi_arm=1.0, topology="ring", layout="arm"
+    )
+    assert _arms_per_study(records) == {3: 10}
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"topology": "tree"},
+        {"outcome_type": "survival"},
+        {"layout": "wide"},
+        {"n_treatments": 3, "topology": "disconnected"},
+        {"multi_arm": 1.5},
+        {"density": -0.1},
+        {"tau": -1},
+        {"n_treatments": 10, "n_studies": 5, "topology": "star"},
+    ],
+)
+def test_invalid_arguments(options):
+    with pytest.raises(ValueError):
+        synth.generate(**options)
+
+
+def test_to_csv_is_read_by_parse_csv():
+    records = synth.generate(outcome_type="continuous", layout="arm", seed=1)
+    dataset = parse_csv(synth.to_csv(records), "arm_continuous")
+    assert dataset.n_rows == len(records)
+    assert dataset.column_lists()["treatment"] == [r["treatment"] for r in records]
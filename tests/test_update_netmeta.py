@@ -0,0 +1,118 @@
+import pytest
+
+from netmeta_mcp import engine
+from netmeta_mcp.r_bridge import NetmetaBridge
+
+ROWS = [
+    {"study": "s1", "treat1": "A", "treat2": "B", "TE": 0.5, "seTE": 0.2},
+    {"study": "s2", "treat1": "A", "treat2": "C", "TE": 0.3, "seTE": 0.25},
+    {"study": "s3", "treat1": "B", "treat2": "C", "TE": -0.1, "seTE": 0.3},
+    {"study": "s4", "treat1": "A", "treat2": "B", "TE": 0.4, "seTE": 0.22},
+    {"study": "s5", "treat1": "C", "treat2": "D", "TE": 0.2, "seTE": 0.3},
+]
+ADD = [
+    {"study": "s6", "treat1": "A", "treat2": "E", "TE": 0.6, "seTE": 0.3},
+    {"study": "s7", "treat1": "B", "treat2": "E", "TE": 0.1, "seTE": 0.35},
+]
+# All of s5, and s1 given with its treatments in the other order
+REMOVE = [{"study": "s5"}, {"study": "s1", "treat1": "B", "treat2": "A"}]
+EDITED = [ROWS[1], ROWS[2], ROWS[3], *ADD]
+
+# Keys of update_netmeta's output that runnetmeta does not have
+UPDATE_KEYS = ("analysis_id", "previous_analysis_id", "n_added", "n_removed", "diff")
+
+
+@pytest.fixture
+def bridge(tmp_path, monkeypatch):
+    monkeypatch.setenv("NETMETA_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("NETMETA_STATE_SHARED", "0")
+    monkeypatch.setenv("NETMETA_RESULT_CACHE", "0")
+    bridge = NetmetaBridge()
+    yield bridge
+    bridge.close()
+
+
+@pytest.fixture
+def updated(bridge):
+    first = bridge.run_netmeta(ROWS, sm="MD", engine="numpy", session_id="s")
+    output = bridge.update_netmeta(add=ADD, remove=REMOVE, session_id="s")
+    assert "error" not in output
+    assert output["previous_analysis_id"] == first["analysis_id"]
+    return output
+
+
+def test_update_equals_runnetmeta_on_the_edited_rows(bridge, updated):
+    expected = bridge.run_netmeta(EDITED, sm="MD", engine="numpy", session_id="t")
+    assert updated["n_added"] == 2
+    assert updated["n_removed"] == 2
+    assert updated["analysis_id"] != expected["analysis_id"]
+    for key in UPDATE_KEYS:
+        expected.pop(key, None)
+        updated.pop(key, None)
+    assert updated == expected
+
+
+def test_update_becomes_the_latest_analysis(bridge, updated):
+    assert bridge.get_network_graph(session_id="s") == bridge.get_network_graph(
+        updated["analysis_id"]
+    )
+    # The previous analysis is kept
+    assert "error" not in bridge.get_network_graph(updated["previous_analysis_id"])
+
+
+def test_diff(updated):
+    before = engine.fit(ROWS, sm="MD")
+    after = engine.fit(EDITED, sm="MD")
+    diff = updated["diff"]
+    assert diff["model"] == "random"
+    assert diff["treatments_added"] == ["E"]
+    assert diff["treatments_removed"] == ["D"]
+    assert diff["heterogeneity"]["tau2"] == {
+        "before": pytest.approx(before.heterogeneity["tau2"]),
+        "after": pytest.approx(after.heterogeneity["tau2"]),
+    }
+
+    def effect(bundle, treat1, treat2):
+        index = bundle.treatments.index
+        return bundle.random.te[index(treat1), index(treat2)]
+
+    effects = diff["effects"]
+    pairs = list(zip(effects["treat1"], effects["treat2"]))
+    assert sorted(map(sorted, pairs)) == [["A", "B"], ["A", "C"], ["B", "C"]]
+    for (treat1, treat2), old, new, change in zip(
+        pairs, effects["before"], effects["after"], effects["change"]
+    ):
+        assert old == pytest.approx(effect(before, treat1, treat2))
+        assert new == pytest.approx(effect(after, treat1, treat2))
+        assert change == pytest.approx(new - old)
+
+    def scores(bundle):
+        return dict(zip(bundle.treatments, bundle.random.pscores()))
+
+    def ranks(bundle):
+        order = sorted(scores(bundle).items(), key=lambda item: -item[1])
+        return {t: rank for rank, (t, _) in enumerate(order, start=1)}
+
+    ranking = diff["ranking"]
+    assert sorted(ranking["treatments"]) == ["A", "B", "C"]
+    for i, t in enumerate(ranking["treatments"]):
+        assert ranking["p_score_before"][i] == pytest.approx(scores(before)[t])
+        assert ranking["p_score_after"][i] == pytest.approx(scores(after)[t])
+        assert ranking["rank_before"][i] == ranks(before)[t]
+        assert ranking["rank_after"][i] == ranks(after)[t]
+    # P-scores are those of each full fit, over all of its treatments
+    assert sum(scores(after).values()) == pytest.approx(len(after.treatments) / 2)
+
+
+def test_update_errors(bridge):
+    assert "error" in bridge.update_netmeta(add=ADD, session_id="s")
+    bridge.run_netmeta(ROWS, sm="MD", engine="numpy", session_id="s")
+    output = bridge.update_netmeta(
+        remove=[{"study": "s9"}, {"study": "s1", "treat1": "A", "treat2": "C"}],
+        session_id="s",
+    )
+    assert output["error"] == "Comparisons to remove not found"
+    assert output["not_found"] == [
+        {"study": "s9"},
+        {"study": "s1", "treat1": "A", "treat2": "C"},
+    ]